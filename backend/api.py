@@ -1,4 +1,6 @@
+import asyncio
 from contextlib import asynccontextmanager
+import threading
 import traceback
 
 import uvicorn
@@ -6,8 +8,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 
-from backend.routers import diagnosis
+from backend.middleware import CompressionMiddleware, RateLimitMiddleware
+from backend.middleware.rate_limit import get_rate_limiter, rate_limit_trust_forwarded
+from backend.routers import diagnosis, history, jobs, metrics
 from config.logger import logger
+from core.ai_diagnosis.diagnosis import Diagnosis
+from core.ai_diagnosis.herb_diagnosis import HerbDiagnosis
+from core.ai_diagnosis.upstream import shutdown_upstream_pools
+from core.ai_diagnosis.warmup import resolve_warmup_mode, run_warmup
+from core.jobs.job_manager import shutdown_job_manager
+from utils.store.history_store import shutdown_history_store
 
 from .settings import settings
 
@@ -23,12 +33,23 @@ logger.add("server.log", format=FORMAT, level="INFO", rotation="1 week", retenti
 
 prefix = "/api/v1"
 
+# 参与缓存预热的引擎，名称与结果缓存中的引擎名一致
+WARMUP_ENGINES = {
+    "diagnosis": Diagnosis,
+    "herb_diagnosis": HerbDiagnosis,
+}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("初始化系统资源")
 
     try:
-        # 可以在这里添加初始化代码
+        # 缓存预热：blocking 在开始接收请求前完成，background 在后台线程进行
+        warmup_mode = resolve_warmup_mode()
+        if warmup_mode == "blocking":
+            await asyncio.to_thread(run_warmup, WARMUP_ENGINES)
+        elif warmup_mode == "background":
+            threading.Thread(target=run_warmup, args=(WARMUP_ENGINES,), name="cache-warmup", daemon=True).start()
         yield
     except Exception as e:
         logger.error(f"应用启动失败: {e}")
@@ -37,8 +58,9 @@ async def lifespan(app: FastAPI):
 
     finally:
         logger.info("正在清理应用资源...")
-        # todo
-        pass
+        shutdown_job_manager()
+        shutdown_upstream_pools()
+        shutdown_history_store()
 
 def create_app() -> FastAPI:
     tags_metadata = []
@@ -78,6 +100,15 @@ def create_app() -> FastAPI:
         },
     )
 
+    # 按客户端限流，添加在 CORS 之前，429 响应同样带有 CORS 头
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is not None:
+        app.add_middleware(
+            RateLimitMiddleware,
+            limiter=rate_limiter,
+            trust_forwarded=rate_limit_trust_forwarded(),
+        )
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.ALLOWED_HOSTS,
@@ -88,6 +119,14 @@ def create_app() -> FastAPI:
         max_age=settings.CORS_MAX_AGE,
     )
 
+    # 响应压缩：客户端支持时优先 brotli，其次 gzip，小响应不压缩
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
     # /*--------------------------------------- diagnosis ------------------------------------------*/
     app.include_router(
         diagnosis.router,
@@ -102,6 +141,27 @@ def create_app() -> FastAPI:
         },
     )
 
+    # /*--------------------------------------- jobs ------------------------------------------*/
+    app.include_router(
+        jobs.router,
+        prefix=prefix,
+        tags=["jobs"],
+    )
+
+    # /*--------------------------------------- history ------------------------------------------*/
+    app.include_router(
+        history.router,
+        prefix=prefix,
+        tags=["history"],
+    )
+
+    # /*--------------------------------------- metrics ------------------------------------------*/
+    app.include_router(
+        metrics.router,
+        prefix=prefix,
+        tags=["metrics"],
+    )
+
     @app.get("/health", summary="健康检查", tags=["health"])
     async def health_check():
         """健康检查端点"""
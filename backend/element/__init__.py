@@ -1,6 +1,14 @@
-
-from .ele_diagnosis import CreateDiagnosisRequest
+from .ele_diagnosis import CreateDiagnosisRequest, CreateShortlistRequest
+from .ele_job import CreateJobRequest
+from .ele_response import (DiagnosisItem, DiagnosisResponse, HerbDiagnosisItem,
+                           HerbDiagnosisResponse)
 
 __all__ = [
     "CreateDiagnosisRequest",
-]
\ No newline at end of file
+    "CreateJobRequest",
+    "CreateShortlistRequest",
+    "DiagnosisItem",
+    "DiagnosisResponse",
+    "HerbDiagnosisItem",
+    "HerbDiagnosisResponse",
+]
@@ -1,5 +1,24 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class CreateDiagnosisRequest(BaseModel):
     description: str = Field(..., example="宠物咳嗽，持续时间2周")
+    max_results: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=10,
+        description="最多返回的诊断条数，默认5条，同时决定本次调用的 max_tokens",
+        example=3,
+    )
+
+
+class CreateShortlistRequest(CreateDiagnosisRequest):
+    detail_top_n: int = Field(
+        default=0,
+        ge=0,
+        le=5,
+        description="两阶段诊断中立即并行补全详情的诊断条数，0 表示只返回鉴别诊断列表",
+        example=1,
+    )
@@ -0,0 +1,18 @@
+from typing import Literal, Optional
+
+from pydantic import AnyHttpUrl, Field
+
+from .ele_diagnosis import CreateDiagnosisRequest
+
+
+class CreateJobRequest(CreateDiagnosisRequest):
+    engine: Literal["diagnosis", "herb", "re_diagnosis"] = Field(
+        default="diagnosis",
+        description="诊断引擎：diagnosis 西医诊断，herb 中医诊断，re_diagnosis ReAct 诊断",
+        example="re_diagnosis",
+    )
+    callback_url: Optional[AnyHttpUrl] = Field(
+        default=None,
+        description="任务结束后以 POST 推送结果的地址，内容与查询任务接口一致",
+        example="https://clinic.example.com/diagnosis/callback",
+    )
@@ -0,0 +1,48 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class DiagnosisItem(BaseModel):
+    disease: str = Field(..., description="疾病名称")
+    description: str = Field("", description="诊断依据")
+    p: float = Field(..., description="诊断概率(0-1)")
+    base: str = Field("", description="基础护理")
+    continue_: str = Field("", alias="continue", description="继续观察")
+    suggest: str = Field("", description="建议就医情况")
+    base_medicine: str = Field("", description="基础用药")
+    base_medicine_usage: str = Field("", description="基础用药用法")
+    continue_medicine: str = Field("", description="后续用药")
+    continue_medicine_usage: str = Field("", description="后续用药用法")
+    suggest_medicine: str = Field("", description="急救用药")
+    suggest_medicine_usage: str = Field("", description="急救用药用法")
+    similarity: Optional[float] = Field(None, description="命中近似缓存时与缓存描述的相似度")
+
+
+class HerbDiagnosisItem(BaseModel):
+    zhengming: str = Field(..., description="中医证名")
+    description: str = Field("", description="病理分析")
+    p: float = Field(..., description="诊断概率(0-1)")
+    therapy: str = Field("", description="治法")
+    base: str = Field("", description="基础护理")
+    continue_: str = Field("", alias="continue", description="继续观察")
+    suggest: str = Field("", description="建议就医情况")
+    base_prescription: str = Field("", description="基础方剂")
+    base_prescription_usage: str = Field("", description="基础方剂用法")
+    continue_prescription: str = Field("", description="加减方剂")
+    continue_prescription_usage: str = Field("", description="加减方剂用法")
+    suggest_prescription: str = Field("", description="急救方剂")
+    suggest_prescription_usage: str = Field("", description="急救方剂用法")
+    similarity: Optional[float] = Field(None, description="命中近似缓存时与缓存描述的相似度")
+
+
+class DiagnosisResponse(BaseModel):
+    message: str
+    data: Optional[List[DiagnosisItem]] = None
+    code: int
+
+
+class HerbDiagnosisResponse(BaseModel):
+    message: str
+    data: Optional[List[HerbDiagnosisItem]] = None
+    code: int
@@ -0,0 +1,8 @@
+from .compression import CompressionMiddleware
+from .rate_limit import RateLimiter, RateLimitMiddleware
+
+__all__ = [
+    "CompressionMiddleware",
+    "RateLimitMiddleware",
+    "RateLimiter",
+]
@@ -0,0 +1,83 @@
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import (DEFAULT_EXCLUDED_CONTENT_TYPES,
+                                       GZipMiddleware, IdentityResponder)
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 未安装时只提供 gzip
+    brotli = None
+
+# 诊断历史的 Parquet 导出已经是 zstd 压缩，不再重复压缩
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/vnd.apache.parquet",)
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    """Accept-Encoding 中包含该编码且 q 值大于 0"""
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() != coding:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self.compressor: Optional["brotli.Compressor"] = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self.compressor is None:
+            self.compressor = brotli.Compressor(quality=self.quality)
+        data = self.compressor.process(body)
+        # 流式响应每块都 flush，客户端可以边收边解压
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    响应压缩：客户端支持且安装了 brotli 时使用 br，否则使用 gzip
+
+    小于 minimum_size 的响应、已编码的响应和已压缩的内容类型不压缩。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compresslevel: int = 6,
+        brotli_quality: int = 5,
+    ) -> None:
+        super().__init__(
+            app,
+            minimum_size=minimum_size,
+            compresslevel=compresslevel,
+            exclude_content_types=EXCLUDED_CONTENT_TYPES,
+        )
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and brotli is not None:
+            if _accepts(Headers(scope=scope).get("Accept-Encoding", ""), "br"):
+                responder = BrotliResponder(
+                    self.app,
+                    self.minimum_size,
+                    self.brotli_quality,
+                    exclude_content_types=self.exclude_content_types,
+                )
+                await responder(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
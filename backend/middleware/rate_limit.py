@@ -0,0 +1,263 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.response import FastJSONResponse
+from config.logger import logger
+from core.ai_diagnosis.usage import usage_sink
+
+DEFAULT_BUCKETS = {
+    "diagnosis": "30/10",
+    "herb": "30/10",
+    "batch": "10/5",
+}
+DEFAULT_IDLE_TTL = 3600
+
+# 路由分组：(分组名, 限制的请求方法，None 表示全部, 路径前缀)，按顺序匹配第一条
+DEFAULT_ROUTE_GROUPS: List[Tuple[str, Optional[Tuple[str, ...]], str]] = [
+    ("herb", None, "/api/v1/herb"),
+    ("diagnosis", None, "/api/v1/diagnosis"),
+    ("batch", ("POST",), "/api/v1/jobs"),
+    ("batch", ("GET",), "/api/v1/history/export"),
+]
+
+
+@dataclass
+class BucketConfig:
+    rate: float
+    burst: float
+
+    @classmethod
+    def parse(cls, value: str) -> "BucketConfig":
+        """解析 "每分钟请求数/突发容量" 格式，如 "30/10"；省略突发容量时与每分钟请求数相同"""
+        per_minute, _, burst = value.partition("/")
+        return cls(rate=float(per_minute) / 60, burst=float(burst or per_minute))
+
+
+@dataclass
+class ClientState:
+    """单个客户端的令牌桶与当日用量，占用空间与请求数无关"""
+    buckets: Dict[str, List[float]] = field(default_factory=dict)
+    day: str = ""
+    tokens_used: int = 0
+    last_seen: float = 0.0
+
+
+class RateLimiter:
+    """
+    按客户端（API key，没有时为 IP）与路由分组的令牌桶限流，以及按上报用量的每日 token 额度
+
+    每个分组一个令牌桶：容量为 burst，按 rate 个/秒补充，请求消耗一个令牌。
+    空闲超过 idle_ttl 的客户端在令牌桶已补满且当日没有用量时被定期清除。
+    """
+
+    def __init__(
+        self,
+        buckets: Dict[str, BucketConfig],
+        daily_tokens: int = 0,
+        idle_ttl: float = 3600,
+        sweep_interval: float = 60,
+    ):
+        self.buckets = buckets
+        self.daily_tokens = daily_tokens
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._clients: Dict[str, ClientState] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.limited = 0
+        self.over_quota = 0
+        self.evicted = 0
+
+    def check(self, client: str, group: str) -> Tuple[bool, float, str]:
+        """
+        检查并消耗一个令牌
+
+        Returns:
+            Tuple[bool, float, str]: (是否放行, 建议重试等待秒数, 拒绝原因 rate / quota)
+        """
+        config = self.buckets.get(group)
+        now = time.monotonic()
+        today = time.strftime("%Y-%m-%d")
+        with self._lock:
+            if now - self._last_sweep > self.sweep_interval:
+                self._sweep(now, today)
+            state = self._clients.get(client)
+            if state is None:
+                state = self._clients[client] = ClientState()
+            state.last_seen = now
+            if state.day != today:
+                state.day, state.tokens_used = today, 0
+
+            if self.daily_tokens and state.tokens_used >= self.daily_tokens:
+                self.over_quota += 1
+                return False, _seconds_until_midnight(), "quota"
+            if config is None:
+                self.allowed += 1
+                return True, 0.0, ""
+
+            bucket = state.buckets.get(group)
+            if bucket is None:
+                bucket = state.buckets[group] = [config.burst, now]
+            tokens = min(config.burst, bucket[0] + (now - bucket[1]) * config.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                self.limited += 1
+                return False, (1 - tokens) / config.rate if config.rate else 60.0, "rate"
+            bucket[0] = tokens - 1
+            self.allowed += 1
+            return True, 0.0, ""
+
+    def add_usage(self, client: str, tokens: int) -> None:
+        """记录客户端的模型 token 用量，计入当日额度"""
+        with self._lock:
+            state = self._clients.get(client)
+            if state is not None:
+                state.tokens_used += tokens
+
+    def _bucket_full(self, group: str, bucket: List[float], now: float) -> bool:
+        config = self.buckets.get(group)
+        return config is None or bucket[0] + (now - bucket[1]) * config.rate >= config.burst
+
+    def _sweep(self, now: float, today: str) -> None:
+        """清除空闲客户端：令牌桶已补满（删除后重建不放宽限制）且当日没有需要保留的用量"""
+        self._last_sweep = now
+        idle = [
+            client for client, state in self._clients.items()
+            if now - state.last_seen > self.idle_ttl
+            and (state.day != today or not state.tokens_used)
+            and all(self._bucket_full(group, bucket, now) for group, bucket in state.buckets.items())
+        ]
+        for client in idle:
+            del self._clients[client]
+        self.evicted += len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "over_quota": self.over_quota,
+                "evicted": self.evicted,
+                "daily_tokens": self.daily_tokens,
+                "buckets": {group: {"per_minute": round(config.rate * 60, 2), "burst": config.burst}
+                            for group, config in self.buckets.items()},
+            }
+
+
+def _seconds_until_midnight() -> float:
+    now = time.localtime()
+    return float(86400 - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec))
+
+
+class RateLimitMiddleware:
+    """
+    限流中间件：按路由分组限制请求频率，超过限制或当日 token 额度时返回 429
+
+    请求处理期间发起的模型调用用量通过 usage_sink 计入该客户端，包括提交后在后台执行的任务。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: RateLimiter,
+        route_groups: Optional[List[Tuple[str, Optional[Tuple[str, ...]], str]]] = None,
+        trust_forwarded: bool = False,
+    ) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.route_groups = route_groups or DEFAULT_ROUTE_GROUPS
+        self.trust_forwarded = trust_forwarded
+
+    def _group(self, method: str, path: str) -> Optional[str]:
+        for group, methods, prefix in self.route_groups:
+            if (methods is None or method in methods) and (path == prefix or path.startswith(prefix + "/")):
+                return group
+        return None
+
+    def _client(self, scope: Scope) -> str:
+        headers = Headers(scope=scope)
+        api_key = headers.get("x-api-key")
+        if api_key:
+            # 不在内存中保存明文 key
+            return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        forwarded = headers.get("x-forwarded-for") if self.trust_forwarded else None
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = self._group(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = self._client(scope)
+        allowed, retry_after, reason = self.limiter.check(client, group)
+        if not allowed:
+            if reason == "quota":
+                message = "今日模型调用额度已用完，请明日再试"
+            else:
+                message = "请求过于频繁，请稍后重试"
+            logger.warning(f"限流 {client} {group}: {reason}")
+            response = FastJSONResponse(
+                status_code=429,
+                content={"message": message, "data": None, "code": 429},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        with usage_sink(lambda tokens: self.limiter.add_usage(client, tokens)):
+            await self.app(scope, receive, send)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_loaded = False
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    获取进程级限流器，未通过环境变量 rate_limit=true 启用时返回 None
+
+    各分组的频率通过 rate_limit_diagnosis、rate_limit_herb、rate_limit_batch 配置，
+    格式为 "每分钟请求数/突发容量"；每日 token 额度通过 rate_limit_daily_tokens 配置，0 表示不限制。
+    """
+    global _limiter, _limiter_loaded
+    if not _limiter_loaded:
+        load_dotenv(".env")
+        if os.getenv("rate_limit", "false").strip().lower() in ("1", "true", "yes"):
+            _limiter = RateLimiter(
+                buckets={group: BucketConfig.parse(os.getenv(f"rate_limit_{group}", default))
+                         for group, default in DEFAULT_BUCKETS.items()},
+                daily_tokens=int(os.getenv("rate_limit_daily_tokens", "0")),
+                idle_ttl=float(os.getenv("rate_limit_idle_ttl", DEFAULT_IDLE_TTL)),
+            )
+        _limiter_loaded = True
+    return _limiter
+
+
+def rate_limit_trust_forwarded() -> bool:
+    """部署在反向代理之后时设置 rate_limit_trust_forwarded=true，按 X-Forwarded-For 识别客户端 IP"""
+    load_dotenv(".env")
+    return os.getenv("rate_limit_trust_forwarded", "false").strip().lower() in ("1", "true", "yes")
+
+
+def rate_limit_metrics() -> Dict[str, Any]:
+    """限流器的活跃客户端数、放行与拒绝次数"""
+    return _limiter.stats() if _limiter is not None else {}
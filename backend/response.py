@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时回退到标准库 json
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用 orjson 序列化的 JSON 响应，输出与 JSONResponse 一致（UTF-8、不转义中文、无多余空白）
+
+    未安装 orjson 时回退到 JSONResponse 的标准库实现。
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    解析逗号分隔的字段列表，字段名使用响应中的名称（如 continue）
+
+    Returns:
+        Optional[List[str]]: 未指定字段时返回 None
+
+    Raises:
+        ValueError: 包含诊断条目中不存在的字段
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    allowed = {field.alias or name for name, field in model.model_fields.items()}
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}，可选字段: {', '.join(sorted(allowed))}")
+    return list(dict.fromkeys(names)) or None
+
+
+def project_items(items: List[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+    """只保留诊断条目中指定的字段，条目中没有的字段不输出"""
+    return [{name: item[name] for name in fields if name in item} for item in items]
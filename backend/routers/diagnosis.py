@@ -1,32 +1,206 @@
+import asyncio
 import json
-from typing import Any, Dict, List, Union
+import math
+import uuid
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
 
-from fastapi import APIRouter, Response, status
+from fastapi import (APIRouter, BackgroundTasks, Query, Request, Response,
+                     status)
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
-from backend.element.ele_diagnosis import CreateDiagnosisRequest
+from backend.element.ele_diagnosis import (CreateDiagnosisRequest,
+                                           CreateShortlistRequest)
+from backend.element.ele_response import (DiagnosisItem, DiagnosisResponse,
+                                          HerbDiagnosisItem,
+                                          HerbDiagnosisResponse)
+from backend.response import FastJSONResponse, parse_fields, project_items
 from config.logger import logger
+from core.ai_diagnosis.cancellation import (CancelToken, RequestCancelled,
+                                            cancel_scope, count_cancellation)
+from core.ai_diagnosis.circuit_breaker import (CircuitOpenError,
+                                               get_circuit_breaker)
+from core.ai_diagnosis.deadline import (DeadlineExceeded, count_deadline,
+                                        deadline_scope, request_deadline)
 from core.ai_diagnosis.diagnosis import Diagnosis
+from core.ai_diagnosis.fallback import fallback_enabled, run_fallback
 from core.ai_diagnosis.herb_diagnosis import HerbDiagnosis
 from core.ai_diagnosis.re_diagnosis import ReDiagnosis
+from core.scheduling.scheduler import run_prioritized
+from utils.store.history_store import record_engine_result
+from utils.store.ttl_store import TTLStore
 
-router = APIRouter()
+T = TypeVar("T")
+
+# 客户端在响应前断开连接（沿用 nginx 的 499），响应不会被读取，仅用于访问日志
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+# 两阶段诊断支持的引擎，以及第一阶段结果的会话存储（供按需获取详情）
+TWO_STAGE_ENGINES = {
+    "diagnosis": Diagnosis,
+    "herb": HerbDiagnosis,
+}
+shortlist_sessions = TTLStore(maxsize=2048, ttl=1800)
+
+
+async def _watch_disconnect(request: Request, token: CancelToken) -> None:
+    """请求体已读完，之后收到的 ASGI 消息只会是 http.disconnect"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            token.cancel()
+            return
+
+
+async def _run_engine(
+    request: Request, engine_name: str, description: str, func: Callable[..., T], *args: Any
+) -> T:
+    """
+    熔断器放行后按急症分诊排队，在线程池中执行引擎，不阻塞事件循环
+
+    客户端断开连接时取消请求：排队中的直接归还名额，流式上游调用立即关闭，
+    不再发起续写等后续调用，也不再解析输出。
+
+    请求头 X-Request-Timeout / X-Request-Deadline 指定的截止时间传递给排队与每次上游调用，
+    并保存在 request.state.deadline 中，供响应标明是否为截止时间前的部分结果。
+    """
+    token = CancelToken()
+    deadline = request_deadline(request.headers)
+    request.state.deadline = deadline
+    watcher = asyncio.create_task(_watch_disconnect(request, token))
+    try:
+        with get_circuit_breaker(engine_name).guard(), cancel_scope(token), deadline_scope(deadline):
+            return await run_in_threadpool(run_prioritized, description, func, *args)
+    except RequestCancelled:
+        count_cancellation(engine_name)
+        logger.info(f"客户端已断开连接，取消诊断请求({engine_name})")
+        raise
+    except DeadlineExceeded as e:
+        count_deadline("exceeded")
+        logger.warning(f"诊断请求超过截止时间({engine_name}): {e}")
+        raise
+    finally:
+        watcher.cancel()
+
+
+def _client_closed() -> JSONResponse:
+    return FastJSONResponse(
+        status_code=HTTP_499_CLIENT_CLOSED_REQUEST,
+        content={
+            "message": "客户端已断开连接，诊断已取消",
+            "data": None,
+            "code": HTTP_499_CLIENT_CLOSED_REQUEST
+        }
+    )
+
+
+def _is_partial(request: Request) -> bool:
+    """引擎是否因截止时间跳过了续写、升级或补全详情，返回的是部分结果"""
+    deadline = getattr(request.state, "deadline", None)
+    if deadline is None or not deadline.partial:
+        return False
+    count_deadline("partial")
+    return True
+
+
+def _success_message(request: Request) -> str:
+    return "已达到请求截止时间，以下为截止前得到的部分结果" if _is_partial(request) else "诊断成功"
+
+
+def _deadline_exceeded() -> JSONResponse:
+    """截止时间前没有得到任何结果时返回 504"""
+    return FastJSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={
+            "message": "诊断未能在请求截止时间内完成，请放宽时限后重试",
+            "data": None,
+            "code": status.HTTP_504_GATEWAY_TIMEOUT
+        }
+    )
+
+
+def _circuit_open(e: CircuitOpenError) -> JSONResponse:
+    """上游熔断时直接返回 503，不再等待失败的上游调用"""
+    logger.warning(str(e))
+    return FastJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "message": "诊断服务暂时不可用，请稍后重试",
+            "data": None,
+            "code": status.HTTP_503_SERVICE_UNAVAILABLE
+        },
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
+
+
+def _fallback(
+    engine_name: str,
+    diagnosis_data: CreateDiagnosisRequest,
+    background_tasks: BackgroundTasks,
+    selected: Optional[List[str]],
+    reason: str,
+) -> JSONResponse:
+    """上游不可用时返回规则诊断的临时结果，消息与响应头 X-Diagnosis-Source 标明结果来源"""
+    fallback, result = run_fallback(engine_name, diagnosis_data.description, diagnosis_data.max_results, reason)
+    background_tasks.add_task(record_engine_result, fallback, diagnosis_data.description, result)
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "诊断服务暂时不可用，以下为基于规则的初步参考结果，请以兽医面诊为准" if result
+            else "诊断服务暂时不可用，请稍后重试",
+            "data": project_items(result, selected) if selected is not None else result,
+            "code": status.HTTP_200_OK
+        },
+        headers={"X-Diagnosis-Source": "fallback"},
+    )
+
+
+def _invalid_fields(e: ValueError) -> JSONResponse:
+    return FastJSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={
+            "message": str(e),
+            "data": None,
+            "code": status.HTTP_400_BAD_REQUEST
+        }
+    )
+
+
+def _projected(content: Dict[str, Any], selected: Optional[List[str]]) -> Union[Dict[str, Any], JSONResponse]:
+    """指定了 fields 时只保留所选字段，直接序列化，不经过完整条目的响应模型校验"""
+    if selected is None:
+        return content
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={**content, "data": project_items(content["data"], selected)},
+    )
 
 # /*--------------------------------------- api ------------------------------------------*/
 
-@router.post("/diagnosis", response_model=dict, status_code=status.HTTP_200_OK)
+@router.post(
+    "/diagnosis",
+    response_model=DiagnosisResponse,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+)
 async def create_diagnosis(
-    diagnosis_data: CreateDiagnosisRequest
-) -> JSONResponse:
+    request: Request,
+    diagnosis_data: CreateDiagnosisRequest,
+    background_tasks: BackgroundTasks,
+    fields: Optional[str] = Query(None, description="只返回指定字段，逗号分隔，如 disease,p"),
+) -> Union[Dict[str, Any], JSONResponse]:
     """创建诊断并返回诊断结果。"""
     logger.info(f"开始处理诊断请求: {diagnosis_data.description}")
     
+    selected = None
     try:
         
         # 检查输入是否为空
         if not diagnosis_data.description or not diagnosis_data.description.strip():
             logger.warning("诊断描述为空")
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "message": "诊断描述不能为空",
@@ -34,62 +208,88 @@ async def create_diagnosis(
                     "code": status.HTTP_400_BAD_REQUEST
                 }
             )
+        try:
+            selected = parse_fields(fields, DiagnosisItem)
+        except ValueError as e:
+            logger.warning(f"字段参数无效: {e}")
+            return _invalid_fields(e)
         diagnosis = Diagnosis()
-        result = diagnosis.diagnosis(diagnosis_data.description)
+        result = await _run_engine(
+            request,
+            "diagnosis",
+            diagnosis_data.description,
+            diagnosis.diagnosis,
+            diagnosis_data.description,
+            diagnosis_data.max_results,
+        )
         logger.info(f"result: {result}")
         # 确保返回的数据格式正确
         if not isinstance(result, list):
             logger.warning(f"诊断结果不是列表格式: {type(result)}")
             result = []
+        background_tasks.add_task(record_engine_result, diagnosis, diagnosis_data.description, result)
         
         # 如果结果为空，返回友好提示
         if len(result) == 0:
             logger.info("未获得有效诊断结果")
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content={
-                    "message": "未能根据提供的症状生成诊断结果，请提供更详细的症状描述",
-                    "data": [],
-                    "code": status.HTTP_200_OK
-                }
-            )
+            return {
+                "message": "未能根据提供的症状生成诊断结果，请提供更详细的症状描述",
+                "data": [],
+                "code": status.HTTP_200_OK
+            }
         
         logger.info(f"诊断完成，返回 {len(result)} 个诊断结果")
         
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content={
-                "message": "诊断成功",
-                "data": result,
-                "code": status.HTTP_200_OK
-            }
-        )
+        return _projected({
+            "message": _success_message(request),
+            "data": result,
+            "code": status.HTTP_200_OK
+        }, selected)
+    except RequestCancelled:
+        return _client_closed()
+    except DeadlineExceeded:
+        if fallback_enabled():
+            return _fallback("diagnosis", diagnosis_data, background_tasks, selected, "deadline")
+        return _deadline_exceeded()
+    except CircuitOpenError as e:
+        if fallback_enabled():
+            return _fallback("diagnosis", diagnosis_data, background_tasks, selected, "circuit_open")
+        return _circuit_open(e)
     except Exception as e:
         logger.error(f"诊断失败: {e}", exc_info=True)
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,  # 改为200状态码，但内容表示错误
-            content={
-                "message": "诊断服务暂时不可用，请稍后重试",
-                "data": [],
-                "code": status.HTTP_200_OK
-            }
-        )
+        if fallback_enabled():
+            return _fallback("diagnosis", diagnosis_data, background_tasks, selected, "error")
+        # 200状态码，内容表示错误
+        return {
+            "message": "诊断服务暂时不可用，请稍后重试",
+            "data": [],
+            "code": status.HTTP_200_OK
+        }
         
         
 
-@router.post("/herb", response_model=dict, status_code=status.HTTP_200_OK)
+@router.post(
+    "/herb",
+    response_model=HerbDiagnosisResponse,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+)
 async def create_diagnosis(
-    diagnosis_data: CreateDiagnosisRequest
-) -> JSONResponse:
+    request: Request,
+    diagnosis_data: CreateDiagnosisRequest,
+    background_tasks: BackgroundTasks,
+    fields: Optional[str] = Query(None, description="只返回指定字段，逗号分隔，如 zhengming,p,therapy"),
+) -> Union[Dict[str, Any], JSONResponse]:
     """创建诊断并返回诊断结果。"""
-    logger.info(f"开始处理诊断请求: {diagnosis_data.description}")
+    logger.info(f"开始处理中医诊断请求: {diagnosis_data.description}")
     
+    selected = None
     try:
         
         # 检查输入是否为空
         if not diagnosis_data.description or not diagnosis_data.description.strip():
             logger.warning("诊断描述为空")
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "message": "诊断描述不能为空",
@@ -97,43 +297,224 @@ async def create_diagnosis(
                     "code": status.HTTP_400_BAD_REQUEST
                 }
             )
+        try:
+            selected = parse_fields(fields, HerbDiagnosisItem)
+        except ValueError as e:
+            logger.warning(f"字段参数无效: {e}")
+            return _invalid_fields(e)
         diagnosis = HerbDiagnosis()
-        result = diagnosis.diagnosis(diagnosis_data.description)
+        result = await _run_engine(
+            request,
+            "herb",
+            diagnosis_data.description,
+            diagnosis.diagnosis,
+            diagnosis_data.description,
+            diagnosis_data.max_results,
+        )
         logger.info(f"result: {result}")
         # 确保返回的数据格式正确
         if not isinstance(result, list):
             logger.warning(f"诊断结果不是列表格式: {type(result)}")
             result = []
+        background_tasks.add_task(record_engine_result, diagnosis, diagnosis_data.description, result)
         
         # 如果结果为空，返回友好提示
         if len(result) == 0:
             logger.info("未获得有效诊断结果")
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content={
-                    "message": "未能根据提供的症状生成诊断结果，请提供更详细的症状描述",
-                    "data": [],
-                    "code": status.HTTP_200_OK
-                }
-            )
+            return {
+                "message": "未能根据提供的症状生成诊断结果，请提供更详细的症状描述",
+                "data": [],
+                "code": status.HTTP_200_OK
+            }
         
         logger.info(f"诊断完成，返回 {len(result)} 个诊断结果")
         
-        return JSONResponse(
+        return _projected({
+            "message": _success_message(request),
+            "data": result,
+            "code": status.HTTP_200_OK
+        }, selected)
+    except RequestCancelled:
+        return _client_closed()
+    except DeadlineExceeded:
+        if fallback_enabled():
+            return _fallback("herb", diagnosis_data, background_tasks, selected, "deadline")
+        return _deadline_exceeded()
+    except CircuitOpenError as e:
+        if fallback_enabled():
+            return _fallback("herb", diagnosis_data, background_tasks, selected, "circuit_open")
+        return _circuit_open(e)
+    except Exception as e:
+        logger.error(f"诊断失败: {e}", exc_info=True)
+        if fallback_enabled():
+            return _fallback("herb", diagnosis_data, background_tasks, selected, "error")
+        # 200状态码，内容表示错误
+        return {
+            "message": "诊断服务暂时不可用，请稍后重试",
+            "data": [],
+            "code": status.HTTP_200_OK
+        }
+
+
+# /*--------------------------------------- two-stage ------------------------------------------*/
+
+async def _create_shortlist(
+    request: Request, engine_name: str, diagnosis_data: CreateShortlistRequest
+) -> JSONResponse:
+    """两阶段诊断第一阶段：返回鉴别诊断列表及会话 id"""
+    logger.info(f"开始处理两阶段诊断请求({engine_name}): {diagnosis_data.description}")
+
+    if not diagnosis_data.description or not diagnosis_data.description.strip():
+        logger.warning("诊断描述为空")
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "message": "诊断描述不能为空",
+                "data": None,
+                "code": status.HTTP_400_BAD_REQUEST
+            }
+        )
+
+    try:
+        engine = TWO_STAGE_ENGINES[engine_name]()
+        if diagnosis_data.detail_top_n > 0:
+            items = await _run_engine(
+                request,
+                engine_name,
+                diagnosis_data.description,
+                engine.two_stage_diagnosis,
+                diagnosis_data.description,
+                diagnosis_data.max_results,
+                diagnosis_data.detail_top_n,
+            )
+        else:
+            items = await _run_engine(
+                request,
+                engine_name,
+                diagnosis_data.description,
+                engine.shortlist,
+                diagnosis_data.description,
+                diagnosis_data.max_results,
+            )
+
+        partial = _is_partial(request)
+        session_id = uuid.uuid4().hex
+        shortlist_sessions.set(session_id, {
+            "engine": engine_name,
+            "description": diagnosis_data.description,
+            "items": items,
+            # 截止时间前未能补全的详情可以之后按需获取
+            "detailed": set() if partial else set(range(min(diagnosis_data.detail_top_n, len(items)))),
+        })
+        logger.info(f"鉴别诊断完成，会话 {session_id}，返回 {len(items)} 个诊断结果")
+
+        if not items:
+            message = "未能根据提供的症状生成诊断结果，请提供更详细的症状描述"
+        elif partial:
+            message = "已达到请求截止时间，部分诊断的详情未能补全，可通过 /diagnosis/{id}/details 获取"
+        else:
+            message = "诊断成功"
+        return FastJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
-                "message": "诊断成功",
-                "data": result,
+                "message": message,
+                "data": {"id": session_id, "items": items},
                 "code": status.HTTP_200_OK
             }
         )
+    except RequestCancelled:
+        return _client_closed()
+    except DeadlineExceeded:
+        return _deadline_exceeded()
+    except CircuitOpenError as e:
+        return _circuit_open(e)
     except Exception as e:
-        logger.error(f"诊断失败: {e}", exc_info=True)
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,  # 改为200状态码，但内容表示错误
+        logger.error(f"鉴别诊断失败: {e}", exc_info=True)
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
             content={
                 "message": "诊断服务暂时不可用，请稍后重试",
-                "data": [],
+                "data": None,
                 "code": status.HTTP_200_OK
             }
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/diagnosis/shortlist", response_model=dict, status_code=status.HTTP_200_OK)
+async def create_diagnosis_shortlist(
+    request: Request,
+    diagnosis_data: CreateShortlistRequest
+) -> JSONResponse:
+    """两阶段西医诊断：快速返回鉴别诊断列表，详情通过 /diagnosis/{id}/details 获取。"""
+    return await _create_shortlist(request, "diagnosis", diagnosis_data)
+
+
+@router.post("/herb/shortlist", response_model=dict, status_code=status.HTTP_200_OK)
+async def create_herb_shortlist(
+    request: Request,
+    diagnosis_data: CreateShortlistRequest
+) -> JSONResponse:
+    """两阶段中医诊断：快速返回辨证列表，详情通过 /diagnosis/{id}/details 获取。"""
+    return await _create_shortlist(request, "herb", diagnosis_data)
+
+
+@router.get("/diagnosis/{session_id}/details", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_diagnosis_details(
+    request: Request,
+    session_id: str,
+    rank: int = Query(0, ge=0, description="鉴别诊断列表中的序号，从0开始"),
+) -> JSONResponse:
+    """按需补全两阶段诊断中某一条诊断的治疗与用药详情。"""
+    session = shortlist_sessions.get(session_id)
+    if session is None or rank >= len(session["items"]):
+        return FastJSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "message": "诊断会话不存在或已过期",
+                "data": None,
+                "code": status.HTTP_404_NOT_FOUND
+            }
+        )
+
+    if rank in session["detailed"]:
+        item = session["items"][rank]
+    else:
+        try:
+            engine = TWO_STAGE_ENGINES[session["engine"]]()
+            item = await _run_engine(
+                request,
+                session["engine"],
+                session["description"],
+                engine.details,
+                session["description"],
+                session["items"][rank],
+            )
+            if _is_partial(request):
+                return _deadline_exceeded()
+            session["items"][rank] = item
+            session["detailed"].add(rank)
+        except RequestCancelled:
+            return _client_closed()
+        except DeadlineExceeded:
+            return _deadline_exceeded()
+        except CircuitOpenError as e:
+            return _circuit_open(e)
+        except Exception as e:
+            logger.error(f"诊断详情生成失败: {e}", exc_info=True)
+            return FastJSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={
+                    "message": "诊断服务暂时不可用，请稍后重试",
+                    "data": None,
+                    "code": status.HTTP_200_OK
+                }
+            )
+
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "诊断成功",
+            "data": item,
+            "code": status.HTTP_200_OK
+        }
+    )
@@ -0,0 +1,136 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from utils.store.history_export import (DEFAULT_ROW_GROUP_SIZE,
+                                        EXPORT_FORMATS, iter_jsonl_lines,
+                                        iter_parquet_bytes)
+from utils.store.history_store import get_history_store
+
+router = APIRouter()
+
+
+def _history_disabled() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_404_NOT_FOUND,
+        content={
+            "message": "诊断历史未启用",
+            "data": None,
+            "code": status.HTTP_404_NOT_FOUND
+        }
+    )
+
+# /*--------------------------------------- api ------------------------------------------*/
+
+@router.get("/history", response_model=dict, status_code=status.HTTP_200_OK)
+async def list_history(
+    page: int = Query(1, ge=1, description="页码，从1开始"),
+    page_size: int = Query(20, ge=1, le=100, description="每页条数"),
+    engine: Optional[str] = Query(None, description="引擎名称，如 diagnosis、herb_diagnosis"),
+    start: Optional[datetime] = Query(None, description="起始时间（含），ISO 8601 格式"),
+    end: Optional[datetime] = Query(None, description="结束时间（不含），ISO 8601 格式"),
+) -> JSONResponse:
+    """按时间倒序分页查询诊断历史。"""
+    store = get_history_store()
+    if store is None:
+        return _history_disabled()
+
+    # SQLite 查询是同步阻塞的，放到线程池中执行，避免阻塞事件循环
+    items, total = await run_in_threadpool(
+        store.query,
+        page=page,
+        page_size=page_size,
+        engine=engine,
+        start=start.timestamp() if start else None,
+        end=end.timestamp() if end else None,
+    )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": {"items": items, "total": total, "page": page, "page_size": page_size},
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/history/export", status_code=status.HTTP_200_OK)
+async def export_history(
+    format: str = Query("jsonl", description=f"导出格式：{' / '.join(EXPORT_FORMATS)}"),
+    engine: Optional[str] = Query(None, description="引擎名称，如 diagnosis、herb_diagnosis"),
+    start: Optional[datetime] = Query(None, description="起始时间（含），ISO 8601 格式"),
+    end: Optional[datetime] = Query(None, description="结束时间（不含），ISO 8601 格式"),
+    row_group_size: int = Query(DEFAULT_ROW_GROUP_SIZE, ge=1000, le=1_000_000, description="Parquet row group 行数"),
+):
+    """按块流式导出诊断历史，Parquet 每写完一个 row group 发送一次。"""
+    store = get_history_store()
+    if store is None:
+        return _history_disabled()
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "message": f"不支持的导出格式: {format}",
+                "data": None,
+                "code": status.HTTP_400_BAD_REQUEST
+            }
+        )
+
+    filters = {
+        "engine": engine,
+        "start": start.timestamp() if start else None,
+        "end": end.timestamp() if end else None,
+    }
+    filename = f"diagnosis_history_{datetime.now():%Y%m%d%H%M%S}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "parquet":
+        try:
+            content = iter_parquet_bytes(store, row_group_size=row_group_size, **filters)
+            # 提前执行到第一个 row group，pyarrow 未安装时直接返回错误而不是中断的响应
+            first = await run_in_threadpool(next, content)
+        except RuntimeError as e:
+            return JSONResponse(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                content={
+                    "message": str(e),
+                    "data": None,
+                    "code": status.HTTP_501_NOT_IMPLEMENTED
+                }
+            )
+
+        def body():
+            yield first
+            yield from content
+
+        return StreamingResponse(body(), media_type="application/vnd.apache.parquet", headers=headers)
+    return StreamingResponse(iter_jsonl_lines(store, **filters), media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/history/{record_id}", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_history(record_id: int) -> JSONResponse:
+    """获取单条诊断历史，包括原始输出与各阶段耗时。"""
+    store = get_history_store()
+    if store is None:
+        return _history_disabled()
+
+    item = await run_in_threadpool(store.get, record_id)
+    if item is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "message": "诊断记录不存在",
+                "data": None,
+                "code": status.HTTP_404_NOT_FOUND
+            }
+        )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": item,
+            "code": status.HTTP_200_OK
+        }
+    )
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from backend.element.ele_job import CreateJobRequest
+from backend.response import FastJSONResponse
+from config.logger import logger
+from core.jobs.callback import InvalidCallbackUrl, validate_callback_url
+from core.jobs.job_manager import JobQueueFull, get_job_backend
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+# /*--------------------------------------- api ------------------------------------------*/
+
+@router.post("/jobs", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(job_data: CreateJobRequest) -> JSONResponse:
+    """提交异步诊断任务，立即返回任务 id，结果通过 /jobs/{id} 查询或推送到回调地址。"""
+    logger.info(f"开始处理诊断任务请求({job_data.engine}): {job_data.description}")
+
+    if not job_data.description or not job_data.description.strip():
+        logger.warning("诊断描述为空")
+        return FastJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "message": "诊断描述不能为空",
+                "data": None,
+                "code": status.HTTP_400_BAD_REQUEST
+            }
+        )
+
+    callback_url = str(job_data.callback_url) if job_data.callback_url else None
+    if callback_url:
+        try:
+            # 校验需要解析域名，放到线程池中执行
+            await run_in_threadpool(validate_callback_url, callback_url)
+        except InvalidCallbackUrl as e:
+            logger.warning(f"诊断任务回调地址不允许: {e}")
+            return FastJSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "message": f"回调地址不允许: {e}",
+                    "data": None,
+                    "code": status.HTTP_400_BAD_REQUEST
+                }
+            )
+
+    try:
+        job = get_job_backend().submit(
+            job_data.engine,
+            job_data.description,
+            job_data.max_results,
+            callback_url,
+        )
+    except JobQueueFull as e:
+        logger.warning(f"诊断任务提交失败: {e}")
+        return FastJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "message": "任务队列已满，请稍后重试",
+                "data": None,
+                "code": status.HTTP_503_SERVICE_UNAVAILABLE
+            }
+        )
+
+    logger.info(f"诊断任务已提交: {job['id']}")
+    return FastJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "message": "任务已提交",
+            "data": job,
+            "code": status.HTTP_202_ACCEPTED
+        }
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_job(job_id: str) -> JSONResponse:
+    """查询异步诊断任务的状态：queued / running / succeeded / failed，完成后包含诊断结果。"""
+    job = get_job_backend().get(job_id)
+    if job is None:
+        return FastJSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "message": "任务不存在或已过期",
+                "data": None,
+                "code": status.HTTP_404_NOT_FOUND
+            }
+        )
+
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": job,
+            "code": status.HTTP_200_OK
+        }
+    )
@@ -0,0 +1,202 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from backend.middleware.rate_limit import rate_limit_metrics
+from core.ai_diagnosis.cancellation import cancellation_metrics
+from core.ai_diagnosis.circuit_breaker import circuit_breaker_metrics
+from core.ai_diagnosis.deadline import deadline_metrics
+from core.ai_diagnosis.fallback import fallback_metrics
+from core.ai_diagnosis.http_client import http_client_metrics
+from core.ai_diagnosis.tiering import tier_metrics
+from core.ai_diagnosis.upstream import upstream_metrics
+from core.ai_diagnosis.warmup import warmup_metrics
+from core.jobs.job_manager import job_metrics
+from core.scheduling.scheduler import scheduling_metrics
+from utils.cache.persistent_cache import persistent_cache_metrics
+from utils.cache.semantic_cache import semantic_cache_metrics
+from utils.store.history_store import history_metrics
+
+router = APIRouter()
+
+# /*--------------------------------------- api ------------------------------------------*/
+
+@router.get("/metrics/upstreams", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_upstream_metrics() -> JSONResponse:
+    """各引擎上游推理服务的健康状态、进行中请求数、EWMA 延迟与错误统计。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": upstream_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/tiers", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_tier_metrics() -> JSONResponse:
+    """各引擎路由到小模型、大模型的请求数及小模型结果升级次数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": tier_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/http", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_http_metrics() -> JSONResponse:
+    """共享 HTTP 连接池的连接数、利用率与连接复用情况。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": http_client_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/semantic_cache", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_semantic_cache_metrics() -> JSONResponse:
+    """各引擎近似缓存的条目数与命中情况。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": semantic_cache_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/persistent_cache", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_persistent_cache_metrics() -> JSONResponse:
+    """持久化缓存的条目数、占用空间与命中情况。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": persistent_cache_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/warmup", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_warmup_metrics() -> JSONResponse:
+    """最近一次缓存预热的状态：载入、生成、跳过的描述数及耗时。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": warmup_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/history", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_history_metrics() -> JSONResponse:
+    """诊断历史写入队列长度、已写入批次与丢弃条数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": history_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/jobs", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_job_metrics() -> JSONResponse:
+    """异步诊断任务的排队数、完成与失败次数及回调失败次数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": job_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/scheduling", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_scheduling_metrics() -> JSONResponse:
+    """引擎并发限制器的执行中与排队请求数，以及急症、加急、普通请求的放行次数与等待时间。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": scheduling_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/rate_limit", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_rate_limit_metrics() -> JSONResponse:
+    """限流器的活跃客户端数、放行、超频与超出每日额度的拒绝次数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": rate_limit_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/circuit_breakers", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_circuit_breaker_metrics() -> JSONResponse:
+    """各引擎熔断器的状态、窗口内错误率与慢调用比例、拒绝次数及最近的状态变化。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": circuit_breaker_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/fallback", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_fallback_metrics() -> JSONResponse:
+    """各引擎因上游熔断或诊断出错返回规则诊断结果的次数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": fallback_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/cancellations", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_cancellation_metrics() -> JSONResponse:
+    """客户端断开连接后取消的请求数、中途关闭的上游流式请求数与省下的上游调用数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": cancellation_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
+
+
+@router.get("/metrics/deadlines", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_deadline_metrics() -> JSONResponse:
+    """带截止时间的请求数、超时无结果与返回部分结果的次数，以及因剩余时间不足跳过的续写、重试等调用次数。"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "获取成功",
+            "data": deadline_metrics(),
+            "code": status.HTTP_200_OK
+        }
+    )
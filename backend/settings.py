@@ -27,6 +27,11 @@ class Settings(BaseSettings):
     CORS_EXPOSE_HEADERS: List[str] = Field(description="Headers exposed to the browser")
     CORS_MAX_AGE: int = Field(description="Maximum age for CORS preflight cache (in seconds)")
 
+    # Response Compression
+    COMPRESSION_MINIMUM_SIZE: int = Field(default=1024, description="响应体达到该字节数才压缩")
+    COMPRESSION_GZIP_LEVEL: int = Field(default=6, description="gzip 压缩级别(1-9)")
+    COMPRESSION_BROTLI_QUALITY: int = Field(default=5, description="brotli 压缩质量(0-11)，需安装 brotli")
+
     # Database Configuration
     MONGO_URI: str = Field(description="MongoDB connection URI")
     MONGO_DB_NAME: str = Field(description="MongoDB database name")
@@ -0,0 +1,110 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from core.ai_diagnosis.deadline import (DeadlineExceeded, call_timeout,
+                                        can_start_call)
+
+
+class RequestCancelled(BaseException):
+    """
+    请求已取消（如客户端断开连接），不再发起新的上游调用，也不再解析已有输出
+
+    与 asyncio.CancelledError 一样继承 BaseException，引擎中捕获 Exception 的
+    小模型升级、JSON 修复等容错逻辑不会把取消当作普通失败处理。
+    """
+
+
+class CancelToken:
+    """跨线程的取消标记：事件循环中的断开检测设置，线程池中执行的引擎在检查点读取"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "client_disconnected") -> None:
+        self.reason = reason
+        self._event.set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+
+# 当前请求的取消标记，由路由设置；线程池执行时随上下文传递
+_cancel_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """在此上下文中发起的模型调用都会在检查点响应 token 的取消"""
+    reset = _cancel_token.set(token)
+    try:
+        yield token
+    finally:
+        _cancel_token.reset(reset)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _cancel_token.get()
+
+
+def check_cancelled(skipped_call: bool = False) -> None:
+    """
+    当前请求已取消时抛出 RequestCancelled，没有取消标记（如后台任务、预热）时不做任何事
+
+    Args:
+        skipped_call: 检查点位于发起上游调用之前，取消时计为一次省下的上游调用
+    """
+    token = _cancel_token.get()
+    if token is None or not token.cancelled:
+        return
+    if skipped_call:
+        count_cancellation("upstream_calls_skipped")
+    raise RequestCancelled(token.reason)
+
+
+def count_cancellation(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class CheckpointModel:
+    """
+    模型包装器代理：每次调用模型前检查请求是否已取消，以及剩余时间是否足够
+
+    用于 ReAct 等由外部库循环调用模型的场景，每一轮迭代都会经过检查点。
+    有截止时间时每次调用的超时为剩余时间，剩余时间不足时不再开始新一轮迭代。
+    """
+
+    def __init__(self, model: Any):
+        self._model = model
+        self._calls = 0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        check_cancelled(skipped_call=True)
+        if self._calls and not can_start_call("react_iteration"):
+            raise DeadlineExceeded("剩余时间不足以继续 ReAct 迭代")
+        timeout = call_timeout()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        self._calls += 1
+        return self._model(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+
+def cancellation_metrics() -> Dict[str, int]:
+    """被取消的请求数（按引擎）、中途关闭的上游流式请求数与因取消省下的上游调用数"""
+    with _stats_lock:
+        return dict(_stats)
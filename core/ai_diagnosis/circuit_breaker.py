@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_CALLS = 5
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_SLOW_CALL_SECONDS = 60
+DEFAULT_SLOW_RATE = 0.8
+DEFAULT_OPEN_SECONDS = 30
+DEFAULT_HALF_OPEN_CALLS = 2
+# 最近的状态变化保留条数
+MAX_TRANSITIONS = 20
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"引擎 {name} 上游熔断中，{retry_after:.0f}s 后重试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    引擎级熔断器：按最近 window 次上游调用的错误率与慢调用比例切换状态
+
+    - closed：正常放行；调用数达到 min_calls 且错误率或慢调用比例超过阈值时打开
+    - open：直接拒绝，open_seconds 秒后进入半开
+    - half_open：最多同时放行 half_open_calls 个试探请求，试探调用成功 half_open_calls 次后关闭，
+      任一次失败或过慢立即重新打开
+
+    结果由 record() 在每次上游调用结束时记录，放行由 guard() 在请求进入引擎前判断；
+    命中缓存等没有上游调用的请求不影响状态。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = DEFAULT_WINDOW,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        error_rate: float = DEFAULT_ERROR_RATE,
+        slow_call_seconds: float = DEFAULT_SLOW_CALL_SECONDS,
+        slow_rate: float = DEFAULT_SLOW_RATE,
+        open_seconds: float = DEFAULT_OPEN_SECONDS,
+        half_open_calls: int = DEFAULT_HALF_OPEN_CALLS,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        # 每次进入半开加一，用于区分试探名额属于哪一轮半开
+        self._half_open_round = 0
+        self.rejected = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=MAX_TRANSITIONS)
+
+    def _transition(self, state: str, reason: str) -> None:
+        """切换状态，调用方需持有锁"""
+        logger.warning(f"熔断器 {self.name}: {self.state} -> {state}（{reason}）")
+        self.transitions.append({
+            "from": self.state,
+            "to": state,
+            "reason": reason,
+            "at": datetime.now().isoformat(timespec="seconds"),
+        })
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == HALF_OPEN:
+            self._half_open_round += 1
+        if state != CLOSED:
+            self._trials = 0
+            self._trial_successes = 0
+        self._calls.clear()
+
+    def _acquire(self) -> Tuple[bool, int]:
+        """
+        在同一次加锁内完成状态检查、打开到半开的切换与试探名额的占用
+
+        Returns:
+            tuple: (是否放行, 占用的试探名额所属的半开轮次，未占用名额时为 0)
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False, 0
+                self._transition(HALF_OPEN, f"打开 {self.open_seconds:.0f}s 后试探")
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self.rejected += 1
+                    return False, 0
+                self._trials += 1
+                return True, self._half_open_round
+            return True, 0
+
+    def allow(self) -> bool:
+        """判断是否放行一个请求，半开状态下放行时占用一个试探名额，需配合 release() 归还"""
+        return self._acquire()[0]
+
+    def release(self, trial_round: Optional[int] = None) -> None:
+        """
+        请求结束，归还半开状态下的试探名额
+
+        Args:
+            trial_round: 占用名额时所在的半开轮次，None 表示当前轮次；
+                在关闭状态或上一轮半开中放行的请求（0 或旧轮次）不会归还本轮的名额
+        """
+        with self._lock:
+            if trial_round is None:
+                trial_round = self._half_open_round
+            if self.state == HALF_OPEN and trial_round == self._half_open_round and self._trials > 0:
+                self._trials -= 1
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 1.0
+            return max(1.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        在熔断器保护下执行一次请求
+
+        Raises:
+            CircuitOpenError: 熔断器打开或半开试探名额已满
+        """
+        allowed, trial_round = self._acquire()
+        if not allowed:
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            yield
+        finally:
+            self.release(trial_round)
+
+    def record(self, latency: float, error: Optional[BaseException]) -> None:
+        """记录一次上游调用的结果"""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if error is not None or slow:
+                    self._transition(OPEN, "试探调用失败" if error is not None else f"试探调用耗时 {latency:.1f}s")
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_calls:
+                    self._transition(CLOSED, f"试探调用成功 {self._trial_successes} 次")
+                return
+            if self.state == OPEN:
+                return
+
+            self._calls.append((error is not None, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            errors = sum(1 for failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, is_slow in self._calls if is_slow)
+            if errors / len(self._calls) >= self.error_rate:
+                self._transition(OPEN, f"最近 {len(self._calls)} 次调用失败 {errors} 次")
+            elif slow_calls / len(self._calls) >= self.slow_rate:
+                self._transition(OPEN, f"最近 {len(self._calls)} 次调用慢调用 {slow_calls} 次")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "error_rate": round(sum(1 for failed, _ in self._calls if failed) / calls, 4) if calls else 0.0,
+                "slow_rate": round(sum(1 for _, slow in self._calls if slow) / calls, 4) if calls else 0.0,
+                "rejected": self.rejected,
+                "transitions": list(self.transitions),
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker_enabled() -> bool:
+    load_dotenv(".env")
+    return os.getenv("circuit_breaker", "true").strip().lower() not in ("0", "false", "no")
+
+
+def get_circuit_breaker(engine: str) -> CircuitBreaker:
+    """
+    获取引擎的进程级熔断器，同一引擎的大、小模型档位共享
+
+    阈值通过 breaker_window、breaker_min_calls、breaker_error_rate、breaker_slow_call_seconds、
+    breaker_slow_rate、breaker_open_seconds、breaker_half_open_calls 配置；
+    circuit_breaker=false 时熔断器只统计、从不打开。
+    """
+    name = engine.split(":")[0]
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+    with _breakers_lock:
+        if name not in _breakers:
+            load_dotenv(".env")
+            enabled = circuit_breaker_enabled()
+            _breakers[name] = CircuitBreaker(
+                name,
+                window=int(os.getenv("breaker_window", DEFAULT_WINDOW)),
+                min_calls=int(os.getenv("breaker_min_calls", DEFAULT_MIN_CALLS)),
+                error_rate=float(os.getenv("breaker_error_rate", DEFAULT_ERROR_RATE)) if enabled else 2.0,
+                slow_call_seconds=float(os.getenv("breaker_slow_call_seconds", DEFAULT_SLOW_CALL_SECONDS)),
+                slow_rate=float(os.getenv("breaker_slow_rate", DEFAULT_SLOW_RATE)) if enabled else 2.0,
+                open_seconds=float(os.getenv("breaker_open_seconds", DEFAULT_OPEN_SECONDS)),
+                half_open_calls=int(os.getenv("breaker_half_open_calls", DEFAULT_HALF_OPEN_CALLS)),
+            )
+        return _breakers[name]
+
+
+def circuit_breaker_metrics() -> Dict[str, Any]:
+    """各引擎熔断器的状态、窗口内错误率与慢调用比例、拒绝次数及最近的状态变化"""
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
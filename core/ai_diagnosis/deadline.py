@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, Mapping, Optional
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+# 剩余时间不足该秒数时不再发起新的上游调用（续写、重试、升级、补全详情、ReAct 迭代）
+DEFAULT_MIN_CALL_SECONDS = 2.0
+DEFAULT_MAX_TIMEOUT = 600.0
+
+TIMEOUT_HEADER = "x-request-timeout"
+DEADLINE_HEADER = "x-request-deadline"
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求截止时间已到，且没有可以返回的部分结果"""
+
+
+class Deadline:
+    """
+    一次请求的时间预算，随上下文传递给引擎
+
+    上游调用的超时不超过剩余时间；剩余时间不足 min_call_seconds 时不再发起新的调用，
+    并把 partial 置为 True，表示返回的是截止时间前得到的部分结果。
+    """
+
+    def __init__(self, timeout: float, min_call_seconds: float = DEFAULT_MIN_CALL_SECONDS):
+        self.timeout = timeout
+        self.expires = time.monotonic() + timeout
+        self.min_call_seconds = min_call_seconds
+        self.partial = False
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def skip(self, what: str) -> None:
+        """记录一项因时间不足而跳过的工作，结果标记为部分结果"""
+        self.partial = True
+        count_deadline(f"{what}_skipped")
+        logger.info(f"剩余时间 {self.remaining():.1f}s 不足，跳过{what}，返回部分结果")
+
+
+# 当前请求的截止时间，由路由设置；线程池执行时随上下文传递
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+_config: Optional[Dict[str, Optional[float]]] = None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """在此上下文中执行的引擎遵守 deadline，为 None 时不限时"""
+    reset = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(reset)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def check_deadline() -> None:
+    """截止时间已到时抛出 DeadlineExceeded，没有截止时间时不做任何事"""
+    deadline = _deadline.get()
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(f"已超过请求截止时间（{deadline.timeout:.1f}s）")
+
+
+def call_timeout() -> Optional[float]:
+    """本次上游调用的超时秒数，即剩余时间；没有截止时间时为 None（使用连接池的默认超时）"""
+    check_deadline()
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def can_start_call(what: str) -> bool:
+    """
+    判断剩余时间是否足够再发起一次上游调用，不足时记录跳过的工作
+
+    Args:
+        what: 将要发起的调用，如 continuation、retry、escalation，用于日志与统计
+    """
+    deadline = _deadline.get()
+    if deadline is None or deadline.remaining() >= deadline.min_call_seconds:
+        return True
+    deadline.skip(what)
+    return False
+
+
+def result_is_partial() -> bool:
+    """当前请求是否因截止时间跳过了部分工作，部分结果不应写入结果缓存"""
+    deadline = _deadline.get()
+    return deadline is not None and deadline.partial
+
+
+def _parse_duration(value: str) -> float:
+    value = value.strip().lower()
+    if value.endswith("ms"):
+        return float(value[:-2]) / 1000
+    if value.endswith("s"):
+        return float(value[:-1])
+    return float(value)
+
+
+def _parse_timestamp(value: str) -> float:
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        raise ValueError(f"截止时间缺少时区: {value}")
+    return parsed.timestamp()
+
+
+def parse_deadline_headers(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """
+    从请求头解析时间预算（秒）
+
+    - X-Request-Timeout：相对时长，如 10、10s、1500ms
+    - X-Request-Deadline：绝对截止时间，Unix 时间戳（秒）或带时区的 ISO 8601 时间
+
+    两者同时存在时取较早者，都不存在时返回 None。
+
+    Raises:
+        ValueError: 请求头的值无法解析
+    """
+    now = time.time() if now is None else now
+    budgets = []
+    timeout = headers.get(TIMEOUT_HEADER)
+    if timeout:
+        budgets.append(_parse_duration(timeout))
+    deadline = headers.get(DEADLINE_HEADER)
+    if deadline:
+        budgets.append(_parse_timestamp(deadline) - now)
+    return min(budgets) if budgets else None
+
+
+def _load_config() -> Dict[str, Optional[float]]:
+    global _config
+    if _config is None:
+        load_dotenv(".env")
+        default = os.getenv("request_timeout")
+        _config = {
+            "default": float(default) if default else None,
+            "max": float(os.getenv("request_timeout_max", DEFAULT_MAX_TIMEOUT)),
+            "min_call_seconds": float(os.getenv("deadline_min_call_seconds", DEFAULT_MIN_CALL_SECONDS)),
+        }
+    return _config
+
+
+def request_deadline(headers: Mapping[str, str]) -> Optional[Deadline]:
+    """
+    按请求头创建截止时间，请求未指定时使用 request_timeout 配置的默认值（未配置则不限时）
+
+    预算不超过 request_timeout_max；无法解析的请求头记录警告后按未指定处理。
+    """
+    config = _load_config()
+    try:
+        timeout = parse_deadline_headers(headers)
+    except ValueError as e:
+        logger.warning(f"截止时间请求头无法解析，已忽略: {e}")
+        timeout = None
+    if timeout is None:
+        timeout = config["default"]
+    if timeout is None:
+        return None
+    count_deadline("requests")
+    return Deadline(min(timeout, config["max"]), config["min_call_seconds"])
+
+
+def count_deadline(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def deadline_metrics() -> Dict[str, int]:
+    """带截止时间的请求数、超时无结果与返回部分结果的次数，以及因时间不足跳过的各项工作次数"""
+    with _stats_lock:
+        return dict(_stats)
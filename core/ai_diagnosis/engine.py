@@ -0,0 +1,508 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.deadline import (DeadlineExceeded, can_start_call,
+                                        current_deadline, result_is_partial)
+from core.ai_diagnosis.generation import (FORMAT_GUARD_TOKENS, build_messages,
+                                          generate_compact,
+                                          generate_structured, generate_table,
+                                          resolve_max_results)
+from core.ai_diagnosis.tiering import TierRouter
+from core.ai_diagnosis.upstream import UpstreamPool
+from utils.cache.persistent_cache import get_persistent_cache, make_cache_key
+from utils.cache.semantic_cache import get_semantic_cache
+from utils.json.schema import resolve_structured_output
+from utils.parser.compact import (parse_compact_rows, resolve_delimiter,
+                                  resolve_output_format)
+
+# 两阶段诊断默认并行补全详情的条数
+DEFAULT_DETAIL_TOP_N = 2
+
+
+def extract_table_only(text: str) -> str:
+    """从文本中提取第一个 Markdown 表格块"""
+    pattern = r"(\|.+\|(?:\n\|[-\s|]+\|)?(?:\n\|.*\|)+)"
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else text
+
+
+def parse_diagnosis_table(table_str: str) -> List[Dict[str, str]]:
+    """
+    解析Markdown表格，自动补齐缺失列，避免因列数不匹配导致丢失整行
+    """
+    lines = [line.strip() for line in table_str.strip().split('\n') if line.strip()]
+    if len(lines) < 3:
+        return []
+
+    headers = [h.strip() for h in lines[0].strip('|').split('|')]
+    expected_col_count = len(headers)
+
+    results = []
+
+    for line in lines[2:]:  # 跳过分隔线
+        cols = [c.strip() for c in line.strip('|').split('|')]
+        if len(cols) < expected_col_count:
+            # 补齐缺失列
+            cols += [''] * (expected_col_count - len(cols))
+            logger.warning(f"发现列数不足，自动补齐：{cols}")
+        if len(cols) != expected_col_count:
+            logger.warning(f"跳过异常行，列数不匹配：{line}")
+            continue
+        results.append(dict(zip(headers, cols)))
+
+    return results
+
+
+def parse_probability(p_value: str) -> float:
+    """
+    尝试从字符串中提取概率值，如果无法解析则返回默认值
+    """
+    if not p_value:
+        return 0.0
+
+    # 结构化输出中的概率已经是数字
+    if isinstance(p_value, (int, float)):
+        return float(p_value)
+
+    # 移除空格和常见的中文字符
+    p_clean = p_value.strip()
+
+    # 尝试直接转换为浮点数
+    try:
+        return float(p_clean)
+    except ValueError:
+        pass
+
+    # 尝试提取数字（支持百分比）
+    number_pattern = r'(\d+(?:\.\d+)?)'
+    matches = re.findall(number_pattern, p_clean)
+
+    if matches:
+        try:
+            num = float(matches[0])
+            # 如果包含%符号，转换为小数
+            if '%' in p_clean:
+                return num / 100.0
+            # 如果数字大于1，可能是百分比格式
+            elif num > 1:
+                return num / 100.0
+            else:
+                return num
+        except ValueError:
+            pass
+
+    # 根据关键词给出默认概率值
+    if any(keyword in p_clean for keyword in ['良好', '优', '高']):
+        return 0.8
+    elif any(keyword in p_clean for keyword in ['一般', '中等', '谨慎']):
+        return 0.6
+    elif any(keyword in p_clean for keyword in ['差', '低', '严重', '危险']):
+        return 0.3
+
+    logger.warning(f"无法解析概率值: {p_value}，使用默认值 0.5")
+    return 0.5
+
+
+class DiagnosisEngine:
+    """
+    西医与中医诊断引擎的公共流程：缓存查询、按档位调用模型、三种输出格式的解析、
+    两阶段诊断以及诊断历史所需的 trace
+
+    子类提供输出列、生成参数与 token 预算、结果格式化函数、提示词（_init_prompt）
+    以及用户消息模板，模板中可使用 {max_results}，详情模板中可使用 {name}、{description}。
+    """
+
+    # 诊断历史、缓存与结构化输出 schema 使用的引擎名
+    engine_name: str
+    # 上游与档位配置使用的引擎名，对应 {tier_name}_upstreams 等环境变量
+    tier_name: str
+    # 日志中的引擎名称，如 "诊断"、"中医诊断"
+    label: str
+    shortlist_label: str
+    columns: List[str]
+    shortlist_columns: List[str]
+    generate_args: Dict[str, Any]
+    tokens_per_row: int
+    compact_tokens_per_row: int
+    shortlist_tokens_per_row: int
+    table_overhead_tokens: int
+    max_tokens_ceiling: int
+    format_rows: Callable[[List[Dict[str, str]]], List[Dict[str, Any]]]
+    diagnosis_request: str
+    compact_request: str
+    shortlist_request: str
+    details_request: str
+
+    def __init__(self, structured_output: Optional[str] = None, output_format: Optional[str] = None):
+        load_dotenv(".env")
+        # 上游推理服务池，支持多个 OpenAI 兼容服务，未配置 upstreams 时只有 .env 中的单个服务
+        self.tiers = TierRouter(self.tier_name, self.generate_args)
+        self.upstreams = self.tiers.large
+        primary = self.upstreams.primary if self.upstreams is not None else None
+        self.model_name = primary.model_name if primary else os.getenv("model_name")
+        self.base_url = primary.base_url if primary else os.getenv("base_url")
+        self.api_key = primary.api_key if primary else os.getenv("api_key")
+        # 结构化输出模式：json_schema / json_object，未设置时读取环境变量 structured_output
+        self.structured_output = resolve_structured_output(
+            structured_output if structured_output is not None else os.getenv("structured_output")
+        )
+        # 输出格式：table / compact，未设置时读取环境变量 output_format
+        self.output_format = resolve_output_format(
+            output_format if output_format is not None else os.getenv("output_format")
+        )
+        # 紧凑格式的字段分隔符：tab / unit，未设置时读取环境变量 compact_delimiter
+        self.delimiter = resolve_delimiter(os.getenv("compact_delimiter"))
+        # 流式格式守卫检查的 token 数，0 表示关闭，未设置时读取环境变量 format_guard_tokens
+        self.format_guard_tokens = int(os.getenv("format_guard_tokens", FORMAT_GUARD_TOKENS))
+        self.sys_prompt = None
+        self.initialized = False
+        # 最近一次 diagnosis 调用的来源、模型、原始输出与各阶段耗时，供诊断历史记录
+        self.trace: Dict[str, Any] = {}
+
+        logger.info(f"Model Name: {self.model_name}")
+        logger.info(f"Base URL: {self.base_url}")
+        logger.info(f"API Key: {self.api_key}")
+
+        if self.upstreams is not None:
+            self._init_prompt()
+            self.initialized = True
+        else:
+            logger.warning("模型配置不完整，诊断引擎未初始化")
+
+    def _init_prompt(self) -> None:
+        """设置 sys_prompt、structured_prompt、compact_prompt 及第一阶段的 shortlist_prompt 等三种提示词"""
+        raise NotImplementedError
+
+    def diagnosis(self, desc: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.initialized:
+            logger.error(f"{self.label}模型未初始化")
+            return []
+
+        max_results = resolve_max_results(max_results)
+        start = time.perf_counter()
+        self.trace = {"engine": self.engine_name, "model": self.model_name, "source": "model", "raw_output": None,
+                      "timings": {"generate_ms": 0.0}}
+        store = get_persistent_cache()
+        cache = get_semantic_cache(self._semantic_namespace(max_results))
+        if store is not None:
+            key = self._cache_key(desc, max_results)
+            stored = store.get(key)
+            if stored is not None:
+                logger.info("命中持久化缓存")
+                self.trace["source"] = "persistent_cache"
+                self._finish_trace(start)
+                if cache is not None:
+                    cache.add(desc, stored)
+                return stored
+
+        if cache is not None:
+            cached = cache.lookup(desc)
+            if cached is not None:
+                results, similarity = cached
+                logger.info(f"命中近似缓存，相似度 {similarity:.3f}")
+                self.trace["source"] = "semantic_cache"
+                self._finish_trace(start)
+                return [{**item, "similarity": round(similarity, 4)} for item in results]
+
+        lookup_ms = (time.perf_counter() - start) * 1000
+        results = self.tiers.run(desc, lambda upstreams: self._diagnosis(upstreams, desc, max_results))
+        self._finish_trace(start, lookup_ms)
+        # 截止时间前返回的部分结果不写入缓存
+        if results and not result_is_partial():
+            if store is not None:
+                store.set(key, self.engine_name, desc, results)
+            if cache is not None:
+                cache.add(desc, results)
+        return results
+
+    def _output_mode(self) -> Tuple[str, str]:
+        """当前输出模式及其使用的提示词"""
+        if self.structured_output:
+            return f"structured:{self.structured_output}", self.structured_prompt
+        if self.output_format == "compact":
+            return "compact", self.compact_prompt
+        return "table", self.sys_prompt
+
+    def _cache_key(self, desc: str, max_results: int) -> str:
+        """持久化缓存键：模型、当前输出模式使用的提示词与描述共同决定结果"""
+        _, prompt = self._output_mode()
+        return make_cache_key(self.engine_name, self.model_name, prompt, desc, max_results=max_results)
+
+    def _semantic_namespace(self, max_results: int) -> str:
+        """近似缓存的命名空间：模型、提示词或输出格式不同的结果互不命中"""
+        mode, prompt = self._output_mode()
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{self.engine_name}:{self.model_name}:{mode}:{prompt_hash}:{max_results}"
+
+    def _record_generation(self, model: Any, raw_output: str, generate_start: float) -> None:
+        """记录本次诊断实际使用的模型、原始输出与生成耗时，小模型升级时累加耗时"""
+        self.trace["model"] = model.model_name
+        self.trace["raw_output"] = raw_output
+        self.trace["timings"]["generate_ms"] += (time.perf_counter() - generate_start) * 1000
+
+    def _finish_trace(self, start: float, lookup_ms: Optional[float] = None) -> None:
+        """汇总各阶段耗时：缓存查询、模型生成、解析（总耗时扣除前两者）"""
+        timings = self.trace["timings"]
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        timings["cache_ms"] = timings["total_ms"] if lookup_ms is None else lookup_ms
+        timings["parse_ms"] = max(timings["total_ms"] - timings["cache_ms"] - timings["generate_ms"], 0.0)
+        self.trace["timings"] = {key: round(value, 2) for key, value in timings.items()}
+
+    def _user_message(self, desc: str, request: str, **kwargs: Any) -> str:
+        return f"症状描述：{desc}\n\n{request.format(**kwargs)}"
+
+    def _diagnosis(self, upstreams: UpstreamPool, desc: str, max_results: int) -> List[Dict[str, Any]]:
+        """使用指定档位的上游完成一次诊断"""
+        user_message = self._user_message(desc, self.diagnosis_request, max_results=max_results)
+
+        if self.structured_output:
+            return self._structured_diagnosis(upstreams, user_message, max_results)
+        if self.output_format == "compact":
+            return self._compact_diagnosis(upstreams, desc, max_results)
+
+        generate_start = time.perf_counter()
+        with upstreams.lease() as model:
+            cleaned_content = generate_table(
+                model,
+                build_messages(self.sys_prompt, user_message),
+                max_results,
+                self.tokens_per_row,
+                self.table_overhead_tokens,
+                self.max_tokens_ceiling,
+                guard_tokens=self.format_guard_tokens,
+            )
+        logger.info(f"Cleaned Result: {cleaned_content}")
+        self._record_generation(model, cleaned_content, generate_start)
+
+        try:
+            parsed = parse_diagnosis_table(cleaned_content)
+            logger.info(f"Parsed Result: {parsed}")
+            return self.format_rows(parsed[:max_results])
+        except Exception as e:
+            logger.error(f"{self.label}解析失败: {e}")
+            return []
+
+    def _structured_diagnosis(self, upstreams: UpstreamPool, user_message: str, max_results: int) -> List[Dict[str, Any]]:
+        """以结构化输出模式诊断，服务端未遵循 schema 时回退到表格解析和 JSON 修复流程"""
+        generate_start = time.perf_counter()
+        with upstreams.lease() as model:
+            rows, raw_output = generate_structured(
+                model,
+                build_messages(self.structured_prompt, user_message),
+                self.structured_output,
+                self.engine_name,
+                self.columns,
+                max_results,
+                self.tokens_per_row,
+                self.table_overhead_tokens,
+                self.max_tokens_ceiling,
+                guard_tokens=self.format_guard_tokens,
+            )
+        self._record_generation(model, raw_output, generate_start)
+        if rows is None:
+            # 服务端忽略了 response_format 且按表格输出时，沿用表格解析
+            rows = parse_diagnosis_table(extract_table_only(raw_output)) if "|" in raw_output else []
+        logger.info(f"Parsed Result: {rows}")
+        return self.format_rows(rows[:max_results])
+
+    def _compact_diagnosis(self, upstreams: UpstreamPool, desc: str, max_results: int) -> List[Dict[str, Any]]:
+        """以紧凑分隔格式诊断，逐行直接解析为 format_rows 的输出结构"""
+        user_message = self._user_message(desc, self.compact_request, max_results=max_results)
+
+        generate_start = time.perf_counter()
+        with upstreams.lease() as model:
+            raw_output = generate_compact(
+                model,
+                build_messages(self.compact_prompt, user_message),
+                self.columns,
+                self.delimiter,
+                max_results,
+                self.compact_tokens_per_row,
+                self.table_overhead_tokens,
+                self.max_tokens_ceiling,
+                guard_tokens=self.format_guard_tokens,
+            )
+        logger.info(f"Compact Result: {raw_output!r}")
+        self._record_generation(model, raw_output, generate_start)
+
+        try:
+            rows = parse_compact_rows(
+                raw_output, self.columns, self.delimiter, {"p": parse_probability}
+            )
+        except Exception as e:
+            logger.error(f"{self.label}解析失败: {e}")
+            return []
+        if not rows and "|" in raw_output:
+            # 模型未遵循紧凑格式而输出了表格时，沿用表格解析
+            return self.format_rows(parse_diagnosis_table(extract_table_only(raw_output))[:max_results])
+        return rows[:max_results]
+
+    def _generate_rows(
+        self,
+        upstreams: UpstreamPool,
+        prompts: Tuple[str, str, str],
+        user_message: str,
+        columns: List[str],
+        max_results: int,
+        tokens_per_row: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        按当前输出模式生成并解析 columns 中的字段，供两阶段诊断使用
+
+        Args:
+            prompts: 表格、结构化输出、紧凑格式三种模式各自的系统提示词
+
+        Returns:
+            List[Dict[str, Any]]: 未经 format_rows 的诊断行
+        """
+        table_prompt, structured_prompt, compact_prompt = prompts
+        with upstreams.lease() as model:
+            if self.structured_output:
+                rows, raw_output = generate_structured(
+                    model,
+                    build_messages(structured_prompt, user_message),
+                    self.structured_output,
+                    self.engine_name,
+                    columns,
+                    max_results,
+                    tokens_per_row,
+                    self.table_overhead_tokens,
+                    self.max_tokens_ceiling,
+                    guard_tokens=self.format_guard_tokens,
+                )
+                if rows is not None:
+                    return rows
+            elif self.output_format == "compact":
+                raw_output = generate_compact(
+                    model,
+                    build_messages(compact_prompt, user_message),
+                    columns,
+                    self.delimiter,
+                    max_results,
+                    tokens_per_row,
+                    self.table_overhead_tokens,
+                    self.max_tokens_ceiling,
+                    guard_tokens=self.format_guard_tokens,
+                )
+                rows = parse_compact_rows(raw_output, columns, self.delimiter, {"p": parse_probability})
+                if rows:
+                    return rows
+            else:
+                raw_output = generate_table(
+                    model,
+                    build_messages(table_prompt, user_message),
+                    max_results,
+                    tokens_per_row,
+                    self.table_overhead_tokens,
+                    self.max_tokens_ceiling,
+                    guard_tokens=self.format_guard_tokens,
+                )
+                return parse_diagnosis_table(raw_output)
+        # 模型未遵循结构化或紧凑格式而输出了表格时，沿用表格解析
+        return parse_diagnosis_table(extract_table_only(raw_output)) if "|" in raw_output else []
+
+    def shortlist(self, desc: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        两阶段诊断第一阶段：只输出 shortlist_columns，快速返回鉴别诊断列表
+
+        与 diagnosis 一样按档位路由并遵循当前输出模式，返回结果与 format_rows 格式一致，
+        其余字段为空，可通过 details 补全。
+        """
+        if not self.initialized:
+            logger.error(f"{self.label}模型未初始化")
+            return []
+
+        max_results = resolve_max_results(max_results)
+        user_message = self._user_message(desc, self.shortlist_request, max_results=max_results)
+        prompts = (self.shortlist_prompt, self.shortlist_structured_prompt, self.shortlist_compact_prompt)
+
+        def run(upstreams: UpstreamPool) -> List[Dict[str, Any]]:
+            rows = self._generate_rows(
+                upstreams, prompts, user_message, self.shortlist_columns, max_results, self.shortlist_tokens_per_row
+            )
+            logger.info(f"Shortlist Result: {rows}")
+            try:
+                return self.format_rows(rows[:max_results])
+            except Exception as e:
+                logger.error(f"{self.shortlist_label}解析失败: {e}")
+                return []
+
+        return self.tiers.run(desc, run)
+
+    def details(self, desc: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        两阶段诊断第二阶段：针对第一阶段选定的一条诊断补全其余字段
+
+        使用该描述路由到的档位，不再按置信度升级；时间不足或调用失败时保留第一阶段的结果，
+        不影响其他条目。
+
+        Args:
+            desc: 症状描述
+            item: shortlist 返回的单条诊断
+
+        Returns:
+            Dict[str, Any]: 补全后的诊断，shortlist_columns 沿用第一阶段结果
+        """
+        if not self.initialized:
+            logger.error(f"{self.label}模型未初始化")
+            return dict(item)
+
+        name = item.get(self.columns[0], "")
+        user_message = self._user_message(
+            desc, self.details_request, name=name, description=item.get("description", "")
+        )
+        tokens_per_row = self.compact_tokens_per_row if self.output_format == "compact" else self.tokens_per_row
+
+        # 剩余时间不足时保留第一阶段的结果
+        if not can_start_call("details"):
+            return dict(item)
+        detailed = dict(item)
+        try:
+            rows = self._generate_rows(
+                self.tiers.pool_for(desc),
+                (self.sys_prompt, self.structured_prompt, self.compact_prompt),
+                user_message,
+                self.columns,
+                1,
+                tokens_per_row,
+            )
+            parsed = self.format_rows(rows[:1])
+        except DeadlineExceeded:
+            current_deadline().skip("details")
+            return detailed
+        except Exception as e:
+            logger.error(f"{self.label}详情补全失败（{name}）: {e}")
+            return detailed
+
+        if parsed:
+            for key in self.columns:
+                if key not in self.shortlist_columns:
+                    detailed[key] = parsed[0].get(key, "")
+        return detailed
+
+    def two_stage_diagnosis(
+        self,
+        desc: str,
+        max_results: Optional[int] = None,
+        detail_top_n: int = DEFAULT_DETAIL_TOP_N,
+    ) -> List[Dict[str, Any]]:
+        """先快速输出鉴别诊断列表，再并行补全概率最高的 detail_top_n 条诊断的详情"""
+        items = self.shortlist(desc, max_results)
+        if not items or detail_top_n <= 0:
+            return items
+
+        items.sort(key=lambda item: item["p"], reverse=True)
+        top = items[:detail_top_n]
+        # 线程池不继承当前上下文，为每项复制一份，使取消标记与截止时间传递到补全详情的调用
+        contexts = [copy_context() for _ in top]
+        with ThreadPoolExecutor(max_workers=len(top)) as executor:
+            detailed = list(executor.map(lambda context, item: context.run(self.details, desc, item), contexts, top))
+        return detailed + items[detail_top_n:]
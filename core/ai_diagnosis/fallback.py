@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.diagnosis import DIAGNOSIS_COLUMNS
+from core.ai_diagnosis.fallback_rules import (DEFAULT_DIAGNOSIS_RULES,
+                                              DEFAULT_HERB_RULES)
+from core.ai_diagnosis.generation import resolve_max_results
+from core.ai_diagnosis.herb_diagnosis import HERB_COLUMNS
+from core.scheduling.triage import NEGATION_PREFIXES, AhoCorasick
+from utils.cache.semantic_cache import normalize_description
+
+# 规则结果只作为临时参考，概率不超过该上限，得分为 FALLBACK_HALF_SCORE 时概率为上限的一半
+FALLBACK_MAX_P = 0.6
+FALLBACK_HALF_SCORE = 3.0
+FALLBACK_MODEL = "rules"
+
+# 引擎名称到输出列、默认知识表与诊断历史中的引擎名
+FALLBACK_ENGINES: Dict[str, Tuple[List[str], List[Dict[str, Any]], str]] = {
+    "diagnosis": (DIAGNOSIS_COLUMNS, DEFAULT_DIAGNOSIS_RULES, "diagnosis"),
+    "herb": (HERB_COLUMNS, DEFAULT_HERB_RULES, "herb_diagnosis"),
+}
+
+_NEGATION_WINDOW = max(len(prefix) for prefix in NEGATION_PREFIXES)
+
+
+class RuleBasedDiagnosis:
+    """
+    离线规则诊断：按症状关键词的加权得分排序知识表中的诊断，不调用模型
+
+    构建时把所有关键词编译进一个 Aho-Corasick 自动机，并预先生成每条诊断的输出模板；
+    诊断时一次扫描描述，累加各诊断命中关键词的权重（同一关键词只计一次，否定的关键词不计），
+    输出结构与 format_json_diagnosis / format_json_herb_diagnosis 一致。
+    """
+
+    def __init__(self, engine: str, columns: List[str], rules: List[Dict[str, Any]]):
+        self.engine = engine
+        self.columns = columns
+        self.trace: Dict[str, Any] = {}
+        self._templates: List[Dict[str, Any]] = []
+        self._weights: Dict[str, List[Tuple[int, float]]] = {}
+        for index, rule in enumerate(rules):
+            self._templates.append({column: rule.get(column, "") for column in columns})
+            for keyword, weight in rule.get("keywords", {}).items():
+                normalized = normalize_description(keyword)
+                if normalized:
+                    self._weights.setdefault(normalized, []).append((index, float(weight)))
+        self.automaton = AhoCorasick(self._weights)
+
+    def score(self, description: str) -> List[Tuple[int, float]]:
+        """返回 (规则序号, 得分)，按得分从高到低排列，得分相同时保持知识表顺序"""
+        text = normalize_description(description)
+        matched = set()
+        for start, keyword in self.automaton.iter_matches(text):
+            if text[max(0, start - _NEGATION_WINDOW):start].endswith(NEGATION_PREFIXES):
+                continue
+            matched.add(keyword)
+        scores: Dict[int, float] = {}
+        for keyword in matched:
+            for index, weight in self._weights[keyword]:
+                scores[index] = scores.get(index, 0.0) + weight
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def diagnosis(self, desc: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        max_results = resolve_max_results(max_results)
+        result = []
+        for index, score in self.score(desc)[:max_results]:
+            item = dict(self._templates[index])
+            item["p"] = round(FALLBACK_MAX_P * score / (score + FALLBACK_HALF_SCORE), 2)
+            result.append(item)
+        self.trace = {"engine": self.engine, "model": FALLBACK_MODEL, "source": "fallback", "raw_output": None,
+                      "timings": {"total_ms": round((time.perf_counter() - start) * 1000, 3)}}
+        return result
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+    """读取 JSON 知识表：规则对象列表，每条包含 keywords（{"关键词": 权重}）与输出字段"""
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    if not isinstance(rules, list) or not all(isinstance(rule.get("keywords"), dict) for rule in rules):
+        raise ValueError("知识表应为包含 keywords 字段的规则列表")
+    return rules
+
+
+_engines: Dict[str, RuleBasedDiagnosis] = {}
+_engines_lock = threading.Lock()
+_stats: Dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+
+
+def fallback_enabled() -> bool:
+    """是否在上游熔断或诊断出错时返回规则诊断结果，通过环境变量 fallback=true 启用"""
+    load_dotenv(".env")
+    return os.getenv("fallback", "false").strip().lower() in ("1", "true", "yes")
+
+
+def get_fallback_engine(engine: str) -> RuleBasedDiagnosis:
+    """
+    获取引擎对应的进程级规则诊断（engine 为 diagnosis 或 herb），无状态，可在请求间共享
+
+    知识表文件通过 fallback_rules_diagnosis、fallback_rules_herb 配置，未配置或读取失败时使用默认知识表。
+    """
+    fallback = _engines.get(engine)
+    if fallback is not None:
+        return fallback
+    with _engines_lock:
+        if engine not in _engines:
+            columns, rules, history_name = FALLBACK_ENGINES[engine]
+            load_dotenv(".env")
+            path = os.getenv(f"fallback_rules_{engine}")
+            if path:
+                try:
+                    rules = load_rules(path)
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.error(f"规则诊断知识表 {path} 读取失败，使用默认知识表: {e}")
+            _engines[engine] = RuleBasedDiagnosis(history_name, columns, rules)
+        return _engines[engine]
+
+
+def run_fallback(engine: str, desc: str, max_results: Optional[int], reason: str) -> Tuple[RuleBasedDiagnosis, List[Dict[str, Any]]]:
+    """
+    以规则诊断代替模型诊断，并按原因计数
+
+    Returns:
+        Tuple[RuleBasedDiagnosis, List[Dict[str, Any]]]: (规则引擎, 诊断结果)，引擎的 trace 供诊断历史记录
+    """
+    fallback = get_fallback_engine(engine)
+    result = fallback.diagnosis(desc, max_results)
+    with _stats_lock:
+        stats = _stats.setdefault(engine, Counter())
+        stats[reason] += 1
+        stats["served"] += 1
+        if not result:
+            stats["empty"] += 1
+    logger.warning(f"引擎 {engine} 使用规则诊断（{reason}），返回 {len(result)} 个结果")
+    return fallback, result
+
+
+def fallback_metrics() -> Dict[str, Dict[str, int]]:
+    """各引擎规则诊断的返回次数、按原因（circuit_open / error）的次数及无匹配次数"""
+    with _stats_lock:
+        return {engine: dict(stats) for engine, stats in _stats.items()}
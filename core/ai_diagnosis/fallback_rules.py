@@ -0,0 +1,381 @@
+"""
+离线规则诊断的默认知识表
+
+每条规则包含关键词及权重（keywords），其余字段与 format_json_diagnosis /
+format_json_herb_diagnosis 的输出字段一致（p 由匹配得分计算）。可通过 JSON 文件替换，
+见 core.ai_diagnosis.fallback.load_rules。
+"""
+from typing import Any, Dict, List
+
+_SEE_VET = "上游诊断服务不可用时的规则参考结果，请尽快由执业兽医面诊确诊"
+_VET_DOSAGE = "由兽医按体重与病情确定剂量"
+
+DEFAULT_DIAGNOSIS_RULES: List[Dict[str, Any]] = [
+    {
+        "disease": "犬瘟热",
+        "keywords": {"浓鼻液": 3, "脓性鼻液": 3, "浓眼屎": 3, "脓性眼屎": 3, "眼屎": 1.5, "鼻液": 1,
+                     "打喷嚏": 1, "发热": 1, "拉稀": 1, "腹泻": 1, "精神不好": 0.5, "精神沉郁": 0.5,
+                     "食欲不振": 0.5, "脚垫增厚": 3, "抽搐": 1.5},
+        "description": "呼吸道卡他症状（脓性鼻液、眼分泌物）伴消化道症状，符合犬瘟热典型表现",
+        "base": "隔离饲养，保暖，补充水分与电解质",
+        "continue": "观察体温、神经症状及精神食欲变化",
+        "suggest": "尽快就医做犬瘟热抗原检测；" + _SEE_VET,
+        "base_medicine": "广谱抗生素防继发感染",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "犬瘟热单克隆抗体或高免血清",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "出现抽搐时使用抗惊厥药",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "犬细小病毒病",
+        "keywords": {"血便": 3, "便血": 3, "番茄汁": 3, "腥臭": 1.5, "呕吐": 1.5, "腹泻": 1, "拉稀": 1,
+                     "不吃": 1, "食欲废绝": 1, "精神沉郁": 0.5, "脱水": 1, "幼犬": 1.5},
+        "description": "呕吐伴出血性腹泻，幼犬多发，符合细小病毒感染表现",
+        "base": "禁食禁水，隔离消毒",
+        "continue": "观察呕吐次数、便血量及脱水程度",
+        "suggest": "立即就医做细小病毒检测并静脉补液；" + _SEE_VET,
+        "base_medicine": "静脉补液纠正脱水与电解质紊乱",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "止吐药、胃肠黏膜保护剂",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "细小病毒单克隆抗体",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "急性胃肠炎",
+        "keywords": {"呕吐": 1.5, "腹泻": 1.5, "拉稀": 1.5, "软便": 1, "稀便": 1, "食欲不振": 0.5,
+                     "腹痛": 1, "乱吃": 1.5, "换粮": 1.5},
+        "description": "呕吐、腹泻等消化道症状，多与饮食不当有关",
+        "base": "禁食12-24小时后少量多次喂食易消化食物",
+        "continue": "观察粪便性状及精神食欲",
+        "suggest": "呕吐腹泻持续超过24小时或出现便血时就医；" + _SEE_VET,
+        "base_medicine": "益生菌、蒙脱石散",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "胃肠黏膜保护剂",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "脱水明显时补液",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "猫泛白细胞减少症（猫瘟）",
+        "keywords": {"猫": 1, "幼猫": 1.5, "呕吐": 1.5, "腹泻": 1, "拉稀": 1, "发热": 1, "不吃": 1,
+                     "精神沉郁": 0.5, "脱水": 1, "吐黄水": 1.5},
+        "description": "猫只呕吐、腹泻、发热伴精神沉郁，需排查猫瘟",
+        "base": "隔离饲养，保暖，环境消毒",
+        "continue": "观察体温、呕吐与腹泻情况",
+        "suggest": "尽快就医做猫瘟抗原检测及血常规；" + _SEE_VET,
+        "base_medicine": "静脉补液",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "止吐药、抗生素防继发感染",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "猫瘟单克隆抗体或高免血清",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "上呼吸道感染",
+        "keywords": {"咳嗽": 1.5, "干咳": 2, "打喷嚏": 1.5, "流鼻涕": 1.5, "鼻涕": 1, "鼻液": 1,
+                     "流泪": 0.5, "发热": 0.5, "咽喉": 1},
+        "description": "咳嗽、打喷嚏、流涕等上呼吸道症状",
+        "base": "保暖，避免受凉与粉尘刺激，保持饮水",
+        "continue": "观察咳嗽频率、鼻液性状及体温",
+        "suggest": "出现呼吸急促、脓性鼻液或高热时就医；" + _SEE_VET,
+        "base_medicine": "止咳化痰药",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "细菌感染时使用抗生素",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "雾化治疗",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "肺炎",
+        "keywords": {"呼吸急促": 2, "呼吸困难": 2.5, "张口呼吸": 2.5, "湿咳": 2, "咳嗽": 1, "高热": 1.5,
+                     "发热": 1, "精神沉郁": 0.5, "不吃": 0.5},
+        "description": "咳嗽伴呼吸急促、发热，提示下呼吸道感染",
+        "base": "保持安静与通风，限制活动",
+        "continue": "观察呼吸频率、体温及黏膜颜色",
+        "suggest": "尽快就医拍胸片确诊；" + _SEE_VET,
+        "base_medicine": "抗生素",
+        "base_medicine_usage": _VET_DOSAGE,
+        "continue_medicine": "支气管扩张剂、化痰药",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "呼吸困难时吸氧",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "下泌尿道疾病",
+        "keywords": {"尿频": 2, "血尿": 2.5, "尿血": 2.5, "排尿困难": 2.5, "尿不出": 3, "无法排尿": 3,
+                     "猫砂盆": 1.5, "舔生殖器": 1.5, "尿少": 1.5},
+        "description": "尿频、血尿或排尿困难，提示膀胱炎、尿结石或尿道阻塞",
+        "base": "增加饮水，改喂湿粮",
+        "continue": "记录排尿次数与尿量",
+        "suggest": "无法排尿属急症，须立即就医；" + _SEE_VET,
+        "base_medicine": "泌尿道处方粮",
+        "base_medicine_usage": "遵处方长期饲喂",
+        "continue_medicine": "抗生素、解痉止痛药",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "尿道阻塞时导尿",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "皮肤病（真菌感染或过敏性皮炎）",
+        "keywords": {"瘙痒": 2, "抓挠": 1.5, "挠痒": 1.5, "掉毛": 2, "脱毛": 2, "皮屑": 2, "红疹": 2,
+                     "皮肤发红": 1.5, "圆形脱毛": 3, "舔脚": 1},
+        "description": "瘙痒、脱毛、皮屑等皮肤症状",
+        "base": "保持皮肤清洁干燥，佩戴伊丽莎白圈防抓挠",
+        "continue": "观察皮损范围变化",
+        "suggest": "就医做皮肤刮片或伍德氏灯检查；" + _SEE_VET,
+        "base_medicine": "外用抗真菌或止痒药膏",
+        "base_medicine_usage": "患处外涂，每日1-2次",
+        "continue_medicine": "药浴",
+        "continue_medicine_usage": "每周1-2次",
+        "suggest_medicine": "口服抗真菌药或抗过敏药",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "外耳炎",
+        "keywords": {"甩头": 2.5, "挠耳朵": 2.5, "抓耳朵": 2.5, "耳朵臭": 3, "耳道": 1.5, "耳垢": 2,
+                     "耳朵红": 2},
+        "description": "甩头、挠耳及耳道分泌物增多，提示外耳道炎症",
+        "base": "清洁耳道，保持干燥",
+        "continue": "观察耳道分泌物颜色与气味",
+        "suggest": "就医做耳道分泌物镜检排查耳螨与真菌；" + _SEE_VET,
+        "base_medicine": "洗耳液",
+        "base_medicine_usage": "每日或隔日清洁耳道",
+        "continue_medicine": "滴耳液（抗菌、抗真菌）",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "耳螨感染时使用驱虫药",
+        "suggest_medicine_usage": _VET_DOSAGE,
+    },
+    {
+        "disease": "结膜炎",
+        "keywords": {"眼睛红": 2.5, "眼红": 2.5, "流泪": 1.5, "眼屎": 1.5, "眯眼": 2, "眼睛肿": 2},
+        "description": "眼结膜充血、分泌物增多",
+        "base": "用生理盐水清洁眼周，防止抓挠",
+        "continue": "观察眼分泌物及角膜有无浑浊",
+        "suggest": "出现角膜浑浊或视力下降时就医；" + _SEE_VET,
+        "base_medicine": "抗生素滴眼液",
+        "base_medicine_usage": "每日3-4次",
+        "continue_medicine": "人工泪液",
+        "continue_medicine_usage": "每日3-4次",
+        "suggest_medicine": "",
+        "suggest_medicine_usage": "",
+    },
+    {
+        "disease": "牙周病",
+        "keywords": {"口臭": 2.5, "牙结石": 3, "流口水": 1.5, "牙龈红肿": 3, "牙龈出血": 3, "不敢咀嚼": 2},
+        "description": "口臭、牙结石及牙龈炎症",
+        "base": "改喂软食，定期刷牙",
+        "continue": "观察进食情况与牙龈出血",
+        "suggest": "就医洁牙并评估牙齿松动情况；" + _SEE_VET,
+        "base_medicine": "宠物口腔清洁液",
+        "base_medicine_usage": "每日使用",
+        "continue_medicine": "抗生素（牙周感染时）",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "",
+        "suggest_medicine_usage": "",
+    },
+    {
+        "disease": "消化道异物或梗阻",
+        "keywords": {"误食": 3, "吞了": 2.5, "异物": 3, "呕吐": 1, "不排便": 2, "腹痛": 1.5,
+                     "腹部胀": 1.5, "腹胀": 1.5},
+        "description": "误食异物后呕吐、不排便，需排查消化道梗阻",
+        "base": "禁食禁水，切勿自行催吐",
+        "continue": "观察呕吐、排便及腹部情况",
+        "suggest": "立即就医做X光或B超检查；" + _SEE_VET,
+        "base_medicine": "",
+        "base_medicine_usage": "",
+        "continue_medicine": "",
+        "continue_medicine_usage": "",
+        "suggest_medicine": "内镜取出或手术",
+        "suggest_medicine_usage": "由兽医评估",
+    },
+    {
+        "disease": "关节炎",
+        "keywords": {"跛行": 2.5, "瘸": 2, "关节肿": 3, "起身困难": 2.5, "不愿走动": 2, "不愿运动": 2,
+                     "老年": 1, "后腿无力": 2},
+        "description": "跛行、活动减少，多见于老年或大型犬的关节退行性病变",
+        "base": "控制体重，减少剧烈运动，使用防滑地面",
+        "continue": "观察跛行程度与关节肿胀",
+        "suggest": "就医拍片排除骨折与韧带损伤；" + _SEE_VET,
+        "base_medicine": "关节保健品（氨糖软骨素）",
+        "base_medicine_usage": "按说明长期服用",
+        "continue_medicine": "非甾体抗炎药",
+        "continue_medicine_usage": _VET_DOSAGE,
+        "suggest_medicine": "",
+        "suggest_medicine_usage": "",
+    },
+]
+
+DEFAULT_HERB_RULES: List[Dict[str, Any]] = [
+    {
+        "zhengming": "风寒表证",
+        "keywords": {"怕冷": 2, "恶寒": 2.5, "清涕": 2.5, "流清鼻涕": 2.5, "打喷嚏": 1.5, "咳嗽": 1,
+                     "耳鼻发凉": 2.5, "被毛逆立": 2},
+        "description": "风寒束表，卫阳被遏，故恶寒、流清涕",
+        "therapy": "辛温解表，疏风散寒",
+        "base": "保暖避风，饮温水",
+        "continue": "观察体温与鼻液变化",
+        "suggest": _SEE_VET,
+        "base_prescription": "荆防败毒散",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "咳嗽重者加杏仁、桔梗",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "风热表证",
+        "keywords": {"发热": 1.5, "浓鼻液": 2.5, "黄鼻涕": 2.5, "咳嗽": 1, "咽喉肿痛": 2.5, "口干": 1.5,
+                     "舌红": 2, "口色红": 2, "眼屎": 1},
+        "description": "风热犯表，肺卫失宣，故发热、鼻液黏稠",
+        "therapy": "辛凉解表，清热解毒",
+        "base": "保持通风，充足饮水",
+        "continue": "观察体温、口色与鼻液",
+        "suggest": _SEE_VET,
+        "base_prescription": "银翘散",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "热重者加石膏、黄芩",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "肺热咳喘",
+        "keywords": {"咳嗽": 1.5, "气喘": 2.5, "呼吸急促": 2, "黄痰": 2.5, "发热": 1, "鼻翼扇动": 2.5},
+        "description": "邪热壅肺，肺失宣降，故咳喘气促",
+        "therapy": "清肺平喘，止咳化痰",
+        "base": "安静休息，避免刺激性气体",
+        "continue": "观察呼吸频率与痰液",
+        "suggest": "呼吸困难须立即就医；" + _SEE_VET,
+        "base_prescription": "麻杏石甘汤",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "痰多者加贝母、瓜蒌",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "湿热泄泻",
+        "keywords": {"腹泻": 1.5, "拉稀": 1.5, "腥臭": 2, "恶臭": 2, "里急后重": 2.5, "发热": 1,
+                     "口渴": 1.5, "尿黄": 2, "血便": 1.5, "便血": 1.5},
+        "description": "湿热蕴结肠道，传导失司，故泻下腥臭、里急后重",
+        "therapy": "清热燥湿，厚肠止泻",
+        "base": "饮食清淡，补充水分",
+        "continue": "观察粪便性状与次数",
+        "suggest": "便血或脱水明显时立即就医；" + _SEE_VET,
+        "base_prescription": "葛根芩连汤",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "便血者合白头翁汤",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "脾虚泄泻",
+        "keywords": {"久泻": 3, "软便": 2, "消瘦": 1.5, "食欲不振": 1, "精神倦怠": 1.5, "完谷不化": 3,
+                     "口色淡": 1.5},
+        "description": "脾胃虚弱，运化失常，故久泻、消瘦",
+        "therapy": "健脾益气，渗湿止泻",
+        "base": "少量多餐，喂易消化食物",
+        "continue": "观察体重与粪便变化",
+        "suggest": _SEE_VET,
+        "base_prescription": "参苓白术散",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "久泻不止者加诃子、肉豆蔻",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "胃寒呕吐",
+        "keywords": {"呕吐": 1.5, "吐清水": 3, "吐白沫": 2.5, "怕冷": 1, "口色青白": 2.5, "喜卧暖处": 2},
+        "description": "寒邪犯胃，胃气上逆，故呕吐清水",
+        "therapy": "温中散寒，降逆止呕",
+        "base": "暂停喂食数小时，保暖",
+        "continue": "观察呕吐次数与呕吐物",
+        "suggest": "频繁呕吐时就医；" + _SEE_VET,
+        "base_prescription": "理中汤",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "呕甚者加半夏、生姜",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "食积",
+        "keywords": {"腹胀": 2, "暴食": 3, "吃多": 2.5, "嗳气": 2.5, "粪便酸臭": 3, "不吃": 1, "呕吐": 1},
+        "description": "饮食过量，食滞胃肠，故腹胀、嗳气、粪便酸臭",
+        "therapy": "消食导滞，和胃",
+        "base": "禁食半日后减量喂食",
+        "continue": "观察腹胀与排便",
+        "suggest": "腹部迅速膨胀须立即就医排除胃扩张扭转；" + _SEE_VET,
+        "base_prescription": "保和丸",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "便秘者加大黄、枳实",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "膀胱湿热",
+        "keywords": {"尿频": 2, "尿血": 2.5, "血尿": 2.5, "排尿困难": 2.5, "尿黄": 2, "尿少": 1.5, "尿痛": 2},
+        "description": "湿热下注膀胱，气化不利，故尿频、尿血",
+        "therapy": "清热利湿，利尿通淋",
+        "base": "增加饮水",
+        "continue": "记录排尿次数与尿色",
+        "suggest": "无法排尿属急症，须立即就医；" + _SEE_VET,
+        "base_prescription": "八正散",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "血尿者加小蓟、白茅根",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "风湿痹证",
+        "keywords": {"跛行": 2, "关节肿痛": 3, "关节肿": 2.5, "四肢僵硬": 2.5, "遇冷加重": 3, "起身困难": 2},
+        "description": "风寒湿邪痹阻经络，气血不畅，故跛行、关节肿痛",
+        "therapy": "祛风除湿，通络止痛",
+        "base": "保暖防潮，适度活动",
+        "continue": "观察跛行程度",
+        "suggest": "就医拍片排除骨折；" + _SEE_VET,
+        "base_prescription": "独活寄生汤",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "寒重者加附子、桂枝",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "血热风燥",
+        "keywords": {"瘙痒": 2, "红疹": 2.5, "皮肤发红": 2, "掉毛": 1.5, "脱毛": 1.5, "皮屑": 1.5, "渗出": 2},
+        "description": "血热生风，风盛则燥，故皮肤瘙痒、红疹、脱毛",
+        "therapy": "清热凉血，祛风止痒",
+        "base": "保持皮肤清洁干燥，防抓挠",
+        "continue": "观察皮损范围",
+        "suggest": _SEE_VET,
+        "base_prescription": "消风散",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "渗出多者加苦参、苍术",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+    {
+        "zhengming": "气血两虚",
+        "keywords": {"消瘦": 1.5, "乏力": 2, "精神倦怠": 1.5, "口色淡白": 3, "黏膜苍白": 3, "毛发枯燥": 2,
+                     "久病": 2},
+        "description": "气血不足，脏腑失养，故消瘦乏力、口色淡白",
+        "therapy": "补气养血",
+        "base": "加强营养，适度活动",
+        "continue": "观察体重与黏膜颜色",
+        "suggest": "黏膜苍白须就医排查贫血与失血；" + _SEE_VET,
+        "base_prescription": "八珍汤",
+        "base_prescription_usage": _VET_DOSAGE,
+        "continue_prescription": "食欲差者加山楂、神曲",
+        "continue_prescription_usage": _VET_DOSAGE,
+        "suggest_prescription": "",
+        "suggest_prescription_usage": "",
+    },
+]
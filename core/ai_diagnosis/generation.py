@@ -0,0 +1,620 @@
+import copy
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+import openai
+from agentscope.models import ModelResponse
+
+from config.logger import logger
+from core.ai_diagnosis.cancellation import (RequestCancelled,
+                                            check_cancelled,
+                                            count_cancellation,
+                                            current_cancel_token)
+from core.ai_diagnosis.deadline import (DeadlineExceeded, can_start_call,
+                                        check_deadline, current_deadline)
+from core.ai_diagnosis.usage import report_usage
+from utils.json.fix_broken_json import (merge_json_continuation,
+                                        split_complete_json_objects)
+from utils.json.schema import (build_response_format, parse_structured_output,
+                               repair_structured_output)
+from utils.parser.compact import merge_line_continuation, split_complete_lines
+
+# 表格/JSON 输出结束后模型需要输出的结束标记，配合 stop 参数截断后续多余文字
+END_MARKER = "<END>"
+STOP_SEQUENCES = [END_MARKER, "\n\n\n"]
+
+DEFAULT_MAX_RESULTS = 5
+MAX_RESULTS_LIMIT = 10
+
+# 截断后最多发起的续写次数，以及续写请求的固定 token 开销
+MAX_CONTINUATIONS = 2
+CONTINUATION_OVERHEAD_TOKENS = 60
+
+TABLE_CONTINUATION_PROMPT = (
+    "上面的表格因长度限制被截断，已完整输出{done}行。"
+    "请从第{next}行开始继续输出剩余的表格行（最多{remaining}行），"
+    "不要重复表头、分隔线和已输出的行，表格结束后立即输出 " + END_MARKER + "。"
+)
+COMPACT_CONTINUATION_PROMPT = (
+    "上面的输出因长度限制被截断，已完整输出{done}行。"
+    "请从第{next}行开始继续输出剩余的数据行（最多{remaining}行），"
+    "不要重复表头和已输出的行，结束后立即输出 " + END_MARKER + "。"
+)
+JSON_CONTINUATION_PROMPT = (
+    "上面的JSON数组因长度限制被截断，已完整输出{done}个对象。"
+    "请从第{next}个对象开始继续输出剩余的对象（最多{remaining}个），"
+    "不要重复已输出的对象，不要输出任何解释，最后以 ] 结束数组。"
+)
+
+# 流式输出前 N 个 token 内未出现格式起始符时中止请求，0 表示关闭
+FORMAT_GUARD_TOKENS = 24
+TABLE_OPENERS = ("|",)
+JSON_OPENERS = ("{", "[")
+STRICT_TABLE_PROMPT = (
+    "注意：只允许输出要求的格式，回答必须直接从表头开始，"
+    "不得输出初步印象、分析过程、标题或任何说明文字。"
+)
+STRICT_JSON_PROMPT = (
+    "注意：只允许输出要求的JSON，回答的第一个字符必须是 { 或 [，"
+    "不得输出初步印象、分析过程、标题或任何说明文字。"
+)
+
+# 有截止时间时由本模块重试上游调用（SDK 的自动重试不考虑剩余时间），次数与退避同 openai SDK 默认值
+DEADLINE_MAX_RETRIES = 2
+DEADLINE_RETRY_BACKOFF = 0.5
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{2,}")
+
+T = TypeVar("T")
+
+
+def resolve_max_results(max_results: Optional[int]) -> int:
+    """将请求中的诊断条数限制在合理范围内"""
+    if not max_results:
+        return DEFAULT_MAX_RESULTS
+    return max(1, min(int(max_results), MAX_RESULTS_LIMIT))
+
+
+def budget_max_tokens(
+    max_results: int,
+    tokens_per_row: int,
+    overhead_tokens: int,
+    ceiling: int,
+) -> int:
+    """
+    根据诊断条数估算本次调用的 max_tokens
+
+    Args:
+        max_results: 期望输出的诊断条数
+        tokens_per_row: 每条诊断大约消耗的 token 数
+        overhead_tokens: 表头、结束标记等固定开销
+        ceiling: 引擎允许的最大 token 数
+
+    Returns:
+        int: 本次调用使用的 max_tokens
+    """
+    return min(ceiling, overhead_tokens + tokens_per_row * max_results)
+
+
+def build_messages(sys_prompt: str, user_message: str) -> List[Dict[str, str]]:
+    """构造 OpenAI 兼容接口的消息列表"""
+    messages = []
+    if sys_prompt:
+        messages.append({"role": "system", "content": sys_prompt})
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def strip_end_marker(text: str) -> str:
+    """移除模型输出中的结束标记及其后的内容"""
+    if not text:
+        return ""
+    index = text.find(END_MARKER)
+    return text[:index].rstrip() if index != -1 else text
+
+
+def get_finish_reason(response: ModelResponse) -> Optional[str]:
+    """从模型原始响应中读取 finish_reason"""
+    raw = getattr(response, "raw", None)
+    if not isinstance(raw, dict):
+        return None
+    choices = raw.get("choices") or [{}]
+    return choices[0].get("finish_reason")
+
+
+def _without_sdk_retries(client: Any) -> Any:
+    """返回关闭自动重试的 OpenAI 客户端，非 OpenAI 客户端原样返回"""
+    return client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+
+
+def _call_within_deadline(call: Callable[[float], T]) -> T:
+    """
+    在请求截止时间内调用上游：每次调用的超时为剩余时间，失败后剩余时间足够时才重试
+
+    Args:
+        call: 以本次调用的超时秒数为参数发起上游调用的函数
+
+    Raises:
+        DeadlineExceeded: 截止时间已到，或调用因剩余时间耗尽而超时
+    """
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        check_deadline()
+        try:
+            return call(deadline.remaining())
+        except RETRYABLE_ERRORS as e:
+            if deadline.expired:
+                raise DeadlineExceeded(f"上游调用超过请求截止时间: {e}") from e
+            if attempt == DEADLINE_MAX_RETRIES:
+                raise
+            delay = DEADLINE_RETRY_BACKOFF * 2 ** attempt
+            if deadline.remaining() - delay < deadline.min_call_seconds:
+                deadline.skip("retry")
+                raise
+            logger.warning(f"上游调用失败，{delay:.1f}s 后重试（剩余 {deadline.remaining():.1f}s）: {e}")
+            time.sleep(delay)
+            attempt += 1
+
+
+def generate(model: Any, messages: List[Dict[str, str]], **kwargs: Any) -> ModelResponse:
+    """
+    调用模型生成回复，kwargs 会覆盖模型配置中的 generate_args
+
+    当前请求有截止时间时，调用超时不超过剩余时间，并由 _call_within_deadline
+    代替 SDK 按剩余时间决定是否重试。
+
+    Args:
+        model: agentscope 的模型包装器
+        messages: OpenAI 格式的消息列表
+        **kwargs: 本次调用的生成参数，如 max_tokens、stop
+
+    Returns:
+        ModelResponse: 模型响应
+    """
+    check_cancelled(skipped_call=True)
+    if current_deadline() is None:
+        response = model(messages, **kwargs)
+    else:
+        if hasattr(model, "client"):
+            model = copy.copy(model)
+            model.client = _without_sdk_retries(model.client)
+        response = _call_within_deadline(lambda timeout: model(messages, **kwargs, timeout=timeout))
+    usage = (response.raw or {}).get("usage") if isinstance(response.raw, dict) else None
+    logger.info(
+        f"模型调用完成: max_tokens={kwargs.get('max_tokens')}, "
+        f"finish_reason={get_finish_reason(response)}, usage={usage}"
+    )
+    report_usage(usage)
+    return response
+
+
+def _with_strict_prompt(messages: List[Dict[str, str]], strict_prompt: str) -> List[Dict[str, str]]:
+    """在最后一条用户消息后追加更严格的格式要求"""
+    messages = [dict(message) for message in messages]
+    for message in reversed(messages):
+        if message["role"] == "user":
+            message["content"] = f"{message['content']}\n\n{strict_prompt}"
+            break
+    return messages
+
+
+def _stream_with_guard(
+    model: Any,
+    messages: List[Dict[str, str]],
+    openers: Tuple[str, ...],
+    guard_tokens: int,
+    **kwargs: Any,
+) -> Tuple[Optional[ModelResponse], str]:
+    """
+    流式调用模型，前 guard_tokens 个 token 内没有出现格式起始符时关闭上游连接
+
+    截止时间在输出过程中到达时关闭上游连接，已符合格式的输出按截断（finish_reason=length）
+    返回，由调用方只保留完整的行或对象。
+
+    Returns:
+        tuple: (符合格式时为完整响应，否则为 None, 已收到的文本)
+
+    Raises:
+        DeadlineExceeded: 截止时间到达时输出尚未出现格式起始符
+    """
+    request = {**model.generate_args, **kwargs}
+    request.update({
+        "model": model.model_name,
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    })
+    check_cancelled(skipped_call=True)
+    token = current_cancel_token()
+    deadline = current_deadline()
+    if deadline is None:
+        stream = model.client.chat.completions.create(**request)
+    else:
+        client = _without_sdk_retries(model.client)
+        stream = _call_within_deadline(lambda timeout: client.chat.completions.create(**request, timeout=timeout))
+
+    text = ""
+    tokens = 0
+    checked = False
+    finish_reason = None
+    usage = None
+    cut = False
+    try:
+        for chunk in stream:
+            if token is not None and token.cancelled:
+                # 请求已取消，关闭流使上游停止生成
+                count_cancellation("upstream_streams_aborted")
+                raise RequestCancelled(token.reason)
+            if deadline is not None and deadline.expired:
+                cut = True
+                break
+            if chunk.usage is not None:
+                usage = chunk.usage.model_dump()
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            if not choice.delta or not choice.delta.content:
+                continue
+            text += choice.delta.content
+            tokens += 1
+            if checked:
+                continue
+            if any(opener in text for opener in openers):
+                checked = True
+            elif tokens >= guard_tokens:
+                # 关闭流会断开 HTTP 连接，上游随之停止生成
+                stream.close()
+                return None, text
+    except (httpx.TimeoutException, openai.APITimeoutError):
+        if deadline is None or not deadline.expired:
+            raise
+        cut = True
+    finally:
+        stream.close()
+
+    if cut:
+        if not checked and not any(opener in text for opener in openers):
+            raise DeadlineExceeded("截止时间前模型未输出要求的格式")
+        # 截止时间已到，已收到的输出按截断处理
+        deadline.skip("generation")
+        finish_reason = "length"
+    if not checked and not any(opener in text for opener in openers):
+        return None, text
+    raw = {"choices": [{"finish_reason": finish_reason}], "usage": usage}
+    return ModelResponse(text=text, raw=raw), text
+
+
+def generate_guarded(
+    model: Any,
+    messages: List[Dict[str, str]],
+    openers: Tuple[str, ...],
+    strict_prompt: str,
+    guard_tokens: int = FORMAT_GUARD_TOKENS,
+    **kwargs: Any,
+) -> ModelResponse:
+    """
+    带格式守卫的模型调用：模型以自由文本作答时尽早中止，并用更严格的提示重试一次
+
+    仅对 OpenAI 兼容的模型包装器启用流式守卫，其他模型或 guard_tokens 为 0 时
+    等同于 generate。
+
+    Args:
+        model: agentscope 的模型包装器
+        messages: OpenAI 格式的消息列表
+        openers: 表示输出格式正确的起始符，如表格的 "|"
+        strict_prompt: 重试时追加的格式要求
+        guard_tokens: 检查格式起始符的 token 数
+        **kwargs: 本次调用的生成参数
+
+    Returns:
+        ModelResponse: 模型响应
+    """
+    client = getattr(model, "client", None)
+    if guard_tokens <= 0 or client is None or not hasattr(client, "chat"):
+        return generate(model, messages, **kwargs)
+
+    response, text = _stream_with_guard(model, messages, openers, guard_tokens, **kwargs)
+    if response is not None:
+        logger.info(
+            f"模型调用完成: max_tokens={kwargs.get('max_tokens')}, "
+            f"finish_reason={get_finish_reason(response)}, usage={response.raw.get('usage')}"
+        )
+        report_usage(response.raw.get("usage"))
+        return response
+
+    if not can_start_call("retry"):
+        raise DeadlineExceeded("模型未按要求格式输出，剩余时间不足以重试")
+    logger.warning(f"模型未按要求格式输出，已中止并使用更严格的提示重试: {text[:80]!r}")
+    return generate(model, _with_strict_prompt(messages, strict_prompt), **kwargs)
+
+
+def _table_row_cells(line: str) -> int:
+    return len(line.strip().strip("|").split("|"))
+
+
+def split_complete_table(text: str) -> Tuple[str, int, bool]:
+    """
+    找到 Markdown 表格中最后一个完整的数据行
+
+    Args:
+        text: 模型输出的表格文本
+
+    Returns:
+        tuple: (截至最后一个完整行的文本, 完整数据行数, 最后一行是否不完整)
+    """
+    lines = text.rstrip().split("\n")
+    header_cells = None
+    rows = 0
+    last_complete = -1
+    incomplete = False
+
+    for index, raw_line in enumerate(lines):
+        line = raw_line.strip()
+        if not line.startswith("|"):
+            continue
+        if header_cells is None:
+            header_cells = _table_row_cells(line)
+            last_complete = index
+            continue
+        if _SEPARATOR_RE.match(line):
+            last_complete = index
+            continue
+        if line.endswith("|") and _table_row_cells(line) >= header_cells:
+            rows += 1
+            last_complete = index
+            incomplete = False
+        else:
+            incomplete = True
+
+    if last_complete == -1:
+        return text, 0, False
+    return "\n".join(lines[:last_complete + 1]), rows, incomplete
+
+
+def merge_table_continuation(complete: str, continuation: str) -> str:
+    """将续写的表格行拼接到已完整输出的表格之后，跳过重复的表头与分隔线"""
+    complete_lines = [line.strip() for line in complete.split("\n")]
+    header = next((line for line in complete_lines if line.startswith("|")), None)
+    seen = set(complete_lines)
+
+    merged = complete.rstrip().split("\n")
+    for raw_line in continuation.split("\n"):
+        line = raw_line.strip()
+        if not line.startswith("|") or line == header or _SEPARATOR_RE.match(line):
+            continue
+        if line in seen:
+            continue
+        seen.add(line)
+        merged.append(line)
+    return "\n".join(merged)
+
+
+def _generate_with_continuation(
+    model: Any,
+    messages: List[Dict[str, str]],
+    max_results: int,
+    tokens_per_row: int,
+    overhead_tokens: int,
+    ceiling: int,
+    split_complete: Callable[[str], Tuple[str, int, bool]],
+    merge_continuation: Callable[[str, str], str],
+    continuation_prompt: str,
+    openers: Tuple[str, ...],
+    guard_tokens: int,
+    **kwargs: Any,
+) -> str:
+    """按行输出的通用生成流程：截断时丢弃不完整的最后一行，只续写剩余的行"""
+    response = generate_guarded(
+        model,
+        messages,
+        openers,
+        STRICT_TABLE_PROMPT,
+        guard_tokens,
+        max_tokens=budget_max_tokens(max_results, tokens_per_row, overhead_tokens, ceiling),
+        stop=STOP_SEQUENCES,
+        **kwargs,
+    )
+    text = strip_end_marker(response.text)
+    finish_reason = get_finish_reason(response)
+
+    for attempt in range(MAX_CONTINUATIONS):
+        complete, rows, incomplete = split_complete(text)
+        if finish_reason != "length" and not incomplete:
+            break
+        remaining = max_results - rows
+        if remaining <= 0:
+            # 已有足够的完整行，直接丢弃不完整的最后一行
+            text = complete
+            break
+        if rows == 0:
+            break
+        if not can_start_call("continuation"):
+            # 剩余时间不足以续写，只返回已完整的行
+            text = complete
+            break
+
+        logger.warning(
+            f"输出被截断（finish_reason={finish_reason}），"
+            f"已完成 {rows} 行，发起第 {attempt + 1} 次续写"
+        )
+        continuation_messages = messages + [
+            {"role": "assistant", "content": complete},
+            {
+                "role": "user",
+                "content": continuation_prompt.format(
+                    done=rows, next=rows + 1, remaining=remaining
+                ),
+            },
+        ]
+        response = generate(
+            model,
+            continuation_messages,
+            max_tokens=budget_max_tokens(
+                remaining, tokens_per_row, CONTINUATION_OVERHEAD_TOKENS, ceiling
+            ),
+            stop=STOP_SEQUENCES,
+            **kwargs,
+        )
+        text = merge_continuation(complete, strip_end_marker(response.text))
+        finish_reason = get_finish_reason(response)
+
+    return text
+
+
+def generate_table(
+    model: Any,
+    messages: List[Dict[str, str]],
+    max_results: int,
+    tokens_per_row: int,
+    overhead_tokens: int,
+    ceiling: int,
+    guard_tokens: int = FORMAT_GUARD_TOKENS,
+    **kwargs: Any,
+) -> str:
+    """
+    生成 Markdown 表格，输出被截断时发起续写请求而不是整表重新生成
+
+    截断的判断依据为 finish_reason == "length" 或最后一行不完整。续写时丢弃不完整的
+    最后一行，把已完整的部分作为 assistant 消息回传，只让模型补写剩余的行。
+    首次调用带格式守卫，模型以自由文本作答时提前中止并重试。
+
+    Returns:
+        str: 去掉结束标记后的表格文本
+    """
+    return _generate_with_continuation(
+        model, messages, max_results, tokens_per_row, overhead_tokens, ceiling,
+        split_complete_table, merge_table_continuation, TABLE_CONTINUATION_PROMPT,
+        TABLE_OPENERS, guard_tokens,
+        **kwargs,
+    )
+
+
+def generate_compact(
+    model: Any,
+    messages: List[Dict[str, str]],
+    columns: List[str],
+    delimiter: str,
+    max_results: int,
+    tokens_per_row: int,
+    overhead_tokens: int,
+    ceiling: int,
+    guard_tokens: int = FORMAT_GUARD_TOKENS,
+    **kwargs: Any,
+) -> str:
+    """
+    生成紧凑分隔格式的输出，截断处理与格式守卫同 generate_table
+
+    Returns:
+        str: 去掉结束标记后的输出文本
+    """
+    return _generate_with_continuation(
+        model, messages, max_results, tokens_per_row, overhead_tokens, ceiling,
+        lambda text: split_complete_lines(text, delimiter, len(columns)),
+        lambda complete, continuation: merge_line_continuation(complete, continuation, delimiter),
+        COMPACT_CONTINUATION_PROMPT,
+        (delimiter,) + TABLE_OPENERS, guard_tokens,
+        **kwargs,
+    )
+
+
+def continue_truncated_json(
+    model: Any,
+    messages: List[Dict[str, str]],
+    text: str,
+    max_results: int,
+    tokens_per_item: int,
+    ceiling: int,
+    **kwargs: Any,
+) -> str:
+    """
+    JSON 数组未闭合时，从最后一个完整对象之后续写剩余对象
+
+    数组外层的 {"diagnoses": 随前缀一起发给模型，续写拼接后只返回数组本身，
+    parse_structured_output 同样接受不带外层对象的数组。
+
+    Returns:
+        str: 续写拼接后的 JSON 文本；未截断时原样返回
+    """
+    # 数组之前的外层对象开头，续写时作为上下文保留
+    head = text[:max(text.find("["), 0)]
+    for attempt in range(MAX_CONTINUATIONS):
+        prefix, count, truncated = split_complete_json_objects(text)
+        # 没有任何完整对象时无法确定续写位置，交给后续的修复流程处理
+        if not truncated or count == 0:
+            break
+        remaining = max_results - count
+        if remaining <= 0 or not can_start_call("continuation"):
+            return prefix + "]"
+
+        logger.warning(f"JSON 输出被截断，已完成 {count} 个对象，发起第 {attempt + 1} 次续写")
+        continuation_messages = messages + [
+            {"role": "assistant", "content": head + prefix},
+            {
+                "role": "user",
+                "content": JSON_CONTINUATION_PROMPT.format(
+                    done=count, next=count + 1, remaining=remaining
+                ),
+            },
+        ]
+        response = generate(
+            model,
+            continuation_messages,
+            max_tokens=budget_max_tokens(
+                remaining, tokens_per_item, CONTINUATION_OVERHEAD_TOKENS, ceiling
+            ),
+            **kwargs,
+        )
+        text = merge_json_continuation(prefix, response.text or "")
+
+    return text
+
+
+def generate_structured(
+    model: Any,
+    messages: List[Dict[str, str]],
+    mode: str,
+    name: str,
+    columns: List[str],
+    max_results: int,
+    tokens_per_row: int,
+    overhead_tokens: int,
+    ceiling: int,
+    guard_tokens: int = FORMAT_GUARD_TOKENS,
+    **kwargs: Any,
+) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+    """
+    以 JSON schema / JSON mode 请求结构化输出，并直接用 json.loads 解析
+
+    输出被截断时按 JSON 数组续写；服务端未遵循 schema 时才回退到正则修复流程。
+    服务端忽略 response_format 而以自由文本作答时，由格式守卫提前中止并重试。
+
+    Returns:
+        tuple: (诊断列表，解析失败时为 None, 模型原始输出)
+    """
+    response = generate_guarded(
+        model,
+        messages,
+        JSON_OPENERS + TABLE_OPENERS,
+        STRICT_JSON_PROMPT,
+        guard_tokens,
+        max_tokens=budget_max_tokens(max_results, tokens_per_row, overhead_tokens, ceiling),
+        response_format=build_response_format(mode, name, columns),
+        **kwargs,
+    )
+    text = response.text or ""
+    if get_finish_reason(response) == "length":
+        text = continue_truncated_json(
+            model, messages, text, max_results, tokens_per_row, ceiling, **kwargs
+        )
+
+    rows = parse_structured_output(text)
+    if rows is not None:
+        return rows, text
+
+    logger.warning("服务端未遵循结构化输出格式，回退到 JSON 修复流程")
+    return repair_structured_output(text), text
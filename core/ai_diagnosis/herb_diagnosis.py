@@ -1,94 +1,50 @@
-import os
-import re
 from typing import Any, Dict, List
 
-import agentscope
-from agentscope.agents import DialogAgent
-from agentscope.message import Msg
-from dotenv import load_dotenv
-
 from config.logger import logger
-
-
-def extract_table_only(text: str) -> str:
-    """从文本中提取第一个 Markdown 表格块"""
-    pattern = r"(\|.+\|(?:\n\|[-\s|]+\|)?(?:\n\|.*\|)+)"
-    match = re.search(pattern, text)
-    return match.group(1).strip() if match else text
-
-
-def parse_diagnosis_table(table_str: str) -> List[Dict[str, str]]:
-    """
-    解析Markdown表格，自动补齐缺失列，避免因列数不匹配导致丢失整行
-    """
-    lines = [line.strip() for line in table_str.strip().split('\n') if line.strip()]
-    if len(lines) < 3:
-        return []
-
-    headers = [h.strip() for h in lines[0].strip('|').split('|')]
-    expected_col_count = len(headers)
-
-    results = []
-
-    for line in lines[2:]:  # 跳过分隔线
-        cols = [c.strip() for c in line.strip('|').split('|')]
-        if len(cols) < expected_col_count:
-            # 补齐缺失列
-            cols += [''] * (expected_col_count - len(cols))
-            logger.warning(f"发现列数不足，自动补齐：{cols}")
-        if len(cols) != expected_col_count:
-            logger.warning(f"跳过异常行，列数不匹配：{line}")
-            continue
-        results.append(dict(zip(headers, cols)))
-
-    return results
-
-
-def parse_probability(p_value: str) -> float:
-    """
-    尝试从字符串中提取概率值，如果无法解析则返回默认值
-    """
-    if not p_value:
-        return 0.0
-    
-    # 移除空格和常见的中文字符
-    p_clean = p_value.strip()
-    
-    # 尝试直接转换为浮点数
-    try:
-        return float(p_clean)
-    except ValueError:
-        pass
-    
-    # 尝试提取数字（支持百分比）
-    import re
-    number_pattern = r'(\d+(?:\.\d+)?)'
-    matches = re.findall(number_pattern, p_clean)
-    
-    if matches:
-        try:
-            num = float(matches[0])
-            # 如果包含%符号，转换为小数
-            if '%' in p_clean:
-                return num / 100.0
-            # 如果数字大于1，可能是百分比格式
-            elif num > 1:
-                return num / 100.0
-            else:
-                return num
-        except ValueError:
-            pass
-    
-    # 根据关键词给出默认概率值
-    if any(keyword in p_clean for keyword in ['良好', '优', '高']):
-        return 0.8
-    elif any(keyword in p_clean for keyword in ['一般', '中等', '谨慎']):
-        return 0.6
-    elif any(keyword in p_clean for keyword in ['差', '低', '严重', '危险']):
-        return 0.3
-    
-    logger.warning(f"无法解析概率值: {p_value}，使用默认值 0.5")
-    return 0.5
+from core.ai_diagnosis.engine import (DEFAULT_DETAIL_TOP_N, DiagnosisEngine,
+                                      extract_table_only,
+                                      parse_diagnosis_table,
+                                      parse_probability)
+from core.ai_diagnosis.generation import END_MARKER
+from utils.json.schema import ROOT_KEY
+from utils.parser.compact import describe_delimiter, render_compact_header
+
+__all__ = [
+    "HERB_COLUMNS",
+    "HERB_SHORTLIST_COLUMNS",
+    "HerbDiagnosis",
+    "format_json_diagnosis",
+    "format_json_herb_diagnosis",
+    # 表格解析函数与两阶段诊断默认值由 engine 提供，保留在此导出供原有调用方使用
+    "DEFAULT_DETAIL_TOP_N",
+    "extract_table_only",
+    "parse_diagnosis_table",
+    "parse_probability",
+]
+
+HERB_COLUMNS = [
+    "zhengming", "description", "p", "therapy", "base", "continue", "suggest",
+    "base_prescription", "base_prescription_usage",
+    "continue_prescription", "continue_prescription_usage",
+    "suggest_prescription", "suggest_prescription_usage",
+]
+# 两阶段诊断第一阶段只输出的列
+HERB_SHORTLIST_COLUMNS = ["zhengming", "description", "p"]
+
+# 模型默认生成参数
+GENERATE_ARGS = {
+    "max_tokens": 2048,
+    "temperature": 0.8,
+    "top_p": 0.8,
+}
+
+# 每行中医诊断大约消耗的 token 数及表头等固定开销，用于估算 max_tokens
+TOKENS_PER_ROW = 360
+# 紧凑格式没有表格边框和对齐填充，每行消耗的 token 更少
+COMPACT_TOKENS_PER_ROW = 320
+SHORTLIST_TOKENS_PER_ROW = 90
+TABLE_OVERHEAD_TOKENS = 140
+MAX_TOKENS_CEILING = 4096
 
 
 def format_json_herb_diagnosis(parsed: List[Dict[str, str]]) -> List[Dict[str, Any]]:
@@ -179,50 +135,34 @@ def format_json_diagnosis(parsed: List[Dict[str, str]]) -> List[Dict[str, Any]]:
     return result
 
 
-class HerbDiagnosis:
-    def __init__(self):
-        load_dotenv(".env")
-        self.model_name = os.getenv("model_name")
-        self.base_url = os.getenv("base_url")
-        self.api_key = os.getenv("api_key")
-        self.sys_prompt = None
-        self.initialized = False
-        self.agent: DialogAgent = None
-
-        logger.info(f"Model Name: {self.model_name}")
-        logger.info(f"Base URL: {self.base_url}")
-        logger.info(f"API Key: {self.api_key}")
-
-        if self.model_name and self.base_url and self.api_key:
-            try:
-                agentscope.init(
-                    model_configs=[
-                        {
-                            "model_type": "openai_chat",
-                            "config_name": "diagnosis",
-                            "model_name": self.model_name,
-                            "api_key": self.api_key,
-                            "client_args": {
-                                "base_url": self.base_url,
-                            },
-                            "generate_args": {
-                                "max_tokens": 2048,
-                                "temperature": 0.8,
-                                "top_p": 0.8,
-                            },
-                        },
-                    ]
-                )
-                self.initialized = True
-                self._init_prompt()
-                self._init_agent()
-            except Exception as e:
-                logger.error(f"AgentScope 初始化失败: {e}")
-        else:
-            logger.warning("模型配置不完整，AgentScope 未初始化")
+class HerbDiagnosis(DiagnosisEngine):
+    engine_name = "herb_diagnosis"
+    tier_name = "herb"
+    label = "中医诊断"
+    shortlist_label = "中医辨证列表"
+    columns = HERB_COLUMNS
+    shortlist_columns = HERB_SHORTLIST_COLUMNS
+    generate_args = GENERATE_ARGS
+    tokens_per_row = TOKENS_PER_ROW
+    compact_tokens_per_row = COMPACT_TOKENS_PER_ROW
+    shortlist_tokens_per_row = SHORTLIST_TOKENS_PER_ROW
+    table_overhead_tokens = TABLE_OVERHEAD_TOKENS
+    max_tokens_ceiling = MAX_TOKENS_CEILING
+    format_rows = staticmethod(format_json_herb_diagnosis)
+    diagnosis_request = (
+        "请基于中医理论进行分析，按可能性从高到低给出最可能的{max_results}个证型，表格最多{max_results}行。"
+        "严格输出符合要求的中医诊断表格格式，字段齐全，不得缺失。特别注意p字段必须是0-1之间的数字。"
+    )
+    compact_request = "请基于中医理论进行分析，按可能性从高到低给出最可能的{max_results}个证型，最多输出{max_results}行数据。"
+    # 两阶段诊断的用户消息与三种输出格式通用，格式要求由各自的系统提示词给出
+    shortlist_request = "请基于中医理论，按可能性从高到低给出最可能的{max_results}个证型，最多输出{max_results}行。"
+    details_request = (
+        "已确定证型：{name}（病理分析：{description}）。\n"
+        "请只针对该证型输出1行中医诊断结果，zhengming 填写该证名，字段齐全，不得缺失。"
+    )
 
     def _init_prompt(self) -> None:
-        self.sys_prompt = """你是中兽医专家，请根据以下症状严格输出包含13列的Markdown表格中医诊断结果，不得缺失列，尤其是最后一列不能截断：
+        self.sys_prompt = f"""你是中兽医专家，请根据以下症状严格输出包含13列的Markdown表格中医诊断结果，不得缺失列，尤其是最后一列不能截断：
 
 | zhengming | description | p | therapy | base | continue | suggest | base_prescription | base_prescription_usage | continue_prescription | continue_prescription_usage | suggest_prescription | suggest_prescription_usage |
 |-----------|-------------|---|---------|------|----------|---------|-------------------|-------------------------|----------------------|----------------------------|---------------------|---------------------------|
@@ -242,38 +182,38 @@ class HerbDiagnosis:
 - suggest_prescription: 急救方剂
 - suggest_prescription_usage: 急救方剂用法
 
-所有字段必须完整输出，p字段必须是0-1之间的数字，不得多余文字。请开始中医诊断："""
-
-    def _init_agent(self) -> None:
-        self.agent = DialogAgent(
-            name="diagnosis",
-            model_config_name="diagnosis",
-            sys_prompt=self.sys_prompt,
+所有字段必须完整输出，p字段必须是0-1之间的数字，不得多余文字，表格结束后立即输出 {END_MARKER}。请开始中医诊断："""
+        self.structured_prompt = (
+            "你是中兽医专家，请根据以下症状进行中医辨证并输出诊断结果。"
+            f"只输出一个JSON对象，格式为 {{\"{ROOT_KEY}\": [诊断对象, ...]}}，"
+            f"每个诊断对象必须包含以下字段：{', '.join(HERB_COLUMNS)}。"
+            "p 为0-1之间的数字，其余字段为字符串，所有字段必须完整输出，不得多余文字。"
         )
+        self.compact_prompt = f"""你是中兽医专家，请根据以下症状进行中医辨证并输出诊断结果。第一行原样输出以下表头：
+{render_compact_header(HERB_COLUMNS, self.delimiter)}
 
-    def diagnosis(self, desc: str) -> List[Dict[str, Any]]:
-        if not self.initialized or self.agent is None:
-            logger.error("中医诊断模型未初始化")
-            return []
-
-        user_message = f"""症状描述：{desc}
+之后每个证型输出一行，共{len(HERB_COLUMNS)}个字段，按表头顺序排列，字段之间用{describe_delimiter(self.delimiter)}分隔，字段内容中不得出现该分隔符和换行。p 为0-1之间的数字，所有字段必须完整输出，不得多余文字，全部输出后立即输出 {END_MARKER}。请开始中医诊断："""
+        self.shortlist_prompt = f"""你是中兽医专家，请根据以下症状快速进行中医辨证，严格输出包含3列的Markdown表格：
 
-请基于中医理论进行分析，严格输出符合要求的中医诊断表格格式，字段齐全，不得缺失。特别注意p字段必须是0-1之间的数字。"""
+| zhengming | description | p |
+|-----------|-------------|---|
 
-        task = Msg("User", user_message, "user")
-        result = self.agent(task)
-        logger.info(f"Raw Result: {result.content}")
+字段说明：
+- zhengming: 中医证名
+- description: 简要病理分析
+- p: 诊断概率(0-1之间的数字)
 
-        cleaned_content = result.content
-        logger.info(f"Cleaned Result: {cleaned_content}")
+不要输出治法和方剂内容，不得多余文字，表格结束后立即输出 {END_MARKER}。请开始中医辨证："""
+        self.shortlist_structured_prompt = (
+            "你是中兽医专家，请根据以下症状快速进行中医辨证。"
+            f"只输出一个JSON对象，格式为 {{\"{ROOT_KEY}\": [证型对象, ...]}}，"
+            f"每个证型对象只包含以下字段：{', '.join(HERB_SHORTLIST_COLUMNS)}。"
+            "description 只写简要病理分析，p 为0-1之间的数字，不要输出治法和方剂内容，不得多余文字。"
+        )
+        self.shortlist_compact_prompt = f"""你是中兽医专家，请根据以下症状快速进行中医辨证。第一行原样输出以下表头：
+{render_compact_header(HERB_SHORTLIST_COLUMNS, self.delimiter)}
 
-        try:
-            parsed = parse_diagnosis_table(cleaned_content)
-            logger.info(f"Parsed Result: {parsed}")
-            return format_json_herb_diagnosis(parsed)
-        except Exception as e:
-            logger.error(f"中医诊断解析失败: {e}")
-            return []
+之后每个证型输出一行，共{len(HERB_SHORTLIST_COLUMNS)}个字段，按表头顺序排列，字段之间用{describe_delimiter(self.delimiter)}分隔，字段内容中不得出现该分隔符和换行。description 只写简要病理分析，p 为0-1之间的数字，不要输出治法和方剂内容，不得多余文字，全部输出后立即输出 {END_MARKER}。请开始中医辨证："""
 
     def test_with_sample_data(self) -> List[Dict[str, Any]]:
         """使用示例数据测试格式化功能"""
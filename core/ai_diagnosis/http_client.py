@@ -0,0 +1,112 @@
+import atexit
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+
+class HttpClientStats:
+    """通过 httpx 事件钩子和 httpcore trace 统计连接池使用情况"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.responses = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def on_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self.requests += 1
+
+    def on_response(self, response: httpx.Response) -> None:
+        with self._lock:
+            self.responses += 1
+
+
+_client: Optional[httpx.Client] = None
+_stats = HttpClientStats()
+_client_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("http2", "false").strip().lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("未安装 h2，HTTP/2 未启用，可通过 pip install httpx[http2] 安装")
+        return False
+    return True
+
+
+def get_http_client() -> httpx.Client:
+    """
+    获取进程级共享的 HTTP 客户端，所有引擎、所有上游的模型请求复用同一个连接池
+
+    连接数、keep-alive 与超时通过环境变量 http_max_connections、http_max_keepalive、
+    http_keepalive_expiry、http_timeout 配置，http2=true 且安装了 h2 时启用 HTTP/2。
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                load_dotenv(".env")
+                limits = httpx.Limits(
+                    max_connections=int(os.getenv("http_max_connections", "100")),
+                    max_keepalive_connections=int(os.getenv("http_max_keepalive", "20")),
+                    keepalive_expiry=float(os.getenv("http_keepalive_expiry", "30")),
+                )
+                _client = httpx.Client(
+                    limits=limits,
+                    timeout=httpx.Timeout(float(os.getenv("http_timeout", "120")), connect=10),
+                    http2=_http2_enabled(),
+                    event_hooks={"request": [_stats.on_request], "response": [_stats.on_response]},
+                )
+                atexit.register(_client.close)
+    return _client
+
+
+def http_client_metrics() -> Dict[str, Any]:
+    """共享连接池的容量、当前连接数及连接复用情况"""
+    if _client is None:
+        return {}
+
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    max_connections = getattr(pool, "_max_connections", None)
+
+    with _stats._lock:
+        requests = _stats.requests
+        new_connections = _stats.new_connections
+        stats = {
+            "requests": requests,
+            "responses": _stats.responses,
+            "new_connections": new_connections,
+            "tls_handshakes": _stats.tls_handshakes,
+        }
+    stats.update({
+        "max_connections": max_connections,
+        "max_keepalive_connections": getattr(pool, "_max_keepalive_connections", None),
+        "http2": getattr(pool, "_http2", False),
+        "open_connections": len(connections),
+        "active_connections": len(connections) - idle,
+        "idle_connections": idle,
+        "utilization": round((len(connections) - idle) / max_connections, 4) if max_connections else None,
+        "connection_reuse_ratio": round(1 - new_connections / requests, 4) if requests else None,
+    })
+    return stats
@@ -1,51 +1,80 @@
+import copy
 import json
 import os
 import re
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-import agentscope
 from agentscope.agents import ReActAgent
 from agentscope.message import Msg
 from agentscope.service import (ServiceExecStatus, ServiceResponse,
-                                ServiceToolkit, execute_python_code)
+                                ServiceToolkit)
 from dotenv import load_dotenv
 
 from config.logger import logger
+from core.ai_diagnosis.cancellation import CheckpointModel
+from core.ai_diagnosis.deadline import DeadlineExceeded
+from core.ai_diagnosis.diagnosis import DIAGNOSIS_COLUMNS
+from core.ai_diagnosis.generation import (FORMAT_GUARD_TOKENS,
+                                          budget_max_tokens, build_messages,
+                                          continue_truncated_json,
+                                          generate_structured,
+                                          resolve_max_results)
+from core.ai_diagnosis.tiering import TierRouter
+from core.ai_diagnosis.upstream import UpstreamPool, init_agentscope
+from utils.json.schema import ROOT_KEY, resolve_structured_output
 from utils.json.fix_broken_json import fix_broken_json
 from utils.parser.markdown_json_list_parser import extract_clean_json
+from utils.react_tool.sandbox_pool import execute_python_code
 from utils.react_tool.toolkit import (extract_json_block,
                                       format_json_diagnosis,
                                       repair_broken_json, return_result)
 
+# 模型默认生成参数
+GENERATE_ARGS = {
+    "max_tokens": 4096,
+    "temperature": 0.7,
+    "frequency_penalty": 1.2,
+    "top_p": 0.8,
+}
+
+# 每个 JSON 诊断对象大约消耗的 token 数及 ReAct 思考/标签等固定开销
+TOKENS_PER_ITEM = 380
+REACT_OVERHEAD_TOKENS = 400
+STRUCTURED_OVERHEAD_TOKENS = 100
+MAX_TOKENS_CEILING = 4096
+
 
 class ReDiagnosis:
-    def __init__(self):
+    def __init__(self, structured_output: Optional[str] = None):
         load_dotenv(".env")
-        self.model_name = os.getenv("model_name")
-        self.base_url = os.getenv("base_url")
-        self.api_key = os.getenv("api_key")
+        # 上游推理服务池，支持多个 OpenAI 兼容服务，未配置 upstreams 时只有 .env 中的单个服务
+        self.tiers = TierRouter("re_diagnosis", GENERATE_ARGS)
+        self.upstreams = self.tiers.large
+        primary = self.upstreams.primary if self.upstreams is not None else None
+        self.model_name = primary.model_name if primary else os.getenv("model_name")
+        self.base_url = primary.base_url if primary else os.getenv("base_url")
+        self.api_key = primary.api_key if primary else os.getenv("api_key")
         self.model = self.model_name or "vet-logicstorm-lora"
+        # 结构化输出模式：json_schema / json_object，未设置时读取环境变量 structured_output
+        self.structured_output = resolve_structured_output(
+            structured_output if structured_output is not None else os.getenv("structured_output")
+        )
+        # 流式格式守卫检查的 token 数，0 表示关闭，未设置时读取环境变量 format_guard_tokens
+        self.format_guard_tokens = int(os.getenv("format_guard_tokens", FORMAT_GUARD_TOKENS))
         self.initialized = False
 
-        if self.model_name and self.base_url and self.api_key:
+        if self.upstreams is not None:
             try:
-                agentscope.init(
-                    model_configs=[
-                        {
-                            "model_type": "openai_chat",
-                            "config_name": "diagnosis",
-                            "model_name": self.model_name,
-                            "api_key": self.api_key,
-                            "client_args": {"base_url": self.base_url},
-                            "generate_args": {
-                                "max_tokens": 4096,
-                                "temperature": 0.7,
-                                "frequency_penalty": 1.2,
-                                "top_p": 0.8,
-                            },
-                        },
-                    ]
+                init_agentscope(
+                    {
+                        "model_type": "openai_chat",
+                        "config_name": "re_diagnosis",
+                        "model_name": self.model_name,
+                        "api_key": self.api_key,
+                        "client_args": {"base_url": self.base_url},
+                        "generate_args": GENERATE_ARGS,
+                    }
                 )
                 self.initialized = True
                 logger.info("AgentScope 初始化成功")
@@ -62,7 +91,8 @@ class ReDiagnosis:
         # toolkit.add(extract_json_block, func_description="从文本中提取JSON代码块")
         # toolkit.add(format_json_diagnosis, func_description="格式化诊断JSON字符串，修复各种格式问题")
         # toolkit.add(return_result, func_description="返回最终结果")
-        toolkit.add(execute_python_code, func_description="执行Python代码", timeout=300, use_docker=False)
+        # 使用预启动的沙箱进程池执行代码，避免每次工具调用都重新启动解释器
+        toolkit.add(execute_python_code, func_description="执行Python代码", timeout=300)
 
         sys_prompt = (
             f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
@@ -104,9 +134,10 @@ class ReDiagnosis:
             "20. Ensure there are no trailing commas in objects or arrays\n"
         )
 
+        self.sys_prompt = sys_prompt
         self.agent = ReActAgent(
             name="DiagnosisAgent",
-            model_config_name="diagnosis",
+            model_config_name="re_diagnosis",
             sys_prompt=sys_prompt,
             service_toolkit=toolkit,
             max_iters=3,
@@ -115,7 +146,7 @@ class ReDiagnosis:
             
 
     
-    def dialog_diagnosis(self, desc: str) -> List[Dict[str, Any]]:
+    def dialog_diagnosis(self, desc: str, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
         """执行宠物症状诊断，返回诊断结果数组"""
 
         if not self.initialized:
@@ -126,14 +157,63 @@ class ReDiagnosis:
             logger.warning("诊断描述为空")
             return []
 
+        max_results = resolve_max_results(max_results)
+        return self.tiers.run(desc, lambda upstreams: self._dialog_diagnosis(upstreams, desc, max_results))
+
+    def _dialog_diagnosis(self, upstreams: UpstreamPool, desc: str, max_results: int) -> List[Dict[str, Any]]:
+        """使用指定档位的上游完成一次诊断"""
+        max_tokens = budget_max_tokens(
+            max_results, TOKENS_PER_ITEM, REACT_OVERHEAD_TOKENS, MAX_TOKENS_CEILING
+        )
+
         try:
             
            # 发送任务
-            task = Msg("User", f"症状描述：{desc}", "user")
-            result = self.agent(task)
-
-            # 获取原始模型输出
-            raw_output = result.content if isinstance(result.content, str) else getattr(result.content, 'text', str(result.content))
+            user_message = f"症状描述：{desc}\n请按可能性从高到低给出最可能的{max_results}个诊断，JSON数组最多包含{max_results}个对象。"
+
+            with upstreams.lease() as leased:
+                # ReAct 循环内部不接受单次调用参数，复制所选上游的模型包装器并按诊断条数设置 max_tokens，
+                # 避免修改多个请求共享的 generate_args
+                model = copy.copy(leased)
+                model.generate_args = {**leased.generate_args, "max_tokens": max_tokens}
+                if self.structured_output:
+                    # 结构化输出与 ReAct 的标签格式互斥，直接调用模型并由服务端约束输出
+                    rows, raw_output = generate_structured(
+                        model,
+                        build_messages(
+                            self.sys_prompt,
+                            f'{user_message}\n请将JSON数组放在 "{ROOT_KEY}" 字段中输出一个JSON对象。',
+                        ),
+                        self.structured_output,
+                        "re_diagnosis",
+                        DIAGNOSIS_COLUMNS,
+                        max_results,
+                        TOKENS_PER_ITEM,
+                        STRUCTURED_OVERHEAD_TOKENS,
+                        MAX_TOKENS_CEILING,
+                        guard_tokens=self.format_guard_tokens,
+                    )
+                    if rows is not None:
+                        logger.info("结构化输出解析成功")
+                        return rows[:max_results]
+                else:
+                    task = Msg("User", user_message, "user")
+                    # 每轮 ReAct 迭代调用模型前检查请求是否已取消、剩余时间是否足够
+                    self.agent.model = CheckpointModel(model)
+                    result = self.agent(task)
+
+                    # 获取原始模型输出
+                    raw_output = result.content if isinstance(result.content, str) else getattr(result.content, 'text', str(result.content))
+
+                    # 0. JSON 数组被截断时，从最后一个完整对象之后续写，而不是简单补全括号
+                    raw_output = continue_truncated_json(
+                        model,
+                        build_messages(self.sys_prompt, user_message),
+                        raw_output,
+                        max_results,
+                        TOKENS_PER_ITEM,
+                        MAX_TOKENS_CEILING,
+                    )
             logger.debug("模型原始输出:\n%s", raw_output)
             logger.debug("模型输出类型: %s", type(raw_output))
 
@@ -142,7 +222,7 @@ class ReDiagnosis:
                 json_result = json.loads(raw_output)
                 if isinstance(json_result, list):
                     logger.info("直接解析模型输出成功")
-                    return json_result
+                    return json_result[:max_results]
             except json.JSONDecodeError:
                 logger.debug("直接解析模型输出失败，尝试修复格式")
 
@@ -152,7 +232,7 @@ class ReDiagnosis:
                 json_result = json.loads(fixed_json_str)
                 if isinstance(json_result, list):
                     logger.info("通过 fix_broken_json 修复并解析成功")
-                    return json_result
+                    return json_result[:max_results]
             except Exception as e:
                 logger.warning("修复 JSON 格式失败: %s", str(e))
 
@@ -161,13 +241,15 @@ class ReDiagnosis:
                 json_result = extract_clean_json(raw_output)
                 if isinstance(json_result, list):
                     logger.info("通过 extract_clean_json 提取成功")
-                    return json_result
+                    return json_result[:max_results]
             except Exception as e:
                 logger.error("extract_clean_json 解析失败: %s", str(e), exc_info=True)
 
             logger.error("最终未能成功解析 JSON 格式")
             return []
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"诊断过程中发生异常: {e}", exc_info=True)
             return []
\ No newline at end of file
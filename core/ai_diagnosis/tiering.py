@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config.logger import logger
+from core.ai_diagnosis.deadline import DeadlineExceeded, can_start_call
+from core.ai_diagnosis.upstream import UpstreamPool, get_upstream_pool
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+# 小模型处理的描述上限：字数、症状分句数
+DEFAULT_SMALL_MAX_CHARS = 40
+DEFAULT_SMALL_MAX_CLAUSES = 3
+# 小模型结果的最高概率低于该值时升级到大模型
+DEFAULT_ESCALATE_P = 0.5
+
+# 出现这些危重症状时直接使用大模型
+RED_FLAG_KEYWORDS = (
+    "抽搐", "昏迷", "休克", "呼吸困难", "张口呼吸", "大出血", "便血", "吐血", "尿血",
+    "中毒", "黄疸", "瘫痪", "难产", "无尿", "高热", "惊厥", "骨折", "意识",
+)
+_CLAUSE_RE = re.compile(r"[，,。；;、\n]+")
+# 化验值、体温等数值，以及化验指标缩写
+_LAB_VALUE_RE = re.compile(r"\d+(?:\.\d+)?\s*(?:℃|度|mmol|g/L|mg|%|次/分)|[A-Z]{2,}")
+
+
+def count_clauses(desc: str) -> int:
+    """按标点切分症状描述，统计分句数"""
+    return len([part for part in _CLAUSE_RE.split(desc) if part.strip()])
+
+
+def is_simple_case(desc: str, max_chars: int, max_clauses: int) -> bool:
+    """
+    判断症状描述是否足够简单，可交给小模型
+
+    简单病例：描述较短、症状分句少，且不含危重症状关键词和化验数值。
+    """
+    text = desc.strip()
+    if len(text) > max_chars or count_clauses(text) > max_clauses:
+        return False
+    if any(keyword in text for keyword in RED_FLAG_KEYWORDS):
+        return False
+    return _LAB_VALUE_RE.search(text) is None
+
+
+def needs_escalation(results: List[Dict[str, Any]], threshold: float) -> bool:
+    """结果为空（解析失败）或最高概率低于阈值时需要升级到大模型"""
+    if not results:
+        return True
+    # 延迟导入，避免与 engine 模块循环引用
+    from core.ai_diagnosis.engine import parse_probability
+
+    top = max(parse_probability(item.get("p")) for item in results)
+    return top < threshold
+
+
+class TierRouter:
+    """
+    按症状描述的复杂度在小模型和大模型之间路由，小模型结果置信度低时升级
+
+    小模型档位通过 {engine}_small_upstreams / small_upstreams 或 small_model_name 配置，
+    未配置时所有请求都使用引擎的默认（大）模型。
+    """
+
+    _stats: Dict[str, Dict[str, int]] = {}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, engine: str, generate_args: Dict[str, Any]):
+        self.engine = engine
+        self.large: Optional[UpstreamPool] = get_upstream_pool(engine, generate_args)
+        self.small: Optional[UpstreamPool] = get_upstream_pool(engine, generate_args, tier=SMALL_TIER)
+        self.small_max_chars = int(os.getenv("tier_small_max_chars", DEFAULT_SMALL_MAX_CHARS))
+        self.small_max_clauses = int(os.getenv("tier_small_max_clauses", DEFAULT_SMALL_MAX_CLAUSES))
+        self.escalate_p = float(os.getenv("tier_escalate_p", DEFAULT_ESCALATE_P))
+
+    def route(self, desc: str) -> str:
+        """选择处理该描述的模型档位"""
+        if self.small is None or self.large is None:
+            return LARGE_TIER
+        if is_simple_case(desc, self.small_max_chars, self.small_max_clauses):
+            return SMALL_TIER
+        return LARGE_TIER
+
+    def pool_for(self, desc: str) -> Optional[UpstreamPool]:
+        """按路由结果返回上游池，不计数也不升级，用于补全已有诊断等后续调用"""
+        return self.small if self.route(desc) == SMALL_TIER else self.large
+
+    def run(
+        self,
+        desc: str,
+        diagnose: Callable[[UpstreamPool], List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        按路由结果调用 diagnose，小模型结果需要升级时改用大模型重新诊断
+
+        Args:
+            desc: 症状描述
+            diagnose: 接收上游池并返回诊断结果的函数
+
+        Returns:
+            List[Dict[str, Any]]: 诊断结果
+        """
+        tier = self.route(desc)
+        self._count(tier)
+        if tier == LARGE_TIER:
+            return diagnose(self.large)
+
+        try:
+            results = diagnose(self.small)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"小模型诊断失败，升级到大模型: {e}")
+            results = []
+        if not needs_escalation(results, self.escalate_p):
+            return results
+        if not can_start_call("escalation"):
+            if not results:
+                raise DeadlineExceeded("小模型诊断无结果，剩余时间不足以调用大模型")
+            # 剩余时间不足以调用大模型，返回小模型的结果
+            return results
+
+        logger.info(f"小模型结果置信度不足（阈值 {self.escalate_p}），升级到大模型")
+        self._count("escalated")
+        return diagnose(self.large)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(self.engine, {SMALL_TIER: 0, LARGE_TIER: 0, "escalated": 0})
+            stats[key] += 1
+
+
+def tier_metrics() -> Dict[str, Dict[str, int]]:
+    """各引擎按档位路由的请求数及升级次数"""
+    with TierRouter._stats_lock:
+        return {engine: dict(stats) for engine, stats in TierRouter._stats.items()}
@@ -0,0 +1,362 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import agentscope
+from agentscope.manager import ModelManager
+from agentscope.models import OpenAIChatWrapper
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.cancellation import RequestCancelled, check_cancelled
+from core.ai_diagnosis.circuit_breaker import get_circuit_breaker
+from core.ai_diagnosis.deadline import DeadlineExceeded
+from core.ai_diagnosis.http_client import get_http_client
+
+# 选择上游的策略：least_inflight 选进行中请求最少的，latency 按 EWMA 延迟与负载综合选择
+UPSTREAM_STRATEGIES = ("least_inflight", "latency")
+EWMA_ALPHA = 0.3
+
+
+class Upstream:
+    """单个 OpenAI 兼容的推理服务及其运行状态"""
+
+    def __init__(
+        self,
+        engine: str,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model_name: str,
+        generate_args: Dict[str, Any],
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = OpenAIChatWrapper(
+            config_name=f"{engine}:{name}",
+            model_name=model_name,
+            api_key=api_key,
+            client_args={"base_url": base_url, "http_client": get_http_client()},
+            generate_args=dict(generate_args),
+        )
+
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ewma_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, latency: float, error: Optional[BaseException]) -> None:
+        """记录一次调用的结果，调用方需持有连接池的锁"""
+        self.requests += 1
+        if error is None:
+            self.consecutive_failures = 0
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+
+    def probe(self, timeout: float) -> bool:
+        """通过 /models 接口探测服务是否可用"""
+        try:
+            self.model.client.with_options(timeout=timeout, max_retries=0).models.list()
+            return True
+        except Exception as e:
+            self.last_error = f"probe {type(e).__name__}: {e}"[:200]
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "model_name": self.model_name,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class UpstreamPool:
+    """
+    一个引擎的多个上游推理服务
+
+    每次调用通过 lease() 选择健康的上游：默认选进行中请求最少的，也可按 EWMA 延迟选择。
+    连续失败达到阈值的上游会被摘除，由后台线程定期探测 /models，恢复后重新加入。
+    """
+
+    def __init__(
+        self,
+        engine: str,
+        upstreams: List[Upstream],
+        strategy: str = "least_inflight",
+        eject_failures: int = 3,
+        probe_interval: float = 10,
+        probe_timeout: float = 3,
+    ):
+        if not upstreams:
+            raise ValueError(f"引擎 {engine} 没有可用的上游配置")
+        self.engine = engine
+        self.upstreams = upstreams
+        self.strategy = strategy if strategy in UPSTREAM_STRATEGIES else "least_inflight"
+        self.eject_failures = eject_failures
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._stop = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+
+        # 只有一个上游时摘除没有意义，不启动探测线程
+        if len(upstreams) > 1 and probe_interval > 0:
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop, name=f"upstream-probe-{engine}", daemon=True
+            )
+            self._probe_thread.start()
+
+    @property
+    def primary(self) -> Upstream:
+        return self.upstreams[0]
+
+    def _score(self, upstream: Upstream) -> tuple:
+        latency = upstream.ewma_latency or 0.0
+        if self.strategy == "latency":
+            return ((upstream.in_flight + 1) * latency, upstream.in_flight)
+        return (upstream.in_flight, latency)
+
+    def select(self) -> Upstream:
+        """选择一个上游，调用方需持有锁"""
+        candidates = [upstream for upstream in self.upstreams if upstream.healthy]
+        if not candidates:
+            # 全部被摘除时仍然尝试，避免探测恢复前服务完全不可用
+            candidates = self.upstreams
+        # 从轮转位置开始比较，得分相同时请求均匀分布
+        self._cursor = (self._cursor + 1) % len(candidates)
+        ordered = candidates[self._cursor:] + candidates[:self._cursor]
+        return min(ordered, key=self._score)
+
+    @contextmanager
+    def lease(self) -> Iterator[OpenAIChatWrapper]:
+        """
+        租用一个上游的模型包装器，退出时记录耗时和异常
+
+        请求被取消或超过请求截止时间（由客户端决定，与上游健康无关）时不计入上游与熔断器的统计；
+        调用完成时请求已取消则抛出 RequestCancelled，跳过调用方后续的解析。
+
+        Yields:
+            OpenAIChatWrapper: 所选上游的模型
+        """
+        with self._lock:
+            upstream = self.select()
+            upstream.in_flight += 1
+        start = time.perf_counter()
+        error = None
+        try:
+            yield upstream.model
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            abandoned = isinstance(error, (RequestCancelled, DeadlineExceeded))
+            if not abandoned:
+                # 引擎级熔断器统计所有上游的调用结果
+                get_circuit_breaker(self.engine).record(latency, error)
+            with self._lock:
+                upstream.in_flight -= 1
+                if not abandoned:
+                    upstream.record(latency, error)
+                if (
+                    error is not None
+                    and upstream.healthy
+                    and upstream.consecutive_failures >= self.eject_failures
+                    and len(self.upstreams) > 1
+                ):
+                    upstream.healthy = False
+                    upstream.ejections += 1
+                    logger.warning(
+                        f"上游 {self.engine}/{upstream.name} 连续失败 {upstream.consecutive_failures} 次，已摘除"
+                    )
+        check_cancelled()
+
+    def probe_all(self) -> None:
+        """探测所有上游：失败的摘除，已摘除但探测成功的重新加入"""
+        for upstream in self.upstreams:
+            ok = upstream.probe(self.probe_timeout)
+            with self._lock:
+                if ok and not upstream.healthy:
+                    upstream.healthy = True
+                    upstream.consecutive_failures = 0
+                    logger.info(f"上游 {self.engine}/{upstream.name} 探测恢复，重新加入")
+                elif not ok and upstream.healthy:
+                    upstream.healthy = False
+                    upstream.ejections += 1
+                    logger.warning(f"上游 {self.engine}/{upstream.name} 探测失败，已摘除")
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "upstreams": [upstream.stats() for upstream in self.upstreams],
+            }
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._probe_thread is not None:
+            self._probe_thread.join(timeout=self.probe_timeout + 1)
+
+
+def load_upstream_configs(engine: str, tier: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    读取引擎的上游配置
+
+    优先级：环境变量 {engine}_upstreams > upstreams > 单个 base_url / api_key / model_name。
+    列表配置为 JSON 数组，每项包含 base_url，可选 name、api_key、model_name，缺省时沿用单个配置的值。
+
+    指定 tier 时读取该档位的配置：{engine}_{tier}_upstreams > {tier}_upstreams，
+    或只配置 {engine}_{tier}_model_name / {tier}_model_name 在默认服务上使用另一个模型；
+    都未配置时返回空列表，表示该引擎没有这一档模型。
+    """
+    default = {
+        "base_url": os.getenv("base_url"),
+        "api_key": os.getenv("api_key"),
+        "model_name": os.getenv("model_name"),
+    }
+    if tier:
+        raw = os.getenv(f"{engine}_{tier}_upstreams") or os.getenv(f"{tier}_upstreams")
+        tier_model = os.getenv(f"{engine}_{tier}_model_name") or os.getenv(f"{tier}_model_name")
+        if not raw and not tier_model:
+            return []
+        if tier_model:
+            default["model_name"] = tier_model
+    else:
+        raw = os.getenv(f"{engine}_upstreams") or os.getenv("upstreams")
+    items = []
+    if raw:
+        try:
+            items = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.error(f"上游配置解析失败，使用单个上游配置: {e}")
+            items = []
+    if not isinstance(items, list) or not items:
+        items = [default]
+
+    configs = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        config = {key: item.get(key) or value for key, value in default.items()}
+        if not all(config.values()):
+            logger.warning(f"跳过不完整的上游配置: {item.get('name') or config['base_url']}")
+            continue
+        config["name"] = item.get("name") or urlparse(config["base_url"]).netloc or f"upstream-{index}"
+        configs.append(config)
+    return configs
+
+
+_agentscope_initialized = False
+_agentscope_lock = threading.Lock()
+
+
+def init_agentscope(model_config: Dict[str, Any]) -> None:
+    """
+    进程内只初始化一次 agentscope，并注册引擎的模型配置
+
+    agentscope.init 每次调用都会新建运行目录并保存代码，不能放在每个请求的引擎构造中。
+    注册的配置只包含可序列化的字段（agentscope.state_dict 会深拷贝模型配置），
+    实际调用都经过 UpstreamPool.lease() 租用的模型，共享的 HTTP 客户端只在 Upstream 中使用。
+    """
+    global _agentscope_initialized
+    with _agentscope_lock:
+        if not _agentscope_initialized:
+            agentscope.init()
+            _agentscope_initialized = True
+        manager = ModelManager.get_instance()
+        if manager.get_config_by_name(model_config["config_name"]) is None:
+            manager.load_model_configs([dict(model_config)])
+
+
+_pools: Dict[str, Optional[UpstreamPool]] = {}
+_pools_lock = threading.Lock()
+
+
+def get_upstream_pool(
+    engine: str,
+    generate_args: Dict[str, Any],
+    tier: Optional[str] = None,
+) -> Optional[UpstreamPool]:
+    """
+    获取引擎的进程级共享上游池，首次调用时根据环境变量创建
+
+    Args:
+        engine: 引擎名称，同时用于读取 {engine}_upstreams 配置
+        generate_args: 该引擎的默认生成参数
+        tier: 模型档位，如 "small"；为空时为引擎的默认模型
+
+    Returns:
+        Optional[UpstreamPool]: 没有完整的上游配置时返回 None
+    """
+    key = f"{engine}:{tier}" if tier else engine
+    if key in _pools:
+        return _pools[key]
+    with _pools_lock:
+        if key in _pools:
+            return _pools[key]
+        load_dotenv(".env")
+        configs = load_upstream_configs(engine, tier)
+        if not configs:
+            _pools[key] = None
+            return None
+        upstreams = [
+            Upstream(key, config["name"], config["base_url"], config["api_key"],
+                     config["model_name"], generate_args)
+            for config in configs
+        ]
+        pool = UpstreamPool(
+            key,
+            upstreams,
+            strategy=os.getenv("upstream_strategy", "least_inflight"),
+            eject_failures=int(os.getenv("upstream_eject_failures", "3")),
+            probe_interval=float(os.getenv("upstream_probe_interval", "10")),
+            probe_timeout=float(os.getenv("upstream_probe_timeout", "3")),
+        )
+        _pools[key] = pool
+        logger.info(f"引擎 {key} 上游: {[upstream.name for upstream in upstreams]}，策略 {pool.strategy}")
+        return pool
+
+
+def upstream_metrics() -> Dict[str, Any]:
+    """所有引擎上游的延迟、错误与健康状态"""
+    return {key: pool.stats() for key, pool in list(_pools.items()) if pool is not None}
+
+
+def shutdown_upstream_pools() -> None:
+    for pool in list(_pools.values()):
+        if pool is not None:
+            pool.shutdown()
+
+
+atexit.register(shutdown_upstream_pools)
@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# 当前请求的用量接收方，由调用方（如限流中间件）设置；线程池与任务执行时随上下文传递
+_usage_sink: ContextVar[Optional[Callable[[int], None]]] = ContextVar("usage_sink", default=None)
+
+
+@contextmanager
+def usage_sink(sink: Callable[[int], None]) -> Iterator[None]:
+    """在此上下文中发起的模型调用，其 token 用量都会交给 sink"""
+    token = _usage_sink.set(sink)
+    try:
+        yield
+    finally:
+        _usage_sink.reset(token)
+
+
+def report_usage(usage: Optional[Dict[str, Any]]) -> None:
+    """上报一次模型调用的用量（OpenAI 格式的 usage），没有接收方或服务端未返回用量时忽略"""
+    if not usage:
+        return
+    sink = _usage_sink.get()
+    if sink is None:
+        return
+    total = usage.get("total_tokens")
+    if total is None:
+        total = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    if total:
+        sink(int(total))
@@ -0,0 +1,169 @@
+import glob
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.generation import resolve_max_results
+from utils.cache.persistent_cache import get_persistent_cache
+from utils.cache.semantic_cache import get_semantic_cache, semantic_cache_enabled
+
+# 预热方式：off 不预热，background 启动后在后台线程预热，blocking 预热完成后才开始接收请求
+WARMUP_MODES = ("off", "background", "blocking")
+DEFAULT_TOP_N = 50
+DEFAULT_MAX_CALLS = 20
+DEFAULT_LOG_PATHS = "server*.log"
+
+# 诊断接口的请求日志，按日志内容区分引擎（两阶段诊断不经过结果缓存，不采集）
+_REQUEST_LOG_PATTERNS = {
+    "diagnosis": re.compile(r"开始处理诊断请求: (.+)$"),
+    "herb_diagnosis": re.compile(r"开始处理中医诊断请求: (.+)$"),
+}
+
+_status: Dict[str, Any] = {"state": "idle"}
+_status_lock = threading.Lock()
+
+
+def harvest_log_descriptions(paths: List[str]) -> Dict[str, Counter]:
+    """
+    从请求日志中统计各引擎症状描述的出现次数
+
+    Args:
+        paths: 日志文件路径，支持通配符
+
+    Returns:
+        Dict[str, Counter]: 引擎名称到描述计数的映射
+    """
+    counts = {engine: Counter() for engine in _REQUEST_LOG_PATTERNS}
+    files = sorted({path for pattern in paths for path in glob.glob(pattern)})
+    for path in files:
+        try:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    if "开始处理" not in line:
+                        continue
+                    for engine, pattern in _REQUEST_LOG_PATTERNS.items():
+                        match = pattern.search(line.rstrip("\n"))
+                        if match and match.group(1).strip():
+                            counts[engine][match.group(1).strip()] += 1
+                            break
+        except OSError as e:
+            logger.warning(f"读取请求日志失败 {path}: {e}")
+    return counts
+
+
+def collect_warmup_descriptions(engine: str, top_n: int, log_counts: Dict[str, Counter]) -> List[str]:
+    """合并持久化缓存的命中次数与日志中的请求次数，返回最常见的描述"""
+    counts = Counter(log_counts.get(engine, {}))
+    store = get_persistent_cache()
+    if store is not None:
+        for item in store.top_descriptions(engine, limit=top_n):
+            # 每个条目至少写入过一次
+            counts[item["description"]] += item["hits"] + 1
+    return [desc for desc, _ in counts.most_common(top_n)]
+
+
+def warm_up(
+    engines: Dict[str, Callable[[], Any]],
+    top_n: int = DEFAULT_TOP_N,
+    max_calls: int = DEFAULT_MAX_CALLS,
+    log_paths: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    用最常见的症状描述预先填充结果缓存
+
+    描述已在持久化缓存中时直接载入近似缓存，不调用模型；否则调用引擎诊断并写入缓存，
+    所有引擎合计最多调用 max_calls 次模型。
+
+    Args:
+        engines: 引擎名称到引擎构造函数的映射，名称与持久化缓存中的 engine 一致
+        top_n: 每个引擎最多预热的描述数
+        max_calls: 预热允许的模型调用次数上限
+        log_paths: 请求日志路径，支持通配符
+
+    Returns:
+        Dict[str, Any]: 预热统计
+    """
+    start = time.perf_counter()
+    log_counts = harvest_log_descriptions(log_paths or [])
+    stats = {"loaded": 0, "generated": 0, "skipped": 0, "failed": 0}
+    calls = 0
+    store = get_persistent_cache()
+
+    for name, factory in engines.items():
+        descriptions = collect_warmup_descriptions(name, top_n, log_counts)
+        if not descriptions:
+            continue
+        engine = factory()
+        max_results = resolve_max_results(None)
+        cache = get_semantic_cache(engine._semantic_namespace(max_results))
+        for desc in descriptions:
+            stored = store.get(engine._cache_key(desc, max_results), touch=False) if store is not None else None
+            if stored is not None:
+                # 已有持久化结果，只需载入本进程的近似缓存
+                if cache is not None:
+                    cache.add(desc, stored)
+                stats["loaded"] += 1
+                continue
+            if calls >= max_calls:
+                stats["skipped"] += 1
+                continue
+            calls += 1
+            try:
+                results = engine.diagnosis(desc)
+            except Exception as e:
+                logger.warning(f"预热诊断失败({name}): {e}")
+                results = []
+            stats["generated" if results else "failed"] += 1
+
+    stats["elapsed_s"] = round(time.perf_counter() - start, 2)
+    logger.info(f"缓存预热完成: {stats}")
+    return stats
+
+
+def run_warmup(engines: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """按环境变量配置执行预热，并记录状态供 /metrics/warmup 查询"""
+    load_dotenv(".env")
+    if get_persistent_cache() is None and not semantic_cache_enabled():
+        logger.info("未启用结果缓存，跳过预热")
+        _set_status({"state": "skipped"})
+        return {}
+
+    _set_status({"state": "running"})
+    try:
+        stats = warm_up(
+            engines,
+            top_n=int(os.getenv("warmup_top_n", DEFAULT_TOP_N)),
+            max_calls=int(os.getenv("warmup_max_calls", DEFAULT_MAX_CALLS)),
+            log_paths=[path.strip() for path in os.getenv("warmup_log_paths", DEFAULT_LOG_PATHS).split(",")
+                       if path.strip()],
+        )
+    except Exception as e:
+        logger.error(f"缓存预热失败: {e}")
+        _set_status({"state": "failed", "error": str(e)})
+        return {}
+    _set_status({"state": "done", **stats})
+    return stats
+
+
+def resolve_warmup_mode() -> str:
+    load_dotenv(".env")
+    mode = os.getenv("warmup", "off").strip().lower()
+    return mode if mode in WARMUP_MODES else "off"
+
+
+def _set_status(status: Dict[str, Any]) -> None:
+    global _status
+    with _status_lock:
+        _status = status
+
+
+def warmup_metrics() -> Dict[str, Any]:
+    """最近一次预热的状态与统计"""
+    with _status_lock:
+        return dict(_status)
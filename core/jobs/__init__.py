@@ -0,0 +1,11 @@
+from .job_manager import JobManager, get_job_backend, get_job_manager
+from .job_queue import JobQueue, JobQueueFull, get_job_queue
+
+__all__ = [
+    "JobManager",
+    "JobQueue",
+    "JobQueueFull",
+    "get_job_backend",
+    "get_job_manager",
+    "get_job_queue",
+]
@@ -0,0 +1,201 @@
+import atexit
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, FrozenSet, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+# 回调失败后的重试间隔（秒）
+CALLBACK_BACKOFF = (1, 2, 4)
+CALLBACK_TIMEOUT = 5.0
+DEFAULT_CALLBACK_WORKERS = 2
+DEFAULT_CALLBACK_SCHEMES = "http,https"
+
+
+class InvalidCallbackUrl(ValueError):
+    """回调地址的协议或主机不允许，或解析到内网、回环等地址"""
+
+
+class CallbackPolicy:
+    """
+    回调地址校验规则
+
+    协议须在 schemes 中；hosts 非空时主机须与其中一项相同或为其子域名（以 . 开头的项只匹配子域名）。
+    无论是否在白名单中，主机解析到的任一地址为内网、回环、链路本地、保留或组播地址时一律拒绝。
+    """
+
+    def __init__(self, schemes: FrozenSet[str], hosts: FrozenSet[str]):
+        self.schemes = schemes
+        self.hosts = hosts
+
+    def host_allowed(self, host: str) -> bool:
+        if not self.hosts:
+            return True
+        for allowed in self.hosts:
+            if allowed.startswith("."):
+                if host.endswith(allowed):
+                    return True
+            elif host == allowed or host.endswith("." + allowed):
+                return True
+        return False
+
+
+def _split_setting(value: str) -> FrozenSet[str]:
+    return frozenset(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+_policy: Optional[CallbackPolicy] = None
+
+
+def get_callback_policy() -> CallbackPolicy:
+    """回调地址校验规则，协议与主机白名单通过 job_callback_schemes、job_callback_hosts 配置（逗号分隔）"""
+    global _policy
+    if _policy is None:
+        load_dotenv(".env")
+        _policy = CallbackPolicy(
+            schemes=_split_setting(os.getenv("job_callback_schemes", DEFAULT_CALLBACK_SCHEMES)),
+            hosts=_split_setting(os.getenv("job_callback_hosts", "")),
+        )
+    return _policy
+
+
+def _resolve(host: str, port: int) -> List[str]:
+    return [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_callback_url(url: str) -> None:
+    """
+    校验回调地址，防止通过回调访问内网服务（SSRF）
+
+    提交任务时和每次发送前都会校验，发送前重新解析可以拦住提交后才改指向内网的域名。
+
+    Raises:
+        InvalidCallbackUrl: 地址不允许
+    """
+    policy = get_callback_policy()
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError as e:
+        raise InvalidCallbackUrl(f"回调地址无法解析: {e}") from e
+    host = (parts.hostname or "").rstrip(".").lower()
+    if parts.scheme not in policy.schemes:
+        raise InvalidCallbackUrl(f"回调地址的协议不允许: {parts.scheme or '无'}")
+    if not host:
+        raise InvalidCallbackUrl("回调地址缺少主机")
+    if not policy.host_allowed(host):
+        raise InvalidCallbackUrl(f"回调地址的主机不在白名单中: {host}")
+    try:
+        addresses = _resolve(host, port)
+    except (OSError, UnicodeError) as e:
+        raise InvalidCallbackUrl(f"回调地址的主机无法解析: {host}") from e
+    for address in addresses:
+        if not _is_public(address):
+            raise InvalidCallbackUrl(f"回调地址指向内网或保留地址: {host} ({address})")
+
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_callback_client() -> httpx.Client:
+    """
+    回调专用的 HTTP 客户端，与模型请求的连接池分开，不跟随重定向
+
+    超时通过 job_callback_timeout 配置，默认 5 秒。
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                load_dotenv(".env")
+                _client = httpx.Client(
+                    timeout=float(os.getenv("job_callback_timeout", CALLBACK_TIMEOUT)),
+                    limits=httpx.Limits(max_connections=10, max_keepalive_connections=2),
+                    follow_redirects=False,
+                )
+                atexit.register(_client.close)
+    return _client
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def post_callback(job: Dict[str, Any]) -> bool:
+    """将任务结果 POST 到回调地址，失败时按 CALLBACK_BACKOFF 重试，地址不允许或全部失败时返回 False"""
+    try:
+        validate_callback_url(job["callback_url"])
+    except InvalidCallbackUrl as e:
+        logger.warning(f"诊断任务 {job['id']} 的回调地址被拒绝: {e}")
+        _count("rejected")
+        return False
+
+    payload = {"message": "任务完成", "data": job, "code": 200}
+    for attempt, delay in enumerate((0, *CALLBACK_BACKOFF)):
+        if delay:
+            time.sleep(delay)
+        try:
+            response = get_callback_client().post(job["callback_url"], json=payload)
+            if response.status_code < 400:
+                _count("delivered")
+                return True
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+        logger.warning(f"诊断任务 {job['id']} 回调失败(第 {attempt + 1} 次): {error}")
+    _count("failed")
+    return False
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def send_callback(job: Dict[str, Any]) -> Future:
+    """
+    在回调专用的线程池中发送回调，立即返回，重试等待不占用执行诊断任务的线程
+
+    线程数通过 job_callback_workers 配置。
+
+    Returns:
+        Future: 结果为 post_callback 的返回值
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                load_dotenv(".env")
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("job_callback_workers", DEFAULT_CALLBACK_WORKERS)),
+                    thread_name_prefix="job-callback",
+                )
+                atexit.register(_executor.shutdown, wait=False)
+    return _executor.submit(post_callback, dict(job))
+
+
+def callback_metrics() -> Dict[str, int]:
+    """回调送达、全部重试后失败与地址被拒绝的次数"""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,209 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.circuit_breaker import get_circuit_breaker
+from core.ai_diagnosis.diagnosis import Diagnosis
+from core.ai_diagnosis.herb_diagnosis import HerbDiagnosis
+from core.ai_diagnosis.re_diagnosis import ReDiagnosis
+from core.jobs.callback import callback_metrics, send_callback
+from core.jobs.job_queue import (JobQueue, JobQueueFull, get_job_queue,
+                                 job_queue_enabled, job_queue_metrics)
+from core.scheduling.scheduler import run_prioritized
+from utils.store.history_store import record_engine_result
+from utils.store.ttl_store import TTLStore
+
+# 任务支持的引擎：名称到 (引擎类, 诊断方法名) 的映射
+JOB_ENGINES: Dict[str, Tuple[Callable[[], Any], str]] = {
+    "diagnosis": (Diagnosis, "diagnosis"),
+    "herb": (HerbDiagnosis, "diagnosis"),
+    "re_diagnosis": (ReDiagnosis, "dialog_diagnosis"),
+}
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_MAX_JOBS = 10_000
+DEFAULT_TTL = 3600
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobManager:
+    """
+    异步诊断任务：提交后立即返回任务 id，由线程池在后台执行引擎，结果保存在有界过期存储中
+
+    排队与运行中的任务数超过 max_pending 时拒绝提交；完成的任务超过 ttl 秒或
+    条目数超过 max_jobs 后淘汰。指定了回调地址时，任务结束后在回调线程池中将结果 POST 到该地址。
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+        ttl: float = DEFAULT_TTL,
+        engines: Optional[Dict[str, Tuple[Callable[[], Any], str]]] = None,
+    ):
+        self.max_pending = max_pending
+        self.engines = engines or JOB_ENGINES
+        self._jobs = TTLStore(maxsize=max_jobs, ttl=ttl)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnosis-job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.counts = {state: 0 for state in ("submitted", "succeeded", "failed", "callbacks_failed")}
+
+    def submit(
+        self,
+        engine: str,
+        description: str,
+        max_results: Optional[int] = None,
+        callback_url: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        提交诊断任务
+
+        Returns:
+            Dict[str, Any]: 任务状态
+
+        Raises:
+            KeyError: 不支持的引擎
+            JobQueueFull: 排队与运行中的任务数达到上限
+        """
+        if engine not in self.engines:
+            raise KeyError(engine)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"排队与运行中的任务数已达上限 {self.max_pending}")
+            self._pending += 1
+            self.counts["submitted"] += 1
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "engine": engine,
+            "status": "queued",
+            "description": description,
+            "max_results": max_results,
+            "callback_url": callback_url,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._jobs.set(job["id"], job)
+        try:
+            # 复制提交时的上下文，后台执行的模型用量仍计入提交任务的客户端
+            self._executor.submit(contextvars.copy_context().run, self._run, dict(job))
+        except RuntimeError:
+            # 线程池已关闭
+            with self._lock:
+                self._pending -= 1
+            raise JobQueueFull("任务服务正在关闭")
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def _update(self, job: Dict[str, Any], **changes: Any) -> None:
+        job.update(changes)
+        self._jobs.set(job["id"], dict(job))
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        self._update(job, status="running", started_at=_now())
+        start = time.perf_counter()
+        try:
+            factory, method = self.engines[job["engine"]]
+            engine = factory()
+            with get_circuit_breaker(job["engine"]).guard():
+                result = run_prioritized(
+                    job["description"], getattr(engine, method), job["description"], job["max_results"]
+                )
+            if not isinstance(result, list):
+                result = []
+            record_engine_result(engine, job["description"], result)
+            changes = {"status": "succeeded", "result": result}
+            logger.info(f"诊断任务 {job['id']}({job['engine']}) 完成，返回 {len(result)} 个诊断结果，"
+                        f"耗时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"诊断任务 {job['id']}({job['engine']}) 失败: {e}", exc_info=True)
+            changes = {"status": "failed", "error": str(e)}
+        # 先更新计数再公开结果，查询到任务结束时统计已包含该任务
+        with self._lock:
+            self._pending -= 1
+            self.counts[changes["status"]] += 1
+        self._update(job, finished_at=_now(), **changes)
+
+        if job["callback_url"]:
+            send_callback(job).add_done_callback(self._callback_done)
+
+    def _callback_done(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None or not future.result():
+            with self._lock:
+                self.counts["callbacks_failed"] += 1
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending, "stored": len(self._jobs),
+                    **self.counts}
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    获取进程级任务管理器
+
+    线程数、排队上限、保存条数与结果保留时间通过 job_workers、job_max_pending、
+    job_max_jobs、job_ttl 配置。
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                load_dotenv(".env")
+                _manager = JobManager(
+                    workers=int(os.getenv("job_workers", DEFAULT_WORKERS)),
+                    max_pending=int(os.getenv("job_max_pending", DEFAULT_MAX_PENDING)),
+                    max_jobs=int(os.getenv("job_max_jobs", DEFAULT_MAX_JOBS)),
+                    ttl=float(os.getenv("job_ttl", DEFAULT_TTL)),
+                )
+    return _manager
+
+
+def get_job_backend() -> Union[JobManager, JobQueue]:
+    """/jobs 接口使用的任务后端：job_backend=queue 时为持久化队列，否则为进程内线程池"""
+    return get_job_queue() if job_queue_enabled() else get_job_manager()
+
+
+def shutdown_job_manager() -> None:
+    if _manager is not None:
+        _manager.shutdown()
+
+
+def job_metrics() -> Dict[str, Any]:
+    """任务排队数、已保存条数与完成、失败、回调失败次数，启用持久化队列时包含各状态的任务数，发送过回调时包含回调统计"""
+    metrics = _manager.stats() if _manager is not None else {}
+    queue = job_queue_metrics()
+    if queue:
+        metrics["queue"] = queue
+    callbacks = callback_metrics()
+    if callbacks:
+        metrics["callbacks"] = callbacks
+    return metrics
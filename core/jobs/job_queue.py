@@ -0,0 +1,319 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+DEFAULT_PATH = "data/diagnosis_jobs.db"
+# ReAct 诊断可能持续一分钟以上，租约需覆盖一次完整调用，worker 运行期间会定期续约
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_MAX_PENDING = 10_000
+DEFAULT_TTL = 24 * 3600
+# 失败重试的退避时间：RETRY_BACKOFF * 2^(已尝试次数-1)，不超过 MAX_RETRY_BACKOFF
+RETRY_BACKOFF = 5
+MAX_RETRY_BACKOFF = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnosis_jobs (
+    id TEXT PRIMARY KEY,
+    engine TEXT NOT NULL,
+    description TEXT NOT NULL,
+    max_results INTEGER,
+    callback_url TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_jobs_status_available ON diagnosis_jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_jobs_status_lease ON diagnosis_jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_jobs_finished ON diagnosis_jobs (finished);
+"""
+
+JOB_QUEUE_COLUMNS = (
+    "id", "engine", "description", "max_results", "callback_url", "status", "attempts", "max_attempts",
+    "created", "started", "finished", "result", "error",
+)
+
+
+class JobQueueFull(Exception):
+    """排队与运行中的任务数达到上限"""
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds") if timestamp else None
+
+
+class JobQueue:
+    """
+    基于 SQLite（WAL 模式）的持久化诊断任务队列，API 进程写入任务，worker 进程领取执行
+
+    队列文件须位于本机磁盘，API 与 worker 进程部署在同一台主机上，WAL 不支持 NFS、SMB 等网络文件系统。
+
+    worker 领取任务时获得带过期时间的租约，执行期间定期续约；worker 崩溃或失联时租约过期，
+    任务在可见性超时后重新被领取。失败的任务按指数退避重试，超过 max_attempts 次后标记为失败。
+    完成与失败都校验租约持有者，租约已被其他 worker 接管时丢弃过期的结果。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        busy_timeout: float = 5,
+    ):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._open()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid != os.getpid():
+            # fork 继承的连接不能在子进程中使用，也不能关闭（会破坏父进程的 WAL 状态），只保留引用
+            _inherited_connections.append(conn)
+            conn = None
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self) -> None:
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def submit(
+        self,
+        engine: str,
+        description: str,
+        max_results: Optional[int] = None,
+        callback_url: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        写入诊断任务，由 worker 进程异步执行
+
+        Raises:
+            JobQueueFull: 排队与运行中的任务数达到上限
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM diagnosis_jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"排队与运行中的任务数已达上限 {self.max_pending}")
+            conn.execute(
+                "INSERT INTO diagnosis_jobs (id, engine, description, max_results, callback_url, status, "
+                "max_attempts, available_at, created) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, engine, description, max_results, callback_url, self.max_attempts, now, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        领取一个可执行的任务：到达重试时间的排队任务，或租约已过期的运行中任务
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务，没有可领取的任务时返回 None
+        """
+        now = time.time()
+        conn = self._connect()
+        # BEGIN IMMEDIATE 取得写锁，多个 worker 不会领取到同一个任务
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期且已用完重试次数的任务不再领取
+            conn.execute(
+                "UPDATE diagnosis_jobs SET status = 'failed', finished = ?, lease_owner = NULL, "
+                "error = COALESCE(error, '任务执行超时') "
+                "WHERE status = 'running' AND lease_expires <= ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = conn.execute(
+                "SELECT id FROM diagnosis_jobs "
+                "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires <= ?) "
+                "ORDER BY available_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE diagnosis_jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, started = ? WHERE id = ?",
+                (worker_id, now + self.visibility_timeout, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """延长租约，租约已被其他 worker 接管时返回 False"""
+        return self._connect().execute(
+            "UPDATE diagnosis_jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (time.time() + self.visibility_timeout, job_id, worker_id),
+        ).rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: List[Dict[str, Any]]) -> bool:
+        """写回诊断结果，租约已失效时返回 False 且不修改任务"""
+        return self._connect().execute(
+            "UPDATE diagnosis_jobs SET status = 'succeeded', result = ?, error = NULL, finished = ?, "
+            "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker_id),
+        ).rowcount == 1
+
+    def release(self, job_id: str, worker_id: str, delay: float = 0) -> bool:
+        """放弃本次领取，任务在 delay 秒后重新排队，不计入尝试次数"""
+        return self._connect().execute(
+            "UPDATE diagnosis_jobs SET status = 'queued', attempts = attempts - 1, available_at = ?, "
+            "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (time.time() + delay, job_id, worker_id),
+        ).rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        """
+        记录一次执行失败，未用完重试次数时退避后重新排队
+
+        Returns:
+            Optional[str]: 任务的新状态 queued / failed，租约已失效时返回 None
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM diagnosis_jobs WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (job_id, worker_id),
+        ).fetchone()
+        if row is None:
+            return None
+        attempts, max_attempts = row
+        now = time.time()
+        if attempts < max_attempts:
+            delay = min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+            updated = conn.execute(
+                "UPDATE diagnosis_jobs SET status = 'queued', available_at = ?, error = ?, "
+                "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (now + delay, error, job_id, worker_id),
+            ).rowcount
+            return "queued" if updated else None
+        updated = conn.execute(
+            "UPDATE diagnosis_jobs SET status = 'failed', error = ?, finished = ?, "
+            "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (error, now, job_id, worker_id),
+        ).rowcount
+        return "failed" if updated else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            f"SELECT {', '.join(JOB_QUEUE_COLUMNS)} FROM diagnosis_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self.to_dict(row) if row is not None else None
+
+    @staticmethod
+    def to_dict(row: tuple) -> Dict[str, Any]:
+        """原始记录转为与进程内任务一致的结构"""
+        job = dict(zip(JOB_QUEUE_COLUMNS, row))
+        job["created_at"] = _iso(job.pop("created"))
+        job["started_at"] = _iso(job.pop("started"))
+        job["finished_at"] = _iso(job.pop("finished"))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge(self, older_than: float = DEFAULT_TTL) -> int:
+        """删除结束超过 older_than 秒的任务"""
+        return self._connect().execute(
+            "DELETE FROM diagnosis_jobs WHERE finished IS NOT NULL AND finished < ?", (time.time() - older_than,)
+        ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM diagnosis_jobs GROUP BY status").fetchall()
+        return {
+            "path": self.path,
+            "max_pending": self.max_pending,
+            **{status: 0 for status in ("queued", "running", "succeeded", "failed")},
+            **dict(rows),
+        }
+
+
+_inherited_connections: List[sqlite3.Connection] = []
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+_enabled: Optional[bool] = None
+
+
+def job_queue_enabled() -> bool:
+    """job_backend=queue 时 /jobs 接口写入持久化队列，由独立的 worker 进程执行"""
+    global _enabled
+    if _enabled is None:
+        load_dotenv(".env")
+        _enabled = os.getenv("job_backend", "local").strip().lower() == "queue"
+    return _enabled
+
+
+def get_job_queue() -> JobQueue:
+    """
+    获取进程级持久化任务队列
+
+    文件路径、可见性超时、最大尝试次数与排队上限通过 job_queue_path、job_visibility_timeout、
+    job_max_attempts、job_queue_max_pending 配置。
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                load_dotenv(".env")
+                _queue = JobQueue(
+                    path=os.getenv("job_queue_path", DEFAULT_PATH),
+                    visibility_timeout=float(os.getenv("job_visibility_timeout", DEFAULT_VISIBILITY_TIMEOUT)),
+                    max_attempts=int(os.getenv("job_max_attempts", DEFAULT_MAX_ATTEMPTS)),
+                    max_pending=int(os.getenv("job_queue_max_pending", DEFAULT_MAX_PENDING)),
+                )
+                logger.info(f"诊断任务队列: {_queue.path}")
+    return _queue
+
+
+def job_queue_metrics() -> Dict[str, Any]:
+    """持久化队列中各状态的任务数"""
+    return _queue.stats() if _queue is not None else {}
@@ -0,0 +1,190 @@
+"""
+诊断任务 worker：从持久化队列领取任务，执行引擎并写回结果
+
+API 节点设置 job_backend=queue 后只负责写入任务，worker 以独立进程运行，数量按模型
+调用的负载独立伸缩。队列是 WAL 模式的 SQLite 文件，WAL 依赖同一台机器上的共享内存，
+因此 worker 必须与 API 进程部署在同一台主机并访问本地磁盘上的队列文件，不支持通过
+NFS、SMB 等网络文件系统跨主机共享。
+
+命令行用法：
+    python -m core.jobs.worker --concurrency 4
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from core.jobs.callback import send_callback
+from core.jobs.job_manager import JOB_ENGINES
+from core.jobs.job_queue import DEFAULT_TTL, JobQueue, get_job_queue
+from core.scheduling.scheduler import run_prioritized
+from utils.store.history_store import record_engine_result, shutdown_history_store
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_POLL_INTERVAL = 1.0
+# 清理已结束任务的间隔（秒）
+PURGE_INTERVAL = 600
+
+
+class Worker:
+    """
+    持续领取并执行队列中的诊断任务
+
+    最多同时执行 concurrency 个任务；执行期间由心跳线程按可见性超时的三分之一续约，
+    停止时不再领取新任务，等待执行中的任务完成。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        engines: Optional[Dict[str, Tuple[Callable[[], Any], str]]] = None,
+        worker_id: Optional[str] = None,
+    ):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.engines = engines or JOB_ENGINES
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+        self._finished = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        self._active: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.counts = {"succeeded": 0, "retried": 0, "deferred": 0, "failed": 0, "lost": 0}
+
+    def run(self) -> None:
+        """领取任务直到 stop() 被调用"""
+        logger.info(f"诊断任务 worker {self.worker_id} 启动，并发 {self.concurrency}")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        last_purge = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job-worker") as executor:
+            while not self.stop_event.is_set():
+                if time.time() - last_purge > PURGE_INTERVAL:
+                    self._purge()
+                    last_purge = time.time()
+                if not self._slots.acquire(timeout=self.poll_interval):
+                    continue
+                try:
+                    job = self.queue.claim(self.worker_id)
+                except Exception as e:
+                    logger.error(f"领取诊断任务失败: {e}")
+                    job = None
+                if job is None:
+                    self._slots.release()
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self._active[job["id"]] = time.time()
+                executor.submit(self._process, job)
+        self._finished.set()
+        logger.info(f"诊断任务 worker {self.worker_id} 已停止")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        try:
+            factory, method = self.engines[job["engine"]]
+            engine = factory()
+            with get_circuit_breaker(job["engine"]).guard():
+                result = run_prioritized(
+                    job["description"], getattr(engine, method), job["description"], job["max_results"]
+                )
+            if not isinstance(result, list):
+                result = []
+        except CircuitOpenError as e:
+            # 上游熔断期间不消耗重试次数，熔断结束后重新领取
+            logger.warning(f"诊断任务 {job['id']} 暂缓执行: {e}")
+            self.queue.release(job["id"], self.worker_id, e.retry_after)
+            self._count("deferred")
+            return
+        except Exception as e:
+            logger.error(f"诊断任务 {job['id']}({job['engine']}) 第 {job['attempts']} 次执行失败: {e}", exc_info=True)
+            state = self.queue.fail(job["id"], self.worker_id, str(e))
+            self._count({"queued": "retried", "failed": "failed"}.get(state, "lost"))
+            if state == "failed":
+                self._callback(job["id"])
+            return
+        finally:
+            with self._lock:
+                self._active.pop(job["id"], None)
+            self._slots.release()
+
+        if not self.queue.complete(job["id"], self.worker_id, result):
+            # 执行时间超过了租约，任务已被其他 worker 接管
+            logger.warning(f"诊断任务 {job['id']} 的租约已失效，丢弃本次结果")
+            self._count("lost")
+            return
+        record_engine_result(engine, job["description"], result)
+        self._count("succeeded")
+        logger.info(f"诊断任务 {job['id']}({job['engine']}) 完成，返回 {len(result)} 个诊断结果，"
+                    f"耗时 {time.perf_counter() - start:.1f}s")
+        self._callback(job["id"])
+
+    def _callback(self, job_id: str) -> None:
+        job = self.queue.get(job_id)
+        if job is not None and job["callback_url"]:
+            send_callback(job)
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(self.queue.visibility_timeout / 3, 0.1)
+        # 停止后仍为执行中的任务续约，直到全部完成
+        while not self._finished.wait(interval):
+            with self._lock:
+                job_ids = list(self._active)
+            for job_id in job_ids:
+                try:
+                    if not self.queue.heartbeat(job_id, self.worker_id):
+                        logger.warning(f"诊断任务 {job_id} 续约失败，租约已被接管")
+                except Exception as e:
+                    logger.warning(f"诊断任务 {job_id} 续约失败: {e}")
+
+    def _purge(self) -> None:
+        try:
+            removed = self.queue.purge(float(os.getenv("job_ttl", DEFAULT_TTL)))
+        except Exception as e:
+            logger.warning(f"清理已结束的诊断任务失败: {e}")
+            return
+        if removed:
+            logger.info(f"清理已结束的诊断任务 {removed} 条")
+
+
+def main(argv: Optional[list] = None) -> int:
+    load_dotenv(".env")
+    parser = argparse.ArgumentParser(description="诊断任务 worker")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.getenv("job_worker_concurrency", DEFAULT_CONCURRENCY)))
+    parser.add_argument("--poll-interval", type=float,
+                        default=float(os.getenv("job_poll_interval", DEFAULT_POLL_INTERVAL)))
+    parser.add_argument("--db", help="队列数据库路径，默认使用 job_queue_path 配置")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["job_queue_path"] = args.db
+    worker = Worker(get_job_queue(), concurrency=args.concurrency, poll_interval=args.poll_interval)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+    shutdown_history_store()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
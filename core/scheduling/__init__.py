@@ -0,0 +1,11 @@
+from .scheduler import PriorityLimiter, get_engine_limiter, run_prioritized
+from .triage import AhoCorasick, UrgencyTriage, classify_urgency
+
+__all__ = [
+    "AhoCorasick",
+    "PriorityLimiter",
+    "UrgencyTriage",
+    "classify_urgency",
+    "get_engine_limiter",
+    "run_prioritized",
+]
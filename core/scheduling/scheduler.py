@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from core.ai_diagnosis.cancellation import (CancelToken, RequestCancelled,
+                                            check_cancelled,
+                                            count_cancellation,
+                                            current_cancel_token)
+from core.ai_diagnosis.deadline import DeadlineExceeded, call_timeout
+from core.scheduling.triage import PRIORITY_NAMES, PRIORITY_ROUTINE, classify_urgency
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONCURRENCY = 8
+# 排队每满该秒数，等待中的请求优先级提升一级，避免急症持续到来时普通请求一直排不上
+DEFAULT_AGING_SECONDS = 30
+# 带取消标记排队时检查取消的间隔（秒）
+CANCEL_CHECK_INTERVAL = 0.05
+
+
+class PriorityLimiter:
+    """
+    按优先级放行的并发限制器，位于引擎调用之前
+
+    并发已满时请求按 (优先级 × aging_seconds + 入队时间) 排序等待：急症排在队首，
+    普通请求每等待 aging_seconds 秒相当于提升一级，等待足够久后排在新到的急症之前。
+    所有等待者按同样速度老化，因此排序键在入队时即可确定，用堆维护。
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 aging_seconds: float = DEFAULT_AGING_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.aging_seconds = aging_seconds
+        self._cond = threading.Condition()
+        self._waiting: List[list] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.timeouts = 0
+        self.cancelled = 0
+        self._wait_total = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self._wait_max = {name: 0.0 for name in PRIORITY_NAMES.values()}
+
+    def acquire(
+        self,
+        priority: int = PRIORITY_ROUTINE,
+        timeout: Optional[float] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> float:
+        """
+        等待一个执行名额
+
+        Args:
+            priority: 优先级，数值越小越优先
+            timeout: 最长等待秒数，为空时一直等待
+            cancel_token: 请求的取消标记，排队期间每隔 CANCEL_CHECK_INTERVAL 秒检查一次
+
+        Returns:
+            float: 排队等待的秒数
+
+        Raises:
+            TimeoutError: 超过 timeout 仍未获得名额
+            RequestCancelled: 排队期间请求被取消，已退出队列
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                self._record(priority, 0.0)
+                return 0.0
+
+            entry = [priority * self.aging_seconds + start, next(self._seq)]
+            heapq.heappush(self._waiting, entry)
+            while self._active >= self.max_concurrency or self._waiting[0] is not entry:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._leave(entry)
+                    self.cancelled += 1
+                    cancel_token.check()
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    self._leave(entry)
+                    self.timeouts += 1
+                    raise TimeoutError(f"等待执行名额超过 {timeout:.1f}s")
+                if cancel_token is not None:
+                    remaining = CANCEL_CHECK_INTERVAL if remaining is None else min(remaining, CANCEL_CHECK_INTERVAL)
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self._active += 1
+            waited = time.monotonic() - start
+            self._record(priority, waited)
+            # 仍有空闲名额时让下一个等待者继续
+            self._cond.notify_all()
+            return waited
+
+    def _leave(self, entry: list) -> None:
+        """未获得名额即退出队列"""
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        # 队首可能变化，唤醒其他等待者
+        self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_ROUTINE, timeout: Optional[float] = None) -> Iterator[float]:
+        waited = self.acquire(priority, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def _record(self, priority: int, waited: float) -> None:
+        name = PRIORITY_NAMES.get(priority, PRIORITY_NAMES[PRIORITY_ROUTINE])
+        self.admitted[name] += 1
+        self._wait_total[name] += waited
+        self._wait_max[name] = max(self._wait_max[name], waited)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "aging_seconds": self.aging_seconds,
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "admitted": dict(self.admitted),
+                "avg_wait_ms": {
+                    name: round(self._wait_total[name] / count * 1000, 1) if count else 0.0
+                    for name, count in self.admitted.items()
+                },
+                "max_wait_ms": {name: round(value * 1000, 1) for name, value in self._wait_max.items()},
+            }
+
+
+_limiter: Optional[PriorityLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_engine_limiter() -> PriorityLimiter:
+    """
+    获取进程级引擎并发限制器，所有引擎共享
+
+    并发上限与老化时间通过 engine_max_concurrency、scheduler_aging_seconds 配置，
+    engine_max_concurrency=0 时不限制并发，也不排队。
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                load_dotenv(".env")
+                max_concurrency = int(os.getenv("engine_max_concurrency", DEFAULT_MAX_CONCURRENCY))
+                _limiter = PriorityLimiter(
+                    max_concurrency=max_concurrency if max_concurrency > 0 else 2 ** 31,
+                    aging_seconds=float(os.getenv("scheduler_aging_seconds", DEFAULT_AGING_SECONDS)),
+                )
+    return _limiter
+
+
+def run_prioritized(description: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    按症状描述分诊后，在引擎并发限制器下执行 func
+
+    Args:
+        description: 症状描述，用于急症分级
+        func: 引擎诊断方法
+
+    Raises:
+        DeadlineExceeded: 排队至请求截止时间仍未获得执行名额
+        RequestCancelled: 排队期间或获得名额时请求已被取消
+    """
+    priority, matched = classify_urgency(description)
+    if matched:
+        logger.info(f"急症分诊: {PRIORITY_NAMES[priority]}，命中 {matched}")
+    limiter = get_engine_limiter()
+    timeout = call_timeout()
+    try:
+        waited = limiter.acquire(priority, timeout, current_cancel_token())
+    except TimeoutError as e:
+        raise DeadlineExceeded(f"排队至请求截止时间仍未获得执行名额: {e}") from e
+    except RequestCancelled:
+        count_cancellation("queued_requests_cancelled")
+        raise
+    try:
+        if waited > 1:
+            logger.info(f"诊断请求排队 {waited:.1f}s（{PRIORITY_NAMES[priority]}）")
+        # 获得名额的同时请求可能已被取消，此时直接归还名额
+        check_cancelled()
+        return func(*args, **kwargs)
+    finally:
+        limiter.release()
+
+
+def scheduling_metrics() -> Dict[str, Any]:
+    """引擎并发限制器的执行中、排队数及各优先级的放行次数与等待时间"""
+    return _limiter.stats() if _limiter is not None else {}
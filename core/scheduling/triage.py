@@ -0,0 +1,172 @@
+import json
+import os
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from utils.cache.semantic_cache import normalize_description
+
+# 优先级，数值越小越优先
+PRIORITY_EMERGENCY = 0
+PRIORITY_URGENT = 1
+PRIORITY_ROUTINE = 2
+PRIORITY_NAMES = {
+    PRIORITY_EMERGENCY: "emergency",
+    PRIORITY_URGENT: "urgent",
+    PRIORITY_ROUTINE: "routine",
+}
+
+# 默认急症词表：关键词到优先级，可通过 triage_lexicon 指定 JSON 文件替换
+DEFAULT_URGENT_LEXICON: Dict[str, int] = {
+    "抽搐": PRIORITY_EMERGENCY,
+    "癫痫": PRIORITY_EMERGENCY,
+    "便血": PRIORITY_EMERGENCY,
+    "吐血": PRIORITY_EMERGENCY,
+    "呕血": PRIORITY_EMERGENCY,
+    "大出血": PRIORITY_EMERGENCY,
+    "呼吸困难": PRIORITY_EMERGENCY,
+    "张口呼吸": PRIORITY_EMERGENCY,
+    "高热不退": PRIORITY_EMERGENCY,
+    "休克": PRIORITY_EMERGENCY,
+    "昏迷": PRIORITY_EMERGENCY,
+    "意识不清": PRIORITY_EMERGENCY,
+    "中毒": PRIORITY_EMERGENCY,
+    "误食": PRIORITY_EMERGENCY,
+    "难产": PRIORITY_EMERGENCY,
+    "车祸": PRIORITY_EMERGENCY,
+    "瘫痪": PRIORITY_EMERGENCY,
+    "无法排尿": PRIORITY_EMERGENCY,
+    "尿闭": PRIORITY_EMERGENCY,
+    "腹部膨胀": PRIORITY_EMERGENCY,
+    "黏膜苍白": PRIORITY_EMERGENCY,
+    "牙龈发白": PRIORITY_EMERGENCY,
+    "血尿": PRIORITY_URGENT,
+    "持续呕吐": PRIORITY_URGENT,
+    "频繁呕吐": PRIORITY_URGENT,
+    "高热": PRIORITY_URGENT,
+    "不吃不喝": PRIORITY_URGENT,
+    "精神萎靡": PRIORITY_URGENT,
+    "脱水": PRIORITY_URGENT,
+    "黄疸": PRIORITY_URGENT,
+    "跛行": PRIORITY_URGENT,
+}
+
+# 关键词前出现否定词（如“无抽搐”“未见便血”）时不计入
+NEGATION_PREFIXES = ("无", "未", "没有", "未见", "否认", "不伴")
+_NEGATION_WINDOW = max(len(prefix) for prefix in NEGATION_PREFIXES)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机，一次扫描文本找出所有关键词，耗时与词表大小无关
+
+    状态转移使用每个节点一个字典，失败指针在构建时按广度优先计算，
+    每个节点的输出包含其失败链上所有节点的关键词。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for keyword in keywords:
+            if keyword:
+                self._add(keyword)
+        self._build()
+
+    def _add(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(keyword)
+
+    def _build(self) -> None:
+        # 第一层节点的失败指针指向根节点，从第二层开始计算
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """依次产出 (关键词在文本中的起始位置, 关键词)"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                yield index - len(keyword) + 1, keyword
+
+
+class UrgencyTriage:
+    """按急症词表对症状描述分级，命中多个关键词时取最高优先级"""
+
+    def __init__(self, lexicon: Optional[Dict[str, int]] = None):
+        lexicon = DEFAULT_URGENT_LEXICON if lexicon is None else lexicon
+        # 与描述使用相同的规范化，全角、大小写与标点不影响匹配
+        self.lexicon = {normalize_description(keyword): int(level) for keyword, level in lexicon.items()
+                        if normalize_description(keyword)}
+        self.automaton = AhoCorasick(self.lexicon)
+
+    def classify(self, description: str) -> Tuple[int, List[str]]:
+        """
+        对症状描述分级
+
+        Returns:
+            Tuple[int, List[str]]: (优先级, 命中的关键词)，未命中时为 PRIORITY_ROUTINE
+        """
+        text = normalize_description(description)
+        priority = PRIORITY_ROUTINE
+        matched: List[str] = []
+        for start, keyword in self.automaton.iter_matches(text):
+            if text[max(0, start - _NEGATION_WINDOW):start].endswith(NEGATION_PREFIXES):
+                continue
+            matched.append(keyword)
+            priority = min(priority, self.lexicon[keyword])
+        return priority, matched
+
+
+_triage: Optional[UrgencyTriage] = None
+
+
+def load_lexicon(path: str) -> Dict[str, int]:
+    """读取 JSON 词表：{"关键词": 优先级}，优先级可以是 0/1/2 或 emergency/urgent/routine"""
+    levels = {name: level for level, name in PRIORITY_NAMES.items()}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return {keyword: levels[level] if isinstance(level, str) else int(level) for keyword, level in raw.items()}
+
+
+def get_triage() -> UrgencyTriage:
+    """获取进程级分诊器，词表文件通过环境变量 triage_lexicon 配置，未配置时使用默认词表"""
+    global _triage
+    if _triage is None:
+        load_dotenv(".env")
+        path = os.getenv("triage_lexicon")
+        lexicon = None
+        if path:
+            try:
+                lexicon = load_lexicon(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"急症词表 {path} 读取失败，使用默认词表: {e}")
+        _triage = UrgencyTriage(lexicon)
+    return _triage
+
+
+def classify_urgency(description: str) -> Tuple[int, List[str]]:
+    return get_triage().classify(description)
@@ -0,0 +1,121 @@
+"""
+对比 Markdown 表格、JSON 与紧凑分隔格式的输出 token 数和解析耗时
+
+运行方式：python test/bench_output_format.py
+安装了 tiktoken 时按 cl100k_base 编码统计 token，否则以字符数近似。
+"""
+import json
+import sys
+import timeit
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.logger import logger
+from core.ai_diagnosis.diagnosis import (DIAGNOSIS_COLUMNS, extract_table_only,
+                                         format_json_diagnosis,
+                                         parse_diagnosis_table,
+                                         parse_probability)
+from utils.parser.compact import (TAB, UNIT_SEPARATOR, parse_compact_rows,
+                                  render_compact_header)
+
+SAMPLE_ROWS = [
+    ["犬瘟热", "发热、眼鼻脓性分泌物、咳嗽伴腹泻，符合犬瘟热典型表现", "0.72",
+     "隔离饲养，保持环境温暖干燥", "每日监测体温和精神状态", "出现抽搐等神经症状时立即就医",
+     "犬瘟热单克隆抗体", "每千克体重1ml，皮下注射，每日1次，连用3天",
+     "头孢曲松钠", "每千克体重25mg，静脉滴注，每日1次",
+     "地塞米松", "每千克体重0.2mg，肌内注射，仅在出现神经症状时使用"],
+    ["犬细小病毒病", "呕吐、血便、精神沉郁，需与犬瘟热鉴别", "0.15",
+     "禁食禁水24小时，补液", "观察呕吐和便血频率", "脱水严重时立即就医",
+     "犬细小病毒单克隆抗体", "每千克体重1ml，皮下注射，每日1次",
+     "胃复安", "每千克体重0.3mg，皮下注射，每日2次",
+     "乳酸林格液", "每千克体重40ml，静脉滴注，按脱水程度调整"],
+    ["犬传染性支气管炎", "阵发性干咳，运动后加重，体温轻度升高", "0.08",
+     "避免剧烈运动，保持空气流通", "观察咳嗽频率和呼吸状况", "出现呼吸困难时立即就医",
+     "多西环素", "每千克体重5mg，口服，每日2次，连用7天",
+     "氨茶碱", "每千克体重10mg，口服，每日2次",
+     "布地奈德雾化液", "0.5mg加生理盐水雾化，每日2次"],
+    ["细菌性肺炎", "咳嗽、呼吸音粗糙、发热，可能继发于病毒感染", "0.03",
+     "保持环境温暖，补充营养", "监测呼吸频率与体温", "呼吸急促或发绀时立即就医",
+     "阿莫西林克拉维酸钾", "每千克体重12.5mg，口服，每日2次",
+     "恩诺沙星", "每千克体重5mg，皮下注射，每日1次",
+     "氧气治疗", "根据血氧情况持续吸氧"],
+    ["肠道寄生虫感染", "腹泻、消瘦、被毛粗乱，粪便可见虫体", "0.02",
+     "注意饮食卫生，定期清理粪便", "观察粪便性状和体重变化", "腹泻持续3天以上时就医",
+     "吡喹酮", "每千克体重5mg，口服，单次给药",
+     "芬苯达唑", "每千克体重50mg，口服，每日1次，连用3天",
+     "蒙脱石散", "每千克体重0.5g，口服，每日3次"],
+]
+
+
+def render_table(rows):
+    """按当前提示词中的表格格式渲染，包括分隔线"""
+    header = "| " + " | ".join(DIAGNOSIS_COLUMNS) + " |"
+    separator = "|" + "|".join("-" * (len(column) + 2) for column in DIAGNOSIS_COLUMNS) + "|"
+    lines = [header, separator] + ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def render_json(rows):
+    """按结构化输出模式的 JSON 格式渲染"""
+    items = [dict(zip(DIAGNOSIS_COLUMNS, row)) for row in rows]
+    for item in items:
+        item["p"] = float(item["p"])
+    return json.dumps({"diagnoses": items}, ensure_ascii=False)
+
+
+def render_compact(rows, delimiter):
+    lines = [render_compact_header(DIAGNOSIS_COLUMNS, delimiter)]
+    lines += [delimiter.join(row) for row in rows]
+    return "\n".join(lines)
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "cl100k_base tokens", lambda text: len(encoding.encode(text))
+    except Exception as e:
+        print(f"tiktoken 不可用（{type(e).__name__}），以字符数近似")
+        return "chars", len
+
+
+def main(number: int = 2000) -> None:
+    # 解析路径中 format_json_diagnosis 的逐行日志不计入耗时
+    logger.remove()
+    unit, count_tokens = token_counter()
+
+    table_text = render_table(SAMPLE_ROWS)
+    json_text = render_json(SAMPLE_ROWS)
+    tab_text = render_compact(SAMPLE_ROWS, TAB)
+    unit_text = render_compact(SAMPLE_ROWS, UNIT_SEPARATOR)
+    converters = {"p": parse_probability}
+
+    expected = format_json_diagnosis(parse_diagnosis_table(extract_table_only(table_text)))
+    assert parse_compact_rows(tab_text, DIAGNOSIS_COLUMNS, TAB, converters) == expected
+    assert parse_compact_rows(unit_text, DIAGNOSIS_COLUMNS, UNIT_SEPARATOR, converters) == expected
+
+    cases = [
+        ("markdown table", table_text,
+         lambda: format_json_diagnosis(parse_diagnosis_table(extract_table_only(table_text)))),
+        ("json", json_text,
+         lambda: format_json_diagnosis(json.loads(json_text)["diagnoses"])),
+        ("compact (tab)", tab_text,
+         lambda: parse_compact_rows(tab_text, DIAGNOSIS_COLUMNS, TAB, converters)),
+        ("compact (\\x1f)", unit_text,
+         lambda: parse_compact_rows(unit_text, DIAGNOSIS_COLUMNS, UNIT_SEPARATOR, converters)),
+    ]
+
+    baseline_tokens = count_tokens(table_text)
+    print(f"{len(SAMPLE_ROWS)} 行诊断，解析 {number} 次取最优")
+    print(f"{'format':<16}{unit:>20}{'vs table':>10}{'parse (us)':>12}")
+    for name, text, parse in cases:
+        tokens = count_tokens(text)
+        best = min(timeit.repeat(parse, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<16}{tokens:>20}{tokens / baseline_tokens:>10.0%}{best:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+对比诊断响应的序列化耗时：标准库 json、orjson、pydantic 响应模型
+
+运行方式：python test/bench_response_serialization.py
+负载为 5 条中医诊断、每条 13 列，方剂用法等字段为较长的中文文本。
+"""
+import sys
+import timeit
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from backend.element.ele_response import HerbDiagnosisResponse
+from backend.response import FastJSONResponse
+from core.ai_diagnosis.herb_diagnosis import HERB_COLUMNS
+
+USAGE = "每日1剂，水煎取汁200ml，分早晚两次温服，连用5至7天；服药期间忌食生冷油腻，观察大便性状与精神食欲变化，"
+
+
+def build_payload(rows: int = 5) -> dict:
+    items = []
+    for index in range(rows):
+        item = {column: f"{column}示例内容，湿热蕴结，脾失健运，第{index}条" for column in HERB_COLUMNS}
+        item["p"] = round(0.6 / (index + 1), 3)
+        for column in HERB_COLUMNS:
+            if column.endswith("_usage"):
+                item[column] = USAGE * 4
+        items.append(item)
+    return {"message": "诊断成功", "data": items, "code": 200}
+
+
+def main(number: int = 5000) -> None:
+    payload = build_payload()
+    adapter = TypeAdapter(HerbDiagnosisResponse)
+
+    def response_model_path(response_class):
+        # 与 FastAPI 处理 response_model 的步骤一致：校验、转为 JSON 兼容对象、由响应类渲染
+        model = adapter.validate_python(payload)
+        content = adapter.dump_python(model, mode="json", by_alias=True, exclude_unset=True)
+        return response_class(content).body
+
+    expected = JSONResponse(payload).body
+    assert FastJSONResponse(payload).body == expected
+    assert response_model_path(FastJSONResponse) == expected
+
+    cases = [
+        ("JSONResponse (json)", lambda: JSONResponse(payload).body),
+        ("FastJSONResponse (orjson)", lambda: FastJSONResponse(payload).body),
+        ("response_model + json", lambda: response_model_path(JSONResponse)),
+        ("response_model + orjson", lambda: response_model_path(FastJSONResponse)),
+    ]
+    print(f"响应体 {len(expected)} 字节，每种方式执行 {number} 次取最优")
+    print(f"{'method':<28}{'us/response':>14}")
+    for name, render in cases:
+        best = min(timeit.repeat(render, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<28}{best:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
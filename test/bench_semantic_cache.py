@@ -0,0 +1,55 @@
+"""
+近似缓存在不同条目数下的写入与检索耗时
+
+运行方式：python test/bench_semantic_cache.py [条目数]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.cache.semantic_cache import SemanticCache
+
+SPECIES = ["犬", "猫", "兔", "仓鼠", "鹦鹉"]
+SYMPTOMS = [
+    "咳嗽", "流鼻涕", "发烧", "呕吐", "腹泻", "便血", "食欲不振", "精神沉郁", "打喷嚏", "流眼泪",
+    "皮肤瘙痒", "掉毛", "跛行", "尿频", "尿血", "口臭", "流口水", "眼睛红肿", "耳朵异味", "消瘦",
+]
+DURATIONS = ["一天", "两天", "三天", "一周", "半个月"]
+
+
+def random_description(rng: random.Random) -> str:
+    symptoms = rng.sample(SYMPTOMS, rng.randint(2, 5))
+    return f"{rng.choice(SPECIES)}{rng.choice(DURATIONS)}来{'，'.join(symptoms)}"
+
+
+def main(entries: int = 100_000, queries: int = 500) -> None:
+    rng = random.Random(0)
+    cache = SemanticCache(max_entries=entries)
+
+    start = time.perf_counter()
+    for index in range(entries):
+        cache.add(f"{random_description(rng)}，病例{index}", index)
+    elapsed = time.perf_counter() - start
+    print(f"写入 {entries} 条：{elapsed:.2f}s（{elapsed / entries * 1e6:.1f} us/条）")
+
+    samples = [random_description(rng) for _ in range(queries)]
+    latencies = []
+    for desc in samples:
+        start = time.perf_counter()
+        cache.search(desc)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(
+        f"检索 {queries} 次：p50 {latencies[len(latencies) // 2] * 1e3:.2f}ms，"
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f}ms，"
+        f"矩阵 {cache._tf[:len(cache)].nbytes / 1024 / 1024:.1f}MB"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,60 @@
+"""
+急症分诊在不同词表大小下的耗时，与逐个关键词查找对比
+
+运行方式：python test/bench_triage.py [词表大小]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.scheduling.triage import DEFAULT_URGENT_LEXICON, UrgencyTriage
+from utils.cache.semantic_cache import normalize_description
+
+SYMPTOMS = [
+    "咳嗽", "流鼻涕", "发烧", "呕吐", "腹泻", "便血", "食欲不振", "精神沉郁", "打喷嚏", "流眼泪",
+    "皮肤瘙痒", "掉毛", "跛行", "尿频", "尿血", "口臭", "流口水", "眼睛红肿", "耳朵异味", "消瘦",
+    "抽搐", "呼吸困难", "高热不退",
+]
+
+
+def build_lexicon(size: int, rng: random.Random) -> dict:
+    lexicon = dict(DEFAULT_URGENT_LEXICON)
+    chars = "".join(SYMPTOMS) + "急性慢性严重突发持续反复"
+    while len(lexicon) < size:
+        lexicon["".join(rng.choice(chars) for _ in range(rng.randint(2, 5)))] = rng.randint(0, 1)
+    return lexicon
+
+
+def main(size: int = 1000, samples: int = 5000) -> None:
+    rng = random.Random(0)
+    lexicon = build_lexicon(size, rng)
+    descriptions = [
+        f"犬{rng.randint(1, 14)}天来{'，'.join(rng.sample(SYMPTOMS, rng.randint(2, 6)))}" for _ in range(samples)
+    ]
+
+    start = time.perf_counter()
+    triage = UrgencyTriage(lexicon)
+    print(f"构建自动机（{len(triage.lexicon)} 个关键词）：{(time.perf_counter() - start) * 1e3:.1f}ms")
+
+    start = time.perf_counter()
+    for desc in descriptions:
+        triage.classify(desc)
+    elapsed = time.perf_counter() - start
+    print(f"Aho-Corasick：{elapsed / samples * 1e6:.1f} us/条")
+
+    keywords = list(triage.lexicon)
+    start = time.perf_counter()
+    for desc in descriptions:
+        text = normalize_description(desc)
+        [keyword for keyword in keywords if keyword in text]
+    elapsed = time.perf_counter() - start
+    print(f"逐个关键词 in 查找：{elapsed / samples * 1e6:.1f} us/条")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
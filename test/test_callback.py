@@ -0,0 +1,119 @@
+import sys
+import threading
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routers import jobs
+from core.jobs import callback
+from core.jobs.callback import (CallbackPolicy, InvalidCallbackUrl,
+                                post_callback, send_callback,
+                                validate_callback_url)
+
+ADDRESSES = {
+    "clinic.example.com": ["93.184.216.34"],
+    "intranet.example.com": ["10.0.0.8"],
+    "rebind.example.com": ["93.184.216.35", "127.0.0.1"],
+    "metadata.example.com": ["::ffff:169.254.169.254"],
+}
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+
+    def post(self, url, json):
+        self.calls.append((url, json["data"]["id"]))
+        return FakeResponse(self.statuses.pop(0))
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    policy = CallbackPolicy(schemes=frozenset({"http", "https"}), hosts=frozenset())
+    monkeypatch.setattr(callback, "_policy", policy)
+    monkeypatch.setattr(callback, "_resolve", lambda host, port: ADDRESSES[host] if host in ADDRESSES else [host])
+    return policy
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://clinic.example.com/callback",
+    "https://127.0.0.1/callback",
+    "http://[::1]:8000/callback",
+    "http://169.254.169.254/latest/meta-data",
+    "https://intranet.example.com/callback",
+    "https://rebind.example.com/callback",
+    "https://metadata.example.com/callback",
+    "https:///callback",
+])
+def test_rejects_private_and_disallowed_urls(url):
+    """测试协议不允许、主机缺失或解析到内网、回环、链路本地地址的回调地址被拒绝"""
+    with pytest.raises(InvalidCallbackUrl):
+        validate_callback_url(url)
+
+
+def test_host_allowlist(policy):
+    """测试配置白名单后只允许白名单中的主机及其子域名"""
+    validate_callback_url("https://clinic.example.com/callback")
+    policy.hosts = frozenset({"example.com"})
+    validate_callback_url("https://clinic.example.com/callback")
+    policy.hosts = frozenset({"partner.example.org"})
+    with pytest.raises(InvalidCallbackUrl):
+        validate_callback_url("https://clinic.example.com/callback")
+
+
+def test_post_callback_retries_with_dedicated_client(monkeypatch):
+    """测试回调使用专用客户端并在失败后重试，地址不允许时不发送"""
+    client = FakeClient([500, 200])
+    monkeypatch.setattr(callback, "get_callback_client", lambda: client)
+    monkeypatch.setattr(callback, "CALLBACK_BACKOFF", (0, 0))
+    assert post_callback({"id": "job-1", "callback_url": "https://clinic.example.com/callback"})
+    assert client.calls == [("https://clinic.example.com/callback", "job-1")] * 2
+
+    assert not post_callback({"id": "job-2", "callback_url": "https://intranet.example.com/callback"})
+    assert len(client.calls) == 2
+    assert callback.callback_metrics()["rejected"] >= 1
+
+
+def test_send_callback_does_not_block_caller(monkeypatch):
+    """测试回调在专用线程池中发送，调用方立即返回"""
+    release = threading.Event()
+
+    def slow_post(job):
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(callback, "post_callback", slow_post)
+    future = send_callback({"id": "job-1", "callback_url": "https://clinic.example.com/callback"})
+    assert not future.done()
+    release.set()
+    assert future.result(5) is True
+
+
+def test_create_job_rejects_private_callback(monkeypatch):
+    """测试提交任务时回调地址指向内网直接返回 400，不创建任务"""
+    submitted = []
+    backend = type("Backend", (), {"submit": lambda self, *args: submitted.append(args) or {"id": "job-1"}})()
+    monkeypatch.setattr(jobs, "get_job_backend", lambda: backend)
+    app = FastAPI()
+    app.include_router(jobs.router)
+    client = TestClient(app)
+
+    response = client.post("/jobs", json={"description": "犬咳嗽", "callback_url": "http://10.0.0.8/callback"})
+    assert response.status_code == 400 and response.json()["code"] == 400
+    assert submitted == []
+
+    response = client.post("/jobs", json={"description": "犬咳嗽", "callback_url": "https://clinic.example.com/cb"})
+    assert response.status_code == 202
+    assert submitted[0][3] == "https://clinic.example.com/cb"
@@ -0,0 +1,165 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from backend.routers.diagnosis import _run_engine
+from core.ai_diagnosis.cancellation import (CancelToken, CheckpointModel,
+                                            RequestCancelled, cancel_scope,
+                                            cancellation_metrics,
+                                            check_cancelled)
+from core.ai_diagnosis.circuit_breaker import get_circuit_breaker
+from core.ai_diagnosis.generation import (STRICT_TABLE_PROMPT, TABLE_OPENERS,
+                                          build_messages, generate,
+                                          generate_guarded)
+from core.ai_diagnosis.upstream import Upstream, UpstreamPool
+from core.scheduling import scheduler
+from core.scheduling.scheduler import PriorityLimiter, run_prioritized
+
+
+class CancellingStream:
+    """模拟 OpenAI 流式响应，读到第 cancel_at 个 chunk 时取消请求"""
+
+    def __init__(self, pieces, token, cancel_at):
+        self.pieces = pieces
+        self.token = token
+        self.cancel_at = cancel_at
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            if self.consumed == self.cancel_at:
+                self.token.cancel()
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+    def close(self):
+        self.closed = True
+
+
+def streaming_model(stream):
+    return SimpleNamespace(
+        model_name="fake",
+        generate_args={},
+        client=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream))),
+    )
+
+
+def test_no_token_is_noop():
+    """测试没有取消标记（后台任务、预热）时检查点不做任何事"""
+    check_cancelled(skipped_call=True)
+
+
+def test_cancelled_request_skips_upstream_call():
+    """测试请求已取消时不再发起上游调用，并计数"""
+    calls = []
+    token = CancelToken()
+    token.cancel()
+    before = cancellation_metrics().get("upstream_calls_skipped", 0)
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        generate(lambda messages, **kwargs: calls.append(messages), build_messages("sys", "desc"))
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        CheckpointModel(lambda messages: calls.append(messages))([])
+    assert calls == []
+    assert cancellation_metrics()["upstream_calls_skipped"] == before + 2
+
+
+def test_stream_is_closed_when_cancelled():
+    """测试流式生成过程中请求被取消时立即关闭上游流，不再读取后续 chunk，也不重试"""
+    token = CancelToken()
+    stream = CancellingStream(["| disease |", " p |\n"] * 20, token, cancel_at=3)
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        generate_guarded(streaming_model(stream), build_messages("sys", "desc"), TABLE_OPENERS, STRICT_TABLE_PROMPT, 4)
+    assert stream.closed
+    assert stream.consumed == 3
+    assert cancellation_metrics()["upstream_streams_aborted"] >= 1
+
+
+def test_lease_does_not_count_cancellation_as_upstream_error():
+    """测试取消不计入上游错误与熔断器；调用完成时请求已取消则跳过后续解析"""
+    pool = UpstreamPool("cancel_test", [Upstream("cancel_test", "u0", "http://127.0.0.1:9000/v1", "key", "model", {})],
+                        probe_interval=0)
+    token = CancelToken()
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        with pool.lease():
+            token.cancel()
+            token.check()
+    upstream = pool.upstreams[0]
+    assert (upstream.requests, upstream.errors, upstream.in_flight) == (0, 0, 0)
+    assert get_circuit_breaker("cancel_test").stats()["window_calls"] == 0
+
+    parsed = []
+    token = CancelToken()
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        with pool.lease():
+            token.cancel()
+        parsed.append("parsed")
+    assert parsed == []
+    assert (upstream.requests, upstream.errors) == (1, 0)
+
+
+def test_client_disconnect_cancels_engine():
+    """测试客户端断开连接后，线程池中执行的引擎在下一个检查点停止"""
+
+    async def receive():
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    def engine():
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            check_cancelled()
+            time.sleep(0.01)
+        return "finished"
+
+    start = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        request = SimpleNamespace(receive=receive, headers={}, state=SimpleNamespace())
+        asyncio.run(_run_engine(request, "cancel_test", "咳嗽", engine))
+    assert time.monotonic() - start < 1
+    assert cancellation_metrics()["cancel_test"] == 1
+
+
+def test_queued_request_leaves_queue_when_cancelled(monkeypatch):
+    """测试排队中的请求被取消后立即退出队列，不等到获得名额，也不执行引擎"""
+    limiter = PriorityLimiter(max_concurrency=1)
+    monkeypatch.setattr(scheduler, "_limiter", limiter)
+    limiter.acquire()
+    token = CancelToken()
+    calls, errors = [], []
+
+    def queued():
+        with cancel_scope(token):
+            try:
+                run_prioritized("咳嗽", lambda: calls.append("engine"))
+            except RequestCancelled as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=queued, daemon=True)
+    thread.start()
+    while limiter.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    start = time.monotonic()
+    token.cancel()
+    thread.join(5)
+    assert time.monotonic() - start < 1
+    assert len(errors) == 1 and calls == []
+    stats = limiter.stats()
+    assert (stats["waiting"], stats["active"], stats["cancelled"]) == (0, 1, 1)
+    assert cancellation_metrics()["queued_requests_cancelled"] >= 1
+
+    # 已取消的请求获得名额后直接归还，不执行引擎
+    limiter.release()
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        run_prioritized("咳嗽", lambda: calls.append("engine"))
+    assert calls == [] and limiter.stats()["active"] == 0
@@ -0,0 +1,135 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from core.ai_diagnosis.circuit_breaker import (CLOSED, HALF_OPEN, OPEN,
+                                               CircuitBreaker,
+                                               CircuitOpenError)
+
+ERROR = RuntimeError("上游不可用")
+
+
+def test_opens_on_error_rate_and_fails_fast():
+    """测试错误率达到阈值后打开，打开期间直接拒绝"""
+    breaker = CircuitBreaker("test", window=10, min_calls=4, error_rate=0.5, open_seconds=60)
+    for error in (None, ERROR, None):
+        breaker.record(0.1, error)
+    assert breaker.state == CLOSED
+    breaker.record(0.1, ERROR)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        with breaker.guard():
+            pass
+    assert excinfo.value.retry_after > 50
+    stats = breaker.stats()
+    assert stats["rejected"] == 1
+    assert stats["transitions"][-1]["to"] == OPEN
+
+
+def test_opens_on_slow_calls():
+    """测试慢调用比例达到阈值后打开"""
+    breaker = CircuitBreaker("test", window=4, min_calls=4, slow_call_seconds=1, slow_rate=0.75)
+    for latency in (2, 0.1, 2, 2):
+        breaker.record(latency, None)
+    assert breaker.state == OPEN
+
+
+def test_half_open_trials():
+    """测试打开时间结束后半开，限制试探请求数，试探成功后关闭，失败后重新打开"""
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.05, half_open_calls=2)
+    breaker.record(0.1, ERROR)
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(0.1, None)
+    breaker.release()
+    breaker.record(0.1, None)
+    breaker.release()
+    assert breaker.state == CLOSED
+
+    breaker.record(0.1, ERROR)
+    time.sleep(0.06)
+    with breaker.guard():
+        breaker.record(0.1, ERROR)
+    assert breaker.state == OPEN
+    assert [item["to"] for item in breaker.stats()["transitions"]] == [OPEN, HALF_OPEN, CLOSED, OPEN, HALF_OPEN, OPEN]
+
+
+def test_calls_without_upstream_release_trial():
+    """测试没有上游调用的请求（如命中缓存）结束后归还试探名额"""
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0, half_open_calls=1)
+    breaker.record(0.1, ERROR)
+    with breaker.guard():
+        pass
+    assert breaker.state == HALF_OPEN
+    with breaker.guard():
+        breaker.record(0.1, None)
+    assert breaker.state == CLOSED
+
+
+def test_concurrent_probes_do_not_exceed_half_open_calls():
+    """测试半开时并发到达的请求中只有 half_open_calls 个被放行"""
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.05, half_open_calls=1)
+    breaker.record(0.1, ERROR)
+    time.sleep(0.06)
+    barrier = threading.Barrier(16)
+    admitted = []
+
+    def probe():
+        barrier.wait()
+        try:
+            with breaker.guard():
+                admitted.append(threading.get_ident())
+                time.sleep(0.1)
+        except CircuitOpenError:
+            pass
+
+    threads = [threading.Thread(target=probe) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(admitted) == 1
+    assert breaker.state == HALF_OPEN
+    assert [item["to"] for item in breaker.stats()["transitions"]] == [OPEN, HALF_OPEN]
+
+
+def test_request_admitted_before_half_open_does_not_free_probe_slot():
+    """测试关闭状态下放行的请求在半开期间结束时不归还本轮的试探名额"""
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0, half_open_calls=1)
+    entered, probing = threading.Event(), threading.Event()
+    stale_done, probe_done = threading.Event(), threading.Event()
+
+    def request(started, done):
+        with breaker.guard():
+            started.set()
+            done.wait(1)
+
+    stale = threading.Thread(target=request, args=(entered, stale_done))
+    stale.start()
+    entered.wait(1)
+    breaker.record(0.1, ERROR)
+    probe = threading.Thread(target=request, args=(probing, probe_done))
+    probe.start()
+    probing.wait(1)
+    assert breaker.state == HALF_OPEN
+
+    # 关闭状态下放行的请求先结束，试探请求仍在进行
+    stale_done.set()
+    stale.join()
+    assert not breaker.allow()
+    probe_done.set()
+    probe.join()
+    assert breaker.allow()
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from agentscope.models import ModelResponse
+
+from core.ai_diagnosis.diagnosis import (DIAGNOSIS_COLUMNS, extract_table_only,
+                                         format_json_diagnosis,
+                                         parse_diagnosis_table,
+                                         parse_probability)
+from core.ai_diagnosis.generation import (END_MARKER, build_messages,
+                                          generate_compact)
+from utils.parser.compact import (TAB, UNIT_SEPARATOR, parse_compact_rows,
+                                  render_compact_header, resolve_delimiter,
+                                  resolve_output_format, split_complete_lines)
+
+CONVERTERS = {"p": parse_probability}
+ROW = ["犬瘟热", "发热、鼻液", "0.8", "隔离", "观察体温", "抽搐时就医",
+       "单抗", "1ml/kg", "头孢", "25mg/kg", "地塞米松", "0.2mg/kg"]
+
+
+def test_compact_matches_table_output():
+    """测试紧凑格式解析结果与表格解析 + format_json_diagnosis 一致"""
+    table = "| " + " | ".join(DIAGNOSIS_COLUMNS) + " |\n|---|\n| " + " | ".join(ROW) + " |"
+    expected = format_json_diagnosis(parse_diagnosis_table(extract_table_only(table)))
+
+    for delimiter in (TAB, UNIT_SEPARATOR):
+        text = render_compact_header(DIAGNOSIS_COLUMNS, delimiter) + "\n" + delimiter.join(ROW)
+        assert parse_compact_rows(text, DIAGNOSIS_COLUMNS, delimiter, CONVERTERS) == expected
+
+
+def test_compact_header_order_and_missing_cells():
+    """测试按表头顺序映射列、缺失字段补空、无表头时按约定顺序解析"""
+    columns = ["disease", "description", "p"]
+    rows = parse_compact_rows("p\tdisease\n0.6\t肺炎\n说明文字", columns, TAB, CONVERTERS)
+    assert rows == [{"disease": "肺炎", "description": "", "p": 0.6}]
+    assert list(rows[0]) == columns
+
+    rows = parse_compact_rows("肠炎\t腹泻\t0.4\t多余", columns, TAB, CONVERTERS)
+    assert rows == [{"disease": "肠炎", "description": "腹泻", "p": 0.4}]
+
+
+def test_split_complete_lines():
+    """测试识别被截断的最后一行"""
+    text = "disease\tdescription\tp\n犬瘟热\t鼻液\t0.8\n肺炎\t咳"
+    complete, rows, incomplete = split_complete_lines(text, TAB, 3)
+    assert (rows, incomplete) == (1, True)
+    assert complete.endswith("0.8")
+
+
+def test_generate_compact_continues_truncated_output():
+    """测试紧凑格式被截断时只续写剩余行"""
+    header = "disease\tdescription\tp"
+    outputs = [
+        (header + "\n犬瘟热\t鼻液\t0.8\n肺炎\t咳", "length"),
+        (header + "\n肺炎\t咳嗽\t0.6\n" + END_MARKER, "stop"),
+    ]
+
+    def model(messages, **kwargs):
+        text, finish_reason = outputs.pop(0)
+        return ModelResponse(text=text, raw={"choices": [{"finish_reason": finish_reason}]})
+
+    text = generate_compact(model, build_messages("sys", "desc"), ["disease", "description", "p"],
+                            TAB, 2, 50, 50, 4096)
+    assert text == header + "\n犬瘟热\t鼻液\t0.8\n肺炎\t咳嗽\t0.6"
+
+
+def test_resolve_output_options():
+    """测试输出格式与分隔符配置的默认值"""
+    assert resolve_output_format(None) == "table"
+    assert resolve_output_format("Compact") == "compact"
+    assert resolve_output_format("xml") == "table"
+    assert resolve_delimiter("unit") == UNIT_SEPARATOR
+    assert resolve_delimiter(None) == TAB
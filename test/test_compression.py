@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.element.ele_response import HerbDiagnosisItem
+from backend.middleware.compression import CompressionMiddleware, _accepts
+from backend.response import FastJSONResponse, parse_fields, project_items
+from core.ai_diagnosis.herb_diagnosis import HERB_COLUMNS
+
+ITEMS = [{column: f"{column}：每日两次，温水送服" * 20 for column in HERB_COLUMNS} for _ in range(5)]
+
+
+def build_client(minimum_size=1024):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get("/large")
+    async def large():
+        return FastJSONResponse({"message": "诊断成功", "data": ITEMS, "code": 200})
+
+    @app.get("/small")
+    async def small():
+        return FastJSONResponse({"message": "诊断成功", "data": [], "code": 200})
+
+    return TestClient(app)
+
+
+def test_large_response_is_gzipped():
+    """测试超过阈值的响应按 gzip 压缩，解压后内容不变"""
+    client = build_client()
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert response.json()["data"] == ITEMS
+
+
+def test_small_or_unsupported_responses_are_not_compressed():
+    """测试小于阈值或客户端不支持压缩时原样返回"""
+    client = build_client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_accept_encoding_quality():
+    """测试 q=0 表示不接受该编码"""
+    assert _accepts("gzip, deflate, br", "br")
+    assert _accepts("gzip;q=1.0, br;q=0.5", "br")
+    assert not _accepts("gzip, br;q=0", "br")
+    assert not _accepts("gzip", "br")
+
+
+def test_fields_projection():
+    """测试按响应字段名投影诊断条目，未知字段报错"""
+    selected = parse_fields("zhengming, p,continue,p", HerbDiagnosisItem)
+    assert selected == ["zhengming", "p", "continue"]
+    projected = project_items([{**ITEMS[0], "p": 0.6}], selected)
+    assert projected == [{"zhengming": ITEMS[0]["zhengming"], "p": 0.6, "continue": ITEMS[0]["continue"]}]
+    assert parse_fields(None, HerbDiagnosisItem) is None
+    with pytest.raises(ValueError):
+        parse_fields("zhengming,disease", HerbDiagnosisItem)
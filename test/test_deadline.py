@@ -0,0 +1,208 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+import openai
+import pytest
+
+from backend.routers.diagnosis import _run_engine
+from core.ai_diagnosis.deadline import (Deadline, DeadlineExceeded,
+                                        check_deadline, deadline_metrics,
+                                        deadline_scope, parse_deadline_headers,
+                                        request_deadline)
+from core.ai_diagnosis.generation import (_call_within_deadline,
+                                          build_messages, generate,
+                                          generate_table)
+from core.ai_diagnosis.tiering import TierRouter
+from core.ai_diagnosis.upstream import Upstream, UpstreamPool
+from core.scheduling import scheduler
+from core.scheduling.scheduler import PriorityLimiter, run_prioritized
+
+TABLE_HEADER = "| disease | p |\n|---|---|\n"
+
+
+class ExpiringStream:
+    """模拟 OpenAI 流式响应，读到第 expire_at 个 chunk 时截止时间到达"""
+
+    def __init__(self, pieces, deadline, expire_at):
+        self.pieces = pieces
+        self.deadline = deadline
+        self.expire_at = expire_at
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            if self.consumed == self.expire_at:
+                self.deadline.expires = time.monotonic()
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+    def close(self):
+        self.closed = True
+
+
+def streaming_model(stream, requests):
+    def create(**kwargs):
+        requests.append(kwargs)
+        return stream
+
+    return SimpleNamespace(
+        model_name="fake",
+        generate_args={},
+        client=SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))),
+    )
+
+
+def test_parse_headers():
+    """测试相对时长与绝对截止时间两种请求头，同时存在时取较早者"""
+    now = 1_700_000_000.0
+    assert parse_deadline_headers({}) is None
+    assert parse_deadline_headers({"x-request-timeout": "1500ms"}) == 1.5
+    assert parse_deadline_headers({"x-request-timeout": "10s"}) == 10
+    assert parse_deadline_headers({"x-request-deadline": str(now + 8)}, now=now) == 8
+    assert parse_deadline_headers({"x-request-deadline": "2023-11-14T22:13:25Z"}, now=now) == pytest.approx(5)
+    assert parse_deadline_headers({"x-request-timeout": "10", "x-request-deadline": str(now + 3)}, now=now) == 3
+    with pytest.raises(ValueError):
+        parse_deadline_headers({"x-request-deadline": "2023-11-14T22:13:25"})
+    # 无法解析的请求头按未指定处理，预算不超过上限
+    assert request_deadline({"x-request-timeout": "soon"}) is None
+    assert request_deadline({"x-request-timeout": "86400"}).timeout == 600
+
+
+def test_generate_uses_remaining_time_as_timeout():
+    """测试上游调用的超时为剩余时间，截止时间已到时不再发起调用"""
+    calls = []
+
+    def model(messages, **kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(text="ok", raw={})
+
+    deadline = Deadline(5)
+    with deadline_scope(deadline):
+        generate(model, build_messages("sys", "desc"), max_tokens=10)
+        deadline.expires = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            generate(model, build_messages("sys", "desc"))
+    assert len(calls) == 1
+    assert 4 < calls[0]["timeout"] <= 5 and calls[0]["max_tokens"] == 10
+
+
+def test_retry_only_within_budget():
+    """测试上游连接失败后剩余时间足够才重试，不足时直接失败并计数"""
+    error = openai.APIConnectionError(request=httpx.Request("POST", "http://upstream/v1/chat/completions"))
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            raise error
+        return "ok"
+
+    with deadline_scope(Deadline(10, min_call_seconds=1)):
+        assert _call_within_deadline(flaky) == "ok"
+    assert len(attempts) == 2 and attempts[1] < attempts[0]
+
+    def failing(timeout):
+        attempts.append(timeout)
+        raise error
+
+    attempts.clear()
+    with deadline_scope(Deadline(1.2, min_call_seconds=1)):
+        with pytest.raises(openai.APIConnectionError):
+            _call_within_deadline(failing)
+    assert len(attempts) == 1
+    assert deadline_metrics()["retry_skipped"] >= 1
+
+
+def test_stream_cut_by_deadline_returns_complete_rows():
+    """测试流式输出中截止时间到达时关闭上游流，只返回完整的行，且不再续写"""
+    requests = []
+    deadline = Deadline(30)
+    pieces = [TABLE_HEADER, "| 犬瘟热 | 0.6 |\n", "| 犬细小", "病毒 | 0.3 |\n", "| 犬冠状病毒 | 0.1 |\n"]
+    stream = ExpiringStream(pieces, deadline, expire_at=4)
+    with deadline_scope(deadline):
+        text = generate_table(streaming_model(stream, requests), build_messages("sys", "desc"), 5, 20, 20, 500)
+    assert text == TABLE_HEADER + "| 犬瘟热 | 0.6 |"
+    assert stream.closed and stream.consumed == 4
+    assert len(requests) == 1 and requests[0]["timeout"] <= 30
+    assert deadline.partial
+    assert deadline_metrics()["continuation_skipped"] >= 1
+
+
+def test_stream_without_format_before_deadline():
+    """测试截止时间到达时输出尚未出现格式起始符，不重试，直接超时"""
+    deadline = Deadline(30)
+    stream = ExpiringStream(["好的，", "我来分析", "一下"], deadline, expire_at=2)
+    with deadline_scope(deadline), pytest.raises(DeadlineExceeded):
+        generate_table(streaming_model(stream, []), build_messages("sys", "desc"), 5, 20, 20, 500)
+    assert stream.closed
+
+
+def test_escalation_skipped_near_deadline():
+    """测试剩余时间不足时不升级到大模型，返回小模型的结果并标记为部分结果"""
+    router = TierRouter.__new__(TierRouter)
+    router.engine, router.large, router.small = "deadline_test", "large-pool", "small-pool"
+    router.small_max_chars, router.small_max_clauses, router.escalate_p = 40, 3, 0.5
+    calls = []
+
+    def diagnose(pool):
+        calls.append(pool)
+        return [{"p": 0.2}]
+
+    deadline = Deadline(1, min_call_seconds=2)
+    with deadline_scope(deadline):
+        assert router.run("猫呕吐一次，精神好", diagnose) == [{"p": 0.2}]
+        with pytest.raises(DeadlineExceeded):
+            router.run("猫呕吐一次，精神好", lambda pool: [])
+    assert calls == ["small-pool"]
+    assert deadline.partial
+
+
+def test_queue_wait_bounded_by_deadline(monkeypatch):
+    """测试排队等待不超过截止时间，超时后不计入上游错误"""
+    limiter = PriorityLimiter(max_concurrency=1, aging_seconds=30)
+    monkeypatch.setattr(scheduler, "_limiter", limiter)
+    limiter.acquire()
+    start = time.monotonic()
+    with deadline_scope(Deadline(0.1)), pytest.raises(DeadlineExceeded):
+        run_prioritized("咳嗽", lambda: "done")
+    assert time.monotonic() - start < 1
+    assert limiter.timeouts == 1
+
+    pool = UpstreamPool("deadline_test", [Upstream("deadline_test", "u0", "http://127.0.0.1:9000/v1", "key", "model", {})],
+                        probe_interval=0)
+    with pytest.raises(DeadlineExceeded):
+        with pool.lease():
+            raise DeadlineExceeded("timeout")
+    upstream = pool.upstreams[0]
+    assert (upstream.requests, upstream.errors, upstream.in_flight) == (0, 0, 0)
+
+
+def test_request_header_bounds_engine():
+    """测试请求头的截止时间传递到线程池中执行的引擎"""
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    def engine():
+        while True:
+            check_deadline()
+            time.sleep(0.01)
+
+    request = SimpleNamespace(receive=receive, headers={"x-request-timeout": "200ms"}, state=SimpleNamespace())
+    before = deadline_metrics().get("exceeded", 0)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(_run_engine(request, "deadline_test", "咳嗽", engine))
+    assert time.monotonic() - start < 1
+    assert request.state.deadline.timeout == 0.2
+    assert deadline_metrics()["exceeded"] == before + 1
@@ -8,6 +8,7 @@ sys.path.insert(0, str(project_root))
 
 from utils.parser.table import parse_diagnosis_table, format_diagnosis_as_json
 from core.ai_diagnosis.diagnosis import Diagnosis
+from core.ai_diagnosis.engine import DiagnosisEngine
 
 
 def main():
@@ -24,10 +25,12 @@ def main():
     print(f"🔗 API地址: {diagnosis.base_url}")
     print()
     
-    # 初始化agent
-    print("🤖 正在初始化AI诊断agent...")
-    diagnosis._init_agent()
-    print("✅ Agent初始化完成")
+    # 初始化诊断引擎提示词
+    print("🤖 正在初始化AI诊断引擎...")
+    assert isinstance(diagnosis, DiagnosisEngine)
+    diagnosis._init_prompt()
+    assert diagnosis.sys_prompt and diagnosis.shortlist_prompt
+    print(f"✅ 引擎初始化完成，输出格式: {diagnosis.output_format}")
     print()
     
     # 测试症状描述
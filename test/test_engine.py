@@ -0,0 +1,158 @@
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+from agentscope.models import ModelResponse
+
+from core.ai_diagnosis import engine
+from core.ai_diagnosis.diagnosis import DIAGNOSIS_COLUMNS, Diagnosis
+from core.ai_diagnosis.herb_diagnosis import HERB_COLUMNS, HerbDiagnosis
+
+
+class ScriptedPool:
+    """按用户消息返回预设表格的上游池"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.messages = []
+        self.primary = SimpleNamespace(model_name="fake", base_url="http://upstream/v1", api_key="key")
+
+    @contextmanager
+    def lease(self):
+        def model(messages, **kwargs):
+            self.messages.append(messages)
+            return ModelResponse(text=self.reply(messages[-1]["content"]), raw={})
+
+        model.model_name = "fake"
+        yield model
+
+
+def table(columns, rows):
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    lines += ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def make_engine(monkeypatch, engine_class, reply, output_format="table"):
+    pool = ScriptedPool(reply)
+    router = SimpleNamespace(large=pool, small=None, runs=[])
+
+    def run(desc, diagnose):
+        router.runs.append(desc)
+        return diagnose(pool)
+
+    router.run = run
+    router.pool_for = lambda desc: pool
+    monkeypatch.setattr(engine, "TierRouter", lambda name, args: router)
+    return engine_class(structured_output="", output_format=output_format), pool
+
+
+@pytest.mark.parametrize("engine_class, columns, names", [
+    (Diagnosis, DIAGNOSIS_COLUMNS, ["犬瘟热", "犬副流感"]),
+    (HerbDiagnosis, HERB_COLUMNS, ["风热犯肺", "脾虚泄泻"]),
+])
+def test_two_stage_fills_details_of_top_items(monkeypatch, engine_class, columns, names):
+    """测试两个引擎共用的两阶段流程：先列出鉴别诊断，再为概率最高的条目补全其余字段"""
+
+    def reply(content):
+        if "只针对" in content:
+            name = names[0] if names[0] in content else names[1]
+            return table(columns, [[name, "详细依据", "0.9"] + [f"{name}-{column}" for column in columns[3:]]])
+        return table(columns[:3], [[names[1], "依据二", "0.3"], [names[0], "依据一", "0.7"]])
+
+    diagnosis, pool = make_engine(monkeypatch, engine_class, reply)
+    assert diagnosis.initialized and not hasattr(diagnosis, "agent")
+
+    items = diagnosis.two_stage_diagnosis("犬咳嗽，流鼻涕", max_results=2, detail_top_n=1)
+    assert [item[columns[0]] for item in items] == names
+    # 第一阶段的名称、依据与概率保留，其余字段来自第二阶段
+    assert items[0]["description"] == "依据一" and items[0]["p"] == 0.7
+    assert items[0][columns[-1]] == f"{names[0]}-{columns[-1]}"
+    assert items[1][columns[-1]] == ""
+    assert len(pool.messages) == 2
+    assert f"{names[0]}（" in pool.messages[1][-1]["content"]
+
+
+def test_diagnosis_uses_engine_specific_prompts(monkeypatch):
+    """测试诊断流程使用子类的提示词、用户消息与格式化函数"""
+    row = ["风热犯肺", "依据", "0.8"] + ["x"] * (len(HERB_COLUMNS) - 3)
+    diagnosis, pool = make_engine(monkeypatch, HerbDiagnosis, lambda content: table(HERB_COLUMNS, [row]))
+    monkeypatch.setattr(engine, "get_persistent_cache", lambda: None)
+    monkeypatch.setattr(engine, "get_semantic_cache", lambda namespace: None)
+
+    result = diagnosis.diagnosis("犬发热，口干", max_results=3)
+    assert list(result[0]) == HERB_COLUMNS and result[0]["zhengming"] == "风热犯肺"
+    system, user = pool.messages[0]
+    assert system["content"] == diagnosis.sys_prompt and "中兽医" in system["content"]
+    assert user["content"].startswith("症状描述：犬发热，口干\n\n请基于中医理论进行分析")
+    assert diagnosis.trace["engine"] == "herb_diagnosis" and diagnosis.trace["model"] == "fake"
+
+
+def test_semantic_namespace_depends_on_model_prompt_and_format(monkeypatch):
+    """测试近似缓存按模型、提示词与输出格式区分命名空间"""
+    table_engine, _ = make_engine(monkeypatch, Diagnosis, lambda content: "")
+    compact_engine = Diagnosis(structured_output="", output_format="compact")
+    namespace = table_engine._semantic_namespace(3)
+    assert namespace != compact_engine._semantic_namespace(3)
+    assert namespace != table_engine._semantic_namespace(5)
+
+    table_engine.model_name = "other"
+    assert namespace != table_engine._semantic_namespace(3)
+    table_engine.model_name = compact_engine.model_name
+    table_engine.sys_prompt += "\n补充说明"
+    assert namespace != table_engine._semantic_namespace(3)
+
+
+def test_details_failure_keeps_shortlist(monkeypatch):
+    """测试单条详情补全调用失败时保留第一阶段结果，不影响其他条目与整体返回"""
+    names = ["犬瘟热", "犬副流感"]
+
+    def reply(content):
+        if "只针对" in content:
+            if names[0] in content:
+                raise RuntimeError("upstream 502")
+            return table(DIAGNOSIS_COLUMNS, [[names[1], "详细依据", "0.3"] + ["x"] * (len(DIAGNOSIS_COLUMNS) - 3)])
+        return table(DIAGNOSIS_COLUMNS[:3], [[names[0], "依据一", "0.7"], [names[1], "依据二", "0.3"]])
+
+    diagnosis, pool = make_engine(monkeypatch, Diagnosis, reply)
+    items = diagnosis.two_stage_diagnosis("犬咳嗽，流鼻涕", max_results=2, detail_top_n=2)
+    assert [item["disease"] for item in items] == names
+    assert items[0]["description"] == "依据一" and items[0]["base"] == ""
+    assert items[1]["base"] == "x"
+
+
+@pytest.mark.parametrize("engine_class, columns", [
+    (Diagnosis, DIAGNOSIS_COLUMNS),
+    (HerbDiagnosis, HERB_COLUMNS),
+])
+def test_two_stage_follows_output_format_and_tiers(monkeypatch, engine_class, columns):
+    """测试两阶段诊断与 diagnosis 一样按档位路由，并使用紧凑格式的提示词与解析"""
+
+    def reply(content):
+        if "只针对" in content:
+            return "\n".join(["\t".join(columns), "\t".join(["甲", "详细依据", "0.9"] + ["y"] * (len(columns) - 3))])
+        return "\n".join(["\t".join(columns[:3]), "甲\t依据\t0.8"])
+
+    diagnosis, pool = make_engine(monkeypatch, engine_class, reply, output_format="compact")
+    items = diagnosis.two_stage_diagnosis("犬发热", max_results=1, detail_top_n=1)
+    assert items[0][columns[0]] == "甲" and items[0]["p"] == 0.8
+    assert items[0][columns[-1]] == "y"
+    assert diagnosis.tiers.runs == ["犬发热"]
+    assert pool.messages[0][0]["content"] == diagnosis.shortlist_compact_prompt
+    assert pool.messages[1][0]["content"] == diagnosis.compact_prompt
+
+
+def test_engines_initialize_all_prompts(monkeypatch):
+    """测试两个引擎初始化后各输出模式与两阶段诊断所需的提示词均已设置"""
+    for engine_class in (Diagnosis, HerbDiagnosis):
+        diagnosis, _ = make_engine(monkeypatch, engine_class, lambda content: "")
+        assert isinstance(diagnosis, engine.DiagnosisEngine) and diagnosis.initialized
+        for name in ("sys_prompt", "structured_prompt", "compact_prompt", "shortlist_prompt",
+                     "shortlist_structured_prompt", "shortlist_compact_prompt"):
+            assert getattr(diagnosis, name), name
@@ -0,0 +1,58 @@
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.element.ele_response import DiagnosisItem, HerbDiagnosisItem
+from core.ai_diagnosis.diagnosis import format_json_diagnosis
+from core.ai_diagnosis.fallback import (FALLBACK_MAX_P, get_fallback_engine,
+                                        run_fallback, fallback_metrics)
+from core.ai_diagnosis.herb_diagnosis import format_json_herb_diagnosis
+
+CASE = "姓名凯凯，为一雌性金毛犬，现年7岁，体重26 kg。送来时主诉:最近几天精神不好，食欲不振，有浓鼻液、浓眼屎，打喷嚏，拉稀。"
+
+
+def test_output_schema_matches_model_engines():
+    """测试规则诊断的输出字段、顺序与模型诊断格式化结果一致，并能通过响应模型校验"""
+    result = get_fallback_engine("diagnosis").diagnosis(CASE)
+    assert result and list(result[0]) == list(format_json_diagnosis([{}])[0])
+    DiagnosisItem(**result[0])
+
+    herb = get_fallback_engine("herb").diagnosis("发热，浓鼻液，口干，舌红")
+    assert herb and list(herb[0]) == list(format_json_herb_diagnosis([{}])[0])
+    HerbDiagnosisItem(**herb[0])
+
+
+def test_ranking_and_probability():
+    """测试按关键词加权得分排序，概率不超过上限，结果条数受 max_results 限制"""
+    result = get_fallback_engine("diagnosis").diagnosis(CASE, max_results=3)
+    assert result[0]["disease"] == "犬瘟热"
+    assert len(result) <= 3
+    assert all(0 < item["p"] <= FALLBACK_MAX_P for item in result)
+    assert [item["p"] for item in result] == sorted((item["p"] for item in result), reverse=True)
+
+
+def test_negated_keywords_are_ignored():
+    """测试否定的关键词不计分，无匹配时返回空列表"""
+    engine = get_fallback_engine("diagnosis")
+    assert engine.diagnosis("无血尿，未见尿频") == []
+    assert engine.diagnosis("今天天气不错") == []
+    assert engine.diagnosis("猫咪尿频，有血尿")[0]["disease"] == "下泌尿道疾病"
+
+
+def test_fast_and_counted():
+    """测试单次规则诊断耗时远低于1毫秒，并按原因计数"""
+    engine = get_fallback_engine("diagnosis")
+    engine.diagnosis(CASE)
+    start = time.perf_counter()
+    for _ in range(1000):
+        engine.diagnosis(CASE)
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+    fallback, result = run_fallback("herb", "久泻，软便，消瘦", None, "circuit_open")
+    assert result[0]["zhengming"] == "脾虚泄泻"
+    assert fallback.trace["source"] == "fallback" and fallback.trace["engine"] == "herb_diagnosis"
+    assert fallback_metrics()["herb"]["circuit_open"] >= 1
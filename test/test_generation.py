@@ -0,0 +1,199 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+from agentscope.models import ModelResponse
+
+from core.ai_diagnosis.generation import (CONTINUATION_OVERHEAD_TOKENS,
+                                          DEFAULT_MAX_RESULTS, END_MARKER,
+                                          MAX_RESULTS_LIMIT, STRICT_TABLE_PROMPT,
+                                          TABLE_OPENERS, budget_max_tokens,
+                                          build_messages, continue_truncated_json,
+                                          generate_guarded, generate_table,
+                                          get_finish_reason,
+                                          resolve_max_results,
+                                          split_complete_table, strip_end_marker)
+from utils.json.fix_broken_json import split_complete_json_objects
+from utils.json.schema import parse_structured_output
+
+
+def test_resolve_max_results():
+    """测试诊断条数的默认值与上下限"""
+    assert resolve_max_results(None) == DEFAULT_MAX_RESULTS
+    assert resolve_max_results(0) == DEFAULT_MAX_RESULTS
+    assert resolve_max_results(3) == 3
+    assert resolve_max_results(100) == MAX_RESULTS_LIMIT
+
+
+def test_budget_max_tokens():
+    """测试 max_tokens 按诊断条数估算并受上限约束"""
+    assert budget_max_tokens(3, 300, 120, 4096) == 1020
+    assert budget_max_tokens(10, 600, 120, 4096) == 4096
+
+
+def test_strip_end_marker():
+    """测试移除结束标记及其后的多余文字"""
+    text = f"| a |\n|---|\n| 1 |\n{END_MARKER}\n以上为诊断结果"
+    assert strip_end_marker(text) == "| a |\n|---|\n| 1 |"
+    assert strip_end_marker("| a |") == "| a |"
+    assert strip_end_marker(None) == ""
+
+
+def test_build_messages_and_finish_reason():
+    """测试消息构造与 finish_reason 读取"""
+    messages = build_messages("系统提示", "症状描述")
+    assert [m["role"] for m in messages] == ["system", "user"]
+
+    response = ModelResponse(text="...", raw={"choices": [{"finish_reason": "length"}]})
+    assert get_finish_reason(response) == "length"
+    assert get_finish_reason(ModelResponse(text="...")) is None
+
+
+class ScriptedModel:
+    """按顺序返回预设输出的模型，用于验证续写流程"""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = []
+
+    def __call__(self, messages, **kwargs):
+        self.calls.append((messages, kwargs))
+        text, finish_reason = self.outputs.pop(0)
+        return ModelResponse(text=text, raw={"choices": [{"finish_reason": finish_reason}]})
+
+
+HEADER = "| disease | description | p |\n|---|---|---|"
+
+
+def test_split_complete_table_drops_partial_row():
+    """测试识别并丢弃被截断的最后一行"""
+    text = HEADER + "\n| 犬瘟热 | 鼻液 | 0.8 |\n| 肺炎 | 咳"
+    complete, rows, incomplete = split_complete_table(text)
+    assert rows == 1
+    assert incomplete
+    assert complete.endswith("| 犬瘟热 | 鼻液 | 0.8 |")
+
+
+def test_generate_table_continues_truncated_output():
+    """测试表格被截断时只续写剩余行并合并"""
+    model = ScriptedModel([
+        (HEADER + "\n| 犬瘟热 | 鼻液 | 0.8 |\n| 肺炎 | 咳", "length"),
+        (HEADER + "\n| 肺炎 | 咳嗽 | 0.6 |\n| 肠炎 | 腹泻 | 0.4 |\n" + END_MARKER, "stop"),
+    ])
+    text = generate_table(model, build_messages("sys", "desc"), 3, 100, 50, 4096)
+
+    assert len(model.calls) == 2
+    continuation_messages, kwargs = model.calls[1]
+    assert continuation_messages[-2]["role"] == "assistant"
+    assert kwargs["max_tokens"] == 2 * 100 + CONTINUATION_OVERHEAD_TOKENS
+    assert text.count("| 犬瘟热 |") == 1
+    assert "| 肠炎 | 腹泻 | 0.4 |" in text
+    assert text.split("\n").count("|---|---|---|") == 1
+
+
+def test_generate_table_without_truncation_makes_one_call():
+    """测试正常结束的输出不会触发续写"""
+    model = ScriptedModel([(HEADER + "\n| 犬瘟热 | 鼻液 | 0.8 |\n" + END_MARKER, "stop")])
+    generate_table(model, build_messages("sys", "desc"), 3, 100, 50, 4096)
+    assert len(model.calls) == 1
+
+
+def test_continue_truncated_json():
+    """测试 JSON 数组被截断时从最后一个完整对象之后续写"""
+    truncated = '[{"disease": "犬瘟热", "p": 0.8}, {"disease": "肺'
+    model = ScriptedModel([('{"disease": "肺炎", "p": 0.6}]', "stop")])
+    text = continue_truncated_json(model, build_messages("sys", "desc"), truncated, 3, 100, 4096)
+
+    assert json.loads(text) == [
+        {"disease": "犬瘟热", "p": 0.8},
+        {"disease": "肺炎", "p": 0.6},
+    ]
+    assert model.calls[0][0][-2]["content"] == '[{"disease": "犬瘟热", "p": 0.8}'
+
+
+@pytest.mark.parametrize("continuation", [
+    '{"disease": "肺炎", "p": 0.6}]}',
+    '{"disease": "肺炎", "p": 0.6}\n]\n}',
+    '```json\n{"diagnoses": [{"disease": "肺炎", "p": 0.6}]}\n```',
+])
+def test_continue_truncated_wrapped_json(continuation):
+    """测试结构化输出的 {"diagnoses": [...]} 被截断时，续写结尾的外层对象不影响解析"""
+    truncated = '{"diagnoses": [{"disease": "犬瘟热", "p": 0.8}, {"disease": "肺'
+    model = ScriptedModel([(continuation, "stop")])
+    text = continue_truncated_json(model, build_messages("sys", "desc"), truncated, 3, 100, 4096)
+
+    assert parse_structured_output(text) == [
+        {"disease": "犬瘟热", "p": 0.8},
+        {"disease": "肺炎", "p": 0.6},
+    ]
+    assert model.calls[0][0][-2]["content"] == '{"diagnoses": [{"disease": "犬瘟热", "p": 0.8}'
+
+
+def test_split_complete_json_objects_handles_strings():
+    """测试字符串中的括号不影响对象边界判断"""
+    prefix, count, truncated = split_complete_json_objects('[{"a": "}]"}, {"b": ')
+    assert (prefix, count, truncated) == ('[{"a": "}]"}', 1, True)
+    assert split_complete_json_objects('[{"a": 1}]')[2] is False
+
+
+class FakeStream:
+    """模拟 OpenAI 流式响应，记录被消费的 chunk 数和是否被关闭"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for index, piece in enumerate(self.pieces):
+            self.consumed += 1
+            finish_reason = "stop" if index == len(self.pieces) - 1 else None
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingModel(ScriptedModel):
+    """同时提供流式 client 与普通调用的模型，用于验证格式守卫"""
+
+    def __init__(self, stream_pieces, outputs):
+        super().__init__(outputs)
+        self.model_name = "fake"
+        self.generate_args = {}
+        self.stream = FakeStream(stream_pieces)
+        self.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: self.stream))
+        )
+
+
+def test_generate_guarded_aborts_prose_and_retries():
+    """测试前几个 token 没有表格起始符时中止流并以更严格的提示重试"""
+    model = StreamingModel(["初步", "临床", "印象", "：", "犬瘟热"] * 10, [(HEADER, "stop")])
+    response = generate_guarded(model, build_messages("sys", "desc"), TABLE_OPENERS,
+                                STRICT_TABLE_PROMPT, 4, max_tokens=100)
+
+    assert model.stream.closed
+    assert model.stream.consumed == 4
+    assert response.text == HEADER
+    retry_messages, kwargs = model.calls[0]
+    assert retry_messages[-1]["content"].endswith(STRICT_TABLE_PROMPT)
+    assert kwargs["max_tokens"] == 100
+
+
+def test_generate_guarded_keeps_formatted_stream():
+    """测试按格式输出的流被完整读取且不会重试"""
+    model = StreamingModel(["| disease |", " p |\n", "|---|---|\n", "| 犬瘟热 | 0.8 |"], [])
+    response = generate_guarded(model, build_messages("sys", "desc"), TABLE_OPENERS,
+                                STRICT_TABLE_PROMPT, 2)
+
+    assert model.calls == []
+    assert response.text.endswith("| 犬瘟热 | 0.8 |")
+    assert get_finish_reason(response) == "stop"
@@ -0,0 +1,120 @@
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.store.history_store import HistoryStore
+
+RESULT = [{"disease": "犬瘟热", "p": 0.7}]
+
+
+def test_records_are_written_in_batches(tmp_path):
+    """测试记录经队列批量写入，并按时间倒序分页查询"""
+    store = HistoryStore(str(tmp_path / "history.db"), batch_size=10, flush_interval=0.05)
+    for index in range(25):
+        assert store.record("diagnosis", f"描述{index}", RESULT, model="m", source="model",
+                            raw_output="| raw |", timings={"total_ms": 1.5})
+    store.flush()
+
+    items, total = store.query(page=1, page_size=10)
+    assert total == 25
+    assert [item["description"] for item in items[:2]] == ["描述24", "描述23"]
+    assert items[0]["result"] == RESULT
+    assert items[0]["timings"] == {"total_ms": 1.5}
+    assert store.stats()["batches"] >= 3
+
+    items, _ = store.query(page=3, page_size=10)
+    assert len(items) == 5
+    assert store.get(items[0]["id"])["description"] == "描述4"
+    store.close()
+
+
+def test_filters_by_engine_and_time(tmp_path):
+    """测试按引擎与时间范围过滤"""
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.05)
+    store.record("diagnosis", "犬咳嗽", RESULT)
+    store.record("herb_diagnosis", "犬腹泻", RESULT)
+    store.flush()
+
+    items, total = store.query(engine="herb_diagnosis")
+    assert total == 1 and items[0]["description"] == "犬腹泻"
+    assert store.query(start=time.time() + 60)[1] == 0
+    store.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    """测试队列满时丢弃记录而不阻塞调用方，关闭时写完剩余记录"""
+    store = HistoryStore(str(tmp_path / "history.db"), queue_size=1, flush_interval=0.05)
+    results = [store.record("diagnosis", f"描述{index}", RESULT) for index in range(200)]
+    assert not all(results)
+    assert store.stats()["dropped"] == results.count(False)
+    store.close()
+    assert store.query()[1] == results.count(True)
+
+
+def test_export_parquet_and_jsonl(tmp_path):
+    """测试分块导出 Parquet 与分片 JSONL，按引擎过滤"""
+    import pandas as pd
+
+    from utils.store.history_export import export_jsonl, export_parquet, iter_parquet_bytes
+
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.05)
+    for index in range(25):
+        store.record("diagnosis" if index % 5 else "herb_diagnosis", f"描述{index}", RESULT, timings={"total_ms": 1.0})
+    store.flush()
+
+    result = export_parquet(store, str(tmp_path / "history.parquet"), row_group_size=8, engine="diagnosis")
+    assert result["rows"] == 20
+    df = pd.read_parquet(tmp_path / "history.parquet")
+    assert len(df) == 20 and set(df["engine"]) == {"diagnosis"}
+    assert df["created_at"].dtype.kind == "M"
+
+    streamed = b"".join(iter_parquet_bytes(store, row_group_size=8))
+    (tmp_path / "streamed.parquet").write_bytes(streamed)
+    assert len(pd.read_parquet(tmp_path / "streamed.parquet")) == 25
+
+    result = export_jsonl(store, str(tmp_path / "jsonl"), shard_rows=10)
+    assert result["rows"] == 25
+    assert len(result["files"]) == 3
+    with open(result["files"][-1], encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+    store.close()
+
+
+def test_history_routes_query_off_event_loop(tmp_path, monkeypatch):
+    """测试列表与详情接口在线程池中执行同步的 SQLite 查询，不阻塞事件循环"""
+    import asyncio
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from backend.routers import history
+
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.05)
+    store.record("diagnosis", "犬咳嗽", RESULT)
+    store.flush()
+    on_loop = []
+
+    def in_event_loop():
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    query, get = store.query, store.get
+    monkeypatch.setattr(store, "query", lambda **kwargs: on_loop.append(in_event_loop()) or query(**kwargs))
+    monkeypatch.setattr(store, "get", lambda record_id: on_loop.append(in_event_loop()) or get(record_id))
+    monkeypatch.setattr(history, "get_history_store", lambda: store)
+    app = FastAPI()
+    app.include_router(history.router)
+    client = TestClient(app)
+
+    items = client.get("/history").json()["data"]["items"]
+    assert items[0]["description"] == "犬咳嗽"
+    assert client.get(f"/history/{items[0]['id']}").json()["data"]["description"] == "犬咳嗽"
+    assert on_loop == [False, False]
+    store.close()
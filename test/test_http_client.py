@@ -0,0 +1,48 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.ai_diagnosis.http_client import get_http_client, http_client_metrics
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_shared_client_reuses_connections():
+    """测试共享客户端复用 keep-alive 连接并统计连接池使用情况"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/models"
+
+    client = get_http_client()
+    assert get_http_client() is client
+    before = http_client_metrics()
+    try:
+        for _ in range(5):
+            assert client.get(url).status_code == 200
+    finally:
+        server.shutdown()
+
+    after = http_client_metrics()
+    assert after["requests"] - before.get("requests", 0) == 5
+    assert after["new_connections"] - before.get("new_connections", 0) == 1
+    assert after["idle_connections"] >= 1
+    assert after["max_connections"] > 0
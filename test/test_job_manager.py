@@ -0,0 +1,98 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from core.jobs import callback
+from core.jobs.job_manager import JobManager, JobQueueFull
+
+RESULT = [{"disease": "犬瘟热", "p": 0.7}]
+
+
+class FakeEngine:
+    release = threading.Event()
+
+    def diagnosis(self, desc, max_results=None):
+        FakeEngine.release.wait(5)
+        if desc == "失败":
+            raise RuntimeError("上游不可用")
+        return RESULT[:max_results]
+
+
+def wait_for(manager, job_id, states=("succeeded", "failed")):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"任务未结束: {manager.get(job_id)}")
+
+
+@pytest.fixture
+def manager():
+    FakeEngine.release.set()
+    manager = JobManager(workers=2, max_pending=2, engines={"diagnosis": (FakeEngine, "diagnosis")})
+    yield manager
+    FakeEngine.release.set()
+    manager.shutdown(wait=True)
+
+
+def test_job_runs_in_background(manager):
+    """测试任务提交后立即返回，完成后可查询结果与失败原因"""
+    job = manager.submit("diagnosis", "犬咳嗽", 1)
+    assert job["status"] == "queued"
+    assert wait_for(manager, job["id"])["result"] == RESULT
+
+    failed = wait_for(manager, manager.submit("diagnosis", "失败")["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "上游不可用"
+    assert manager.stats()["succeeded"] == 1
+    assert manager.stats()["failed"] == 1
+    assert manager.get("missing") is None
+    with pytest.raises(KeyError):
+        manager.submit("unknown", "犬咳嗽")
+
+
+def test_pending_jobs_are_bounded(manager):
+    """测试排队与运行中的任务数达到上限时拒绝提交"""
+    FakeEngine.release.clear()
+    first = manager.submit("diagnosis", "犬咳嗽")
+    manager.submit("diagnosis", "犬腹泻")
+    with pytest.raises(JobQueueFull):
+        manager.submit("diagnosis", "犬呕吐")
+    wait_for(manager, first["id"], states=("running",))
+    FakeEngine.release.set()
+    wait_for(manager, first["id"])
+    manager.submit("diagnosis", "犬呕吐")
+
+
+def test_callback_is_sent_off_the_job_thread(manager, monkeypatch):
+    """测试回调在回调线程池中发送，不占用任务线程，发送失败计入统计"""
+    calls = []
+    release = threading.Event()
+
+    def post_callback(job):
+        release.wait(5)
+        calls.append((job["callback_url"], job["status"], threading.current_thread().name))
+        return False
+
+    monkeypatch.setattr(callback, "post_callback", post_callback)
+    first = manager.submit("diagnosis", "犬咳嗽", callback_url="https://clinic.example.com/callback")
+    # 回调阻塞时任务线程仍可执行后续任务
+    wait_for(manager, first["id"])
+    wait_for(manager, manager.submit("diagnosis", "犬腹泻")["id"])
+    wait_for(manager, manager.submit("diagnosis", "犬呕吐")["id"])
+    release.set()
+    deadline = time.time() + 5
+    while manager.stats()["callbacks_failed"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    assert calls == [("https://clinic.example.com/callback", "succeeded", calls[0][2])]
+    assert calls[0][2].startswith("job-callback")
+    assert manager.stats()["callbacks_failed"] == 1
@@ -0,0 +1,119 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from core.jobs import job_queue
+from core.jobs.job_queue import JobQueue, JobQueueFull
+from core.jobs.worker import Worker
+
+RESULT = [{"disease": "犬瘟热", "p": 0.7}]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=0.2, max_attempts=2, max_pending=3)
+    yield queue
+    queue.close()
+
+
+def test_claim_complete_and_lease_fencing(queue):
+    """测试领取后租约内不会被重复领取，租约过期后由其他 worker 接管，原 worker 的结果被丢弃"""
+    job = queue.submit("diagnosis", "犬咳嗽", 3)
+    assert job["status"] == "queued"
+
+    claimed = queue.claim("worker-a")
+    assert claimed["id"] == job["id"]
+    assert claimed["attempts"] == 1
+    assert queue.claim("worker-b") is None
+    assert queue.heartbeat(job["id"], "worker-a")
+
+    time.sleep(0.25)
+    reclaimed = queue.claim("worker-b")
+    assert reclaimed["attempts"] == 2
+    assert not queue.heartbeat(job["id"], "worker-a")
+    assert not queue.complete(job["id"], "worker-a", RESULT)
+    assert queue.complete(job["id"], "worker-b", RESULT)
+
+    done = queue.get(job["id"])
+    assert done["status"] == "succeeded"
+    assert done["result"] == RESULT
+    assert queue.stats()["succeeded"] == 1
+
+
+def test_failures_are_retried_then_failed(queue, monkeypatch):
+    """测试失败后退避重新排队，用完尝试次数后标记为失败"""
+    monkeypatch.setattr(job_queue, "RETRY_BACKOFF", 0.05)
+    job = queue.submit("diagnosis", "犬咳嗽")
+    queue.claim("worker-a")
+    assert queue.fail(job["id"], "worker-a", "上游不可用") == "queued"
+    assert queue.claim("worker-a") is None
+
+    time.sleep(0.06)
+    assert queue.claim("worker-a")["attempts"] == 2
+    assert queue.fail(job["id"], "worker-a", "上游不可用") == "failed"
+    assert queue.get(job["id"])["error"] == "上游不可用"
+    assert queue.claim("worker-a") is None
+
+
+def test_expired_lease_on_last_attempt_fails(queue):
+    """测试最后一次尝试的租约过期后任务失败，不再被领取"""
+    job = queue.submit("diagnosis", "犬咳嗽")
+    queue.claim("worker-a")
+    time.sleep(0.25)
+    queue.claim("worker-b")
+    time.sleep(0.25)
+    assert queue.claim("worker-c") is None
+    assert queue.get(job["id"])["status"] == "failed"
+
+
+def test_pending_limit(queue):
+    """测试排队与运行中的任务数达到上限时拒绝写入"""
+    for index in range(3):
+        queue.submit("diagnosis", f"描述{index}")
+    with pytest.raises(JobQueueFull):
+        queue.submit("diagnosis", "描述3")
+
+
+def test_worker_runs_queued_jobs(tmp_path):
+    """测试 worker 并发执行队列中的任务并写回结果"""
+    queue = JobQueue(str(tmp_path / "jobs.db"), visibility_timeout=5)
+
+    class FakeEngine:
+        def diagnosis(self, desc, max_results=None):
+            if desc == "失败":
+                raise RuntimeError("上游不可用")
+            return RESULT
+
+    queue.max_attempts = 1
+    jobs = [queue.submit("diagnosis", f"描述{index}") for index in range(5)]
+    failed = queue.submit("diagnosis", "失败")
+    worker = Worker(queue, concurrency=2, poll_interval=0.01, engines={"diagnosis": (FakeEngine, "diagnosis")})
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    deadline = time.time() + 5
+    while worker.counts["succeeded"] + worker.counts["failed"] < 6 and time.time() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    thread.join(5)
+
+    assert all(queue.get(job["id"])["result"] == RESULT for job in jobs)
+    assert queue.get(failed["id"])["status"] == "failed"
+    assert worker.counts == {"succeeded": 5, "retried": 0, "deferred": 0, "failed": 1, "lost": 0}
+    queue.close()
+
+
+def test_release_does_not_consume_attempt(queue):
+    """测试放弃领取后任务延迟重新排队，尝试次数不变"""
+    job = queue.submit("diagnosis", "犬咳嗽")
+    queue.claim("worker-a")
+    assert queue.release(job["id"], "worker-a", delay=0.05)
+    assert queue.claim("worker-a") is None
+    time.sleep(0.06)
+    assert queue.claim("worker-a")["attempts"] == 1
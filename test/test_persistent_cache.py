@@ -0,0 +1,72 @@
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.cache.persistent_cache import PersistentCache, make_cache_key
+
+RESULT = [{"disease": "犬瘟热", "p": 0.7}]
+
+
+def test_key_ignores_punctuation_but_not_prompt():
+    """测试缓存键对描述做规范化，提示词或参数不同时键不同"""
+    key = make_cache_key("diagnosis", "model", "prompt", "犬咳嗽，发烧", max_results=3)
+    assert key == make_cache_key("diagnosis", "model", "prompt", "犬咳嗽 发烧。", max_results=3)
+    assert key != make_cache_key("diagnosis", "model", "prompt v2", "犬咳嗽，发烧", max_results=3)
+    assert key != make_cache_key("diagnosis", "model", "prompt", "犬咳嗽，发烧", max_results=5)
+
+
+def test_survives_reopen(tmp_path):
+    """测试重新打开文件后仍可读取，并统计命中次数"""
+    path = str(tmp_path / "cache.db")
+    writer = PersistentCache(path)
+    writer.set("k", "diagnosis", "犬咳嗽", RESULT)
+    writer.close()
+
+    cache = PersistentCache(path)
+    assert cache.get("k") == RESULT
+    assert cache.get("missing") is None
+    assert cache.top_descriptions("diagnosis") == [{"engine": "diagnosis", "description": "犬咳嗽", "hits": 1}]
+    cache.close()
+
+
+def test_compact_removes_expired_and_bounds_size(tmp_path):
+    """测试清理过期条目，超出容量时淘汰最久未访问的条目"""
+    cache = PersistentCache(str(tmp_path / "cache.db"), max_bytes=2000)
+    cache.set("expired", "diagnosis", "过期", RESULT, ttl=0.01)
+    for index in range(20):
+        cache.set(f"k{index}", "diagnosis", f"描述{index}", {"text": "x" * 200})
+    time.sleep(0.02)
+    cache.get("k0")
+
+    result = cache.compact()
+    assert result["expired"] == 1
+    assert result["evicted"] > 0
+    assert cache.stats()["bytes"] <= 2000
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+    cache.close()
+
+
+def _write_entries(path: str, worker: int) -> None:
+    cache = PersistentCache(path)
+    for index in range(50):
+        cache.set(f"{worker}-{index}", "diagnosis", f"描述{worker}-{index}", RESULT)
+    cache.close()
+
+
+def test_concurrent_processes(tmp_path):
+    """测试多个进程同时写入同一个缓存文件"""
+    path = str(tmp_path / "cache.db")
+    PersistentCache(path).close()
+    processes = [multiprocessing.Process(target=_write_entries, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    assert PersistentCache(path).stats()["entries"] == 200
@@ -0,0 +1,83 @@
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.middleware.rate_limit import (BucketConfig, RateLimiter,
+                                           RateLimitMiddleware)
+from core.ai_diagnosis.usage import report_usage
+
+
+def test_token_bucket_refill():
+    """测试突发容量用完后拒绝，按速率补充令牌，各分组、各客户端互不影响"""
+    limiter = RateLimiter({"diagnosis": BucketConfig(rate=20, burst=2), "herb": BucketConfig(rate=1, burst=1)})
+    assert limiter.check("a", "diagnosis")[0]
+    assert limiter.check("a", "diagnosis")[0]
+    allowed, retry_after, reason = limiter.check("a", "diagnosis")
+    assert not allowed and reason == "rate" and 0 < retry_after <= 0.05
+    assert limiter.check("a", "herb")[0]
+    assert limiter.check("b", "diagnosis")[0]
+    time.sleep(0.06)
+    assert limiter.check("a", "diagnosis")[0]
+    assert limiter.stats()["limited"] == 1
+
+
+def test_daily_token_quota():
+    """测试当日用量达到额度后拒绝，跨天后重置"""
+    limiter = RateLimiter({"diagnosis": BucketConfig(rate=100, burst=100)}, daily_tokens=1000)
+    assert limiter.check("a", "diagnosis")[0]
+    limiter.add_usage("a", 1200)
+    allowed, retry_after, reason = limiter.check("a", "diagnosis")
+    assert not allowed and reason == "quota" and retry_after > 0
+    assert limiter.check("b", "diagnosis")[0]
+    limiter._clients["a"].day = "2000-01-01"
+    assert limiter.check("a", "diagnosis")[0]
+
+
+def test_idle_clients_are_evicted():
+    """测试空闲且令牌桶已补满的客户端被清除，当日有用量的客户端保留"""
+    limiter = RateLimiter({"diagnosis": BucketConfig(rate=1000, burst=5)}, daily_tokens=100,
+                          idle_ttl=0.01, sweep_interval=0)
+    for client in ("a", "b", "c"):
+        limiter.check(client, "diagnosis")
+    limiter.add_usage("c", 10)
+    time.sleep(0.02)
+    limiter.check("d", "diagnosis")
+    assert set(limiter._clients) == {"c", "d"}
+    assert limiter.stats()["evicted"] == 2
+
+
+def test_middleware_limits_routes_and_records_usage():
+    """测试中间件按 API key 与路由分组限流，返回 429 与 Retry-After，并计入请求中的模型用量"""
+    limiter = RateLimiter({"diagnosis": BucketConfig(rate=0.01, burst=2)}, daily_tokens=500)
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+    @app.post("/api/v1/diagnosis")
+    def diagnosis():
+        # 同步路由在线程池中执行，用量上报随上下文传递
+        report_usage({"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150})
+        return {"message": "诊断成功", "data": [], "code": 200}
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    client = TestClient(app)
+    headers = {"X-API-Key": "clinic-a"}
+    assert client.post("/api/v1/diagnosis", headers=headers).status_code == 200
+    assert client.post("/api/v1/diagnosis", headers=headers).status_code == 200
+    response = client.post("/api/v1/diagnosis", headers=headers)
+    assert response.status_code == 429
+    assert response.json()["code"] == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.post("/api/v1/diagnosis", headers={"X-API-Key": "clinic-b"}).status_code == 200
+    assert all(client.get("/health").status_code == 200 for _ in range(5))
+
+    assert sorted(state.tokens_used for state in limiter._clients.values()) == [150, 300]
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi.responses import JSONResponse
+
+from backend.element.ele_response import DiagnosisResponse, HerbDiagnosisResponse
+from backend.response import FastJSONResponse
+from core.ai_diagnosis.diagnosis import DIAGNOSIS_COLUMNS
+from core.ai_diagnosis.herb_diagnosis import HERB_COLUMNS
+
+
+def build_item(columns):
+    item = {column: f"{column}：湿热蕴结" for column in columns}
+    item["p"] = 0.42
+    return item
+
+
+def test_fast_response_matches_stdlib_output():
+    """测试 orjson 渲染结果与 JSONResponse 逐字节一致"""
+    content = {"message": "诊断成功", "data": [build_item(HERB_COLUMNS)], "code": 200}
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+
+
+def test_response_models_keep_item_shape():
+    """测试响应模型按别名输出 continue 字段，未命中缓存时不输出 similarity"""
+    for model, columns in ((DiagnosisResponse, DIAGNOSIS_COLUMNS), (HerbDiagnosisResponse, HERB_COLUMNS)):
+        item = build_item(columns)
+        cached = {**item, "similarity": 0.95}
+        response = model.model_validate({"message": "诊断成功", "data": [item, cached], "code": 200})
+        data = response.model_dump(mode="json", by_alias=True, exclude_unset=True)["data"]
+        assert data[0] == item
+        assert data[1] == cached
@@ -0,0 +1,123 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from agentscope.service import ServiceExecStatus
+
+from utils.react_tool.sandbox_pool import SandboxPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(size=1, max_tasks=3, cpu_seconds=5, memory_mb=512, timeout=10)
+    yield pool
+    pool.shutdown()
+
+
+def test_execute_prints_stdout(pool):
+    """测试代码执行结果与 agentscope 格式一致"""
+    res = pool.execute("print(1 + 1)")
+    assert res.status == ServiceExecStatus.SUCCESS
+    assert "<returncode>0</returncode>" in res.content
+    assert "<stdout>2\n</stdout>" in res.content
+
+
+def test_execute_captures_exception(pool):
+    """测试异常信息写入标准错误"""
+    res = pool.execute("raise ValueError('坏数据')")
+    assert "<returncode>1</returncode>" in res.content
+    assert "ValueError" in res.content
+
+
+def test_namespace_is_isolated(pool):
+    """测试每次执行使用独立的全局命名空间"""
+    pool.execute("leaked = 1")
+    res = pool.execute("print('leaked' in globals())")
+    assert "<stdout>False\n</stdout>" in res.content
+
+
+def test_warm_worker_is_fast(pool):
+    """测试常驻工作进程的调用耗时远低于启动新解释器"""
+    pool.execute("pass")
+    started = time.perf_counter()
+    pool.execute("print('ok')")
+    elapsed = time.perf_counter() - started
+    print(f"沙箱调用耗时: {elapsed * 1000:.2f} ms")
+    assert elapsed < 0.5
+
+
+def test_timeout_replaces_worker(pool):
+    """测试超时后工作进程被替换，后续调用仍可正常执行"""
+    res = pool.execute("while True: pass", timeout=1)
+    assert res.status == ServiceExecStatus.ERROR
+    assert "timeout" in res.content
+
+    res = pool.execute("print('alive')")
+    assert "<stdout>alive\n</stdout>" in res.content
+
+
+def test_worker_recycled_after_max_tasks():
+    """测试执行 max_tasks 次后工作进程被回收重建"""
+    pool = SandboxPool(size=1, max_tasks=2, timeout=10)
+    try:
+        first = pool.execute("import os; print(os.getpid())").content
+        pool.execute("pass")
+        third = pool.execute("import os; print(os.getpid())").content
+        assert pool.stats["recycled"] >= 1
+        assert first != third
+    finally:
+        pool.shutdown()
+
+
+def test_builtins_are_isolated(pool):
+    """测试改写 __builtins__ 只影响本次执行"""
+    pool.execute("__builtins__['len'] = lambda obj: -1; print(len('ab'))")
+    res = pool.execute("print(len('ab'))")
+    assert "<stdout>2\n</stdout>" in res.content
+
+
+def test_worker_recycled_after_shared_state_changed():
+    """测试代码改写 builtins 模块或预导入模块后工作进程立即回收，后续执行不受影响"""
+    pool = SandboxPool(size=1, max_tasks=50, timeout=10)
+    try:
+        first = pool.execute("import os; print(os.getpid())").content
+        assert pool.execute("import os; print(os.getpid())").content == first
+        pool.execute("import builtins; builtins.print = lambda *args, **kwargs: None")
+        res = pool.execute("import os; print(os.getpid())")
+        assert res.content != first and "<stdout>" in res.content
+        pool.execute("import json; json.dumps = lambda obj: 'patched'")
+        res = pool.execute("import json; print(json.dumps(1))")
+        assert "<stdout>1\n</stdout>" in res.content
+        pool.execute("import sys, types; sys.modules['math'] = types.ModuleType('math')")
+        res = pool.execute("import math; print(math.sqrt(4))")
+        assert "<stdout>2.0\n</stdout>" in res.content
+        assert pool.stats["tainted"] == 3
+        # 导入新模块不算改写共享状态
+        pool.execute("import email.mime, fractions; print(fractions.Fraction(1, 2))")
+        assert pool.stats["tainted"] == 3
+    finally:
+        pool.shutdown()
+
+
+def test_wait_and_run_share_one_deadline():
+    """测试等待空闲进程的时间计入超时，整个调用不超过 timeout"""
+    pool = SandboxPool(size=1, max_tasks=50, timeout=10)
+    try:
+        busy = threading.Thread(target=pool.execute, args=("import time; time.sleep(1.5)",))
+        busy.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        res = pool.execute("import time; time.sleep(1.5); print('done')", timeout=2)
+        elapsed = time.perf_counter() - started
+        busy.join()
+        assert res.status == ServiceExecStatus.ERROR and "timeout" in res.content
+        assert elapsed < 2.5
+    finally:
+        pool.shutdown()
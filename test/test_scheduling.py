@@ -0,0 +1,80 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from core.scheduling.scheduler import PriorityLimiter
+from core.scheduling.triage import (PRIORITY_EMERGENCY, PRIORITY_ROUTINE,
+                                    PRIORITY_URGENT, AhoCorasick,
+                                    UrgencyTriage)
+
+
+def test_automaton_finds_overlapping_keywords():
+    """测试自动机找出重叠与互为后缀的关键词"""
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(automaton.iter_matches("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+    assert list(AhoCorasick([]).iter_matches("ushers")) == []
+
+
+def test_triage_levels_and_negation():
+    """测试按命中的最高优先级分级，全角、空白不影响匹配，否定的症状不计入"""
+    triage = UrgencyTriage()
+    assert triage.classify("犬突发抽搐，口吐白沫") == (PRIORITY_EMERGENCY, ["抽搐"])
+    assert triage.classify("狗 高热不退 三天")[0] == PRIORITY_EMERGENCY
+    assert triage.classify("猫高热，精神萎靡")[0] == PRIORITY_URGENT
+    assert triage.classify("猫皮肤瘙痒，掉毛") == (PRIORITY_ROUTINE, [])
+    assert triage.classify("精神尚可，无抽搐，未见便血") == (PRIORITY_ROUTINE, [])
+    assert UrgencyTriage({"ＡＢＣ": 1}).classify("x abc y")[0] == PRIORITY_URGENT
+
+
+def run_waiters(limiter, priorities, hold=0.05):
+    """并发已满时依次提交等待者，返回放行顺序"""
+    order = []
+    limiter.acquire()
+    threads = []
+    for index, priority in enumerate(priorities):
+        def run(index=index, priority=priority):
+            with limiter.slot(priority):
+                order.append(index)
+        threads.append(threading.Thread(target=run))
+        threads[-1].start()
+        time.sleep(0.02)
+    time.sleep(hold)
+    limiter.release()
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_emergencies_go_first():
+    """测试急症排在先到的普通请求之前，同级按到达顺序"""
+    limiter = PriorityLimiter(max_concurrency=1, aging_seconds=30)
+    order = run_waiters(limiter, [PRIORITY_ROUTINE, PRIORITY_ROUTINE, PRIORITY_EMERGENCY, PRIORITY_URGENT])
+    assert order == [2, 3, 0, 1]
+    stats = limiter.stats()
+    assert stats["admitted"]["emergency"] == 1
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_aging_prevents_starvation():
+    """测试普通请求等待超过老化时间后排在新到的急症之前"""
+    limiter = PriorityLimiter(max_concurrency=1, aging_seconds=0.001)
+    order = run_waiters(limiter, [PRIORITY_ROUTINE, PRIORITY_EMERGENCY])
+    assert order == [0, 1]
+
+
+def test_acquire_timeout():
+    """测试等待超时后退出队列，不影响后续请求"""
+    limiter = PriorityLimiter(max_concurrency=1)
+    limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(PRIORITY_EMERGENCY, timeout=0.05)
+    limiter.release()
+    assert limiter.acquire(timeout=0.05) == 0.0
+    assert limiter.stats()["timeouts"] == 1
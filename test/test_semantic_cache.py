@@ -0,0 +1,139 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from utils.cache.semantic_cache import (DEFAULT_THRESHOLD, MemoryBudget,
+                                        SemanticCache, clinical_signature,
+                                        normalize_description)
+
+DESCRIPTIONS = [
+    "犬咳嗽三天，流鼻涕，发烧，精神沉郁",
+    "猫呕吐一次，精神食欲正常",
+    "犬腹泻带血，精神沉郁，不吃东西",
+    "猫打喷嚏，流眼泪，眼角有分泌物",
+    "犬皮肤瘙痒，背部掉毛，有皮屑",
+]
+
+
+def build_cache(**kwargs) -> SemanticCache:
+    cache = SemanticCache(**kwargs)
+    for index, desc in enumerate(DESCRIPTIONS):
+        cache.add(desc, [{"name": f"diagnosis-{index}"}])
+    return cache
+
+
+def test_normalize_description():
+    """测试去除空白、标点并统一全角半角"""
+    assert normalize_description(" 犬，咳嗽！ＡＢ ") == "犬咳嗽ab"
+
+
+def test_near_duplicate_hits():
+    """测试标点、空白不同的描述命中原条目并返回相似度"""
+    cache = build_cache(threshold=0.8)
+    found = cache.lookup("猫 打喷嚏、流眼泪。眼角有分泌物！")
+    assert found is not None
+    value, similarity = found
+    assert value == [{"name": "diagnosis-3"}]
+    assert similarity > 0.99
+    assert cache.hits == 1
+
+
+def test_unrelated_description_misses():
+    """测试相似度低于阈值时不命中"""
+    cache = build_cache(threshold=0.8)
+    assert cache.lookup("兔子不吃草，牙齿过长") is None
+    assert cache.misses == 1
+    value, similarity, _ = cache.search("犬耳朵有异味，频繁甩头")
+    assert similarity < 0.8
+
+
+@pytest.mark.parametrize("cached, query", [
+    ("猫咳嗽，持续时间2周，食欲下降", "狗咳嗽，持续时间2周，食欲下降"),
+    ("犬腹泻三天，无便血，精神尚可", "犬腹泻三天，便血，精神尚可"),
+    ("犬咳嗽，持续两周，流鼻涕", "犬咳嗽，持续两天，流鼻涕"),
+    ("母犬呕吐，腹部胀大，食欲下降", "公犬呕吐，腹部胀大，食欲下降"),
+    ("猫体温39.5度，精神沉郁，不吃东西", "猫体温40.5度，精神沉郁，不吃东西"),
+])
+def test_clinical_near_misses_do_not_hit(cached, query):
+    """测试只差物种、否定、时长、性别或数值的描述不命中，即使向量相似度很高"""
+    cache = SemanticCache()
+    cache.add(cached, "cached")
+    assert clinical_signature(cached) != clinical_signature(query)
+    assert cache.search(query) is None
+    assert cache.lookup(query) is None and cache.misses == 1
+
+
+def test_equivalent_clinical_details_still_hit():
+    """测试同义的物种、中文与阿拉伯数字的时长签名一致，只有写法不同的描述仍可命中"""
+    assert clinical_signature("狗咳嗽两周，体重3公斤") == clinical_signature("犬咳嗽2周，体重3kg")
+    cache = SemanticCache()
+    cache.add("猫咳嗽，持续时间2周，食欲下降", "cached")
+    found = cache.lookup("猫 咳嗽、持续时间 2 周；食欲下降。")
+    assert found is not None and found[0] == "cached"
+    assert found[1] >= DEFAULT_THRESHOLD
+
+
+def test_overwrites_oldest_when_full():
+    """测试条目满时覆盖最早写入的条目，相同描述覆盖原条目"""
+    cache = SemanticCache(threshold=0.99, max_entries=3)
+    for index, desc in enumerate(DESCRIPTIONS):
+        cache.add(desc, index)
+    assert len(cache) == 3
+    assert cache.lookup(DESCRIPTIONS[0]) is None
+    assert cache.lookup(DESCRIPTIONS[4])[0] == 4
+
+    cache.add(DESCRIPTIONS[4] + "。", "updated")
+    assert len(cache) == 3
+    assert cache.lookup(DESCRIPTIONS[4])[0] == "updated"
+
+
+def test_expired_entries_are_skipped():
+    """测试过期条目不再命中"""
+    cache = build_cache(threshold=0.8, ttl=0.05)
+    assert cache.lookup(DESCRIPTIONS[0]) is not None
+    time.sleep(0.1)
+    assert cache.lookup(DESCRIPTIONS[0]) is None
+
+
+def test_namespaces_share_memory_budget():
+    """测试多个命名空间共享内存预算，预算用完后只覆盖自身最早写入的条目"""
+    dim = 16
+    row_bytes = dim * 4 + 20
+    budget = MemoryBudget(max_bytes=row_bytes * 6)
+    first = SemanticCache(threshold=0.99, max_entries=4, dim=dim, budget=budget)
+    second = SemanticCache(threshold=0.99, max_entries=4, dim=dim, budget=budget)
+    third = SemanticCache(threshold=0.99, max_entries=4, dim=dim, budget=budget)
+    for cache in (first, second, third):
+        for index, desc in enumerate(DESCRIPTIONS):
+            cache.add(desc, index)
+
+    assert (len(first), len(second), len(third)) == (4, 2, 0)
+    assert second.lookup(DESCRIPTIONS[4])[0] == 4 and second.lookup(DESCRIPTIONS[0]) is None
+    assert third.lookup(DESCRIPTIONS[4]) is None
+    assert budget.stats()["used_bytes"] <= budget.max_bytes
+    assert sum(cache.stats()["bytes"] for cache in (first, second, third)) == budget.stats()["used_bytes"]
+
+
+def test_hit_counters_are_consistent_under_concurrency():
+    """测试并发查询时命中与未命中计数不丢失"""
+    cache = build_cache(threshold=0.99)
+    queries = [DESCRIPTIONS[0], "兔子耳朵发红"] * 100
+
+    def run():
+        for query in queries:
+            cache.lookup(query)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] == 8 * 100 and stats["misses"] == 8 * 100
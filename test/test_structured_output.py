@@ -0,0 +1,56 @@
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.json.schema import (ROOT_KEY, build_diagnosis_schema,
+                               build_response_format, parse_structured_output,
+                               repair_structured_output,
+                               resolve_structured_output)
+
+COLUMNS = ["disease", "description", "p", "base"]
+
+
+def test_schema_generated_from_columns():
+    """测试 schema 由引擎的列定义生成，p 为数字其余为字符串"""
+    schema = build_diagnosis_schema(COLUMNS)
+    items = schema["properties"][ROOT_KEY]["items"]
+    assert items["required"] == COLUMNS
+    assert items["properties"]["p"]["type"] == "number"
+    assert items["properties"]["disease"]["type"] == "string"
+    assert items["additionalProperties"] is False
+
+
+def test_response_format_modes():
+    """测试不同结构化输出模式生成的 response_format"""
+    fmt = build_response_format("json_schema", "diagnosis", COLUMNS)
+    assert fmt["type"] == "json_schema"
+    assert fmt["json_schema"]["name"] == "diagnosis"
+    assert build_response_format("json_object", "diagnosis", COLUMNS) == {"type": "json_object"}
+    assert build_response_format(None, "diagnosis", COLUMNS) is None
+
+
+def test_resolve_structured_output():
+    """测试结构化输出模式的取值校验"""
+    assert resolve_structured_output(" JSON_SCHEMA ") == "json_schema"
+    assert resolve_structured_output("") is None
+    assert resolve_structured_output("xml") is None
+
+
+def test_parse_structured_output():
+    """测试遵循 schema 的输出只需一次 json.loads"""
+    rows = [{"disease": "犬瘟热", "description": "鼻液", "p": 0.8, "base": "保暖"}]
+    assert parse_structured_output(json.dumps({ROOT_KEY: rows}, ensure_ascii=False)) == rows
+    assert parse_structured_output(json.dumps(rows, ensure_ascii=False)) == rows
+    assert parse_structured_output("| disease | p |") is None
+    assert parse_structured_output('{"other": 1}') is None
+
+
+def test_repair_fallback_when_schema_ignored():
+    """测试服务端忽略 schema 时回退到修复流程"""
+    text = '```json\n[{"disease": “犬瘟热”, "p": 0.8},]\n```'
+    assert parse_structured_output(text) is None
+    assert repair_structured_output(text) == [{"disease": "犬瘟热", "p": 0.8}]
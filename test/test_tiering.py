@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.ai_diagnosis.tiering import (LARGE_TIER, SMALL_TIER, TierRouter,
+                                       is_simple_case, needs_escalation)
+
+
+def test_simple_case_heuristics():
+    """测试按描述长度、分句数、危重症状和化验数值判断简单病例"""
+    assert is_simple_case("猫呕吐一次，精神好", 40, 3)
+    assert not is_simple_case("猫呕吐一次，精神好，随后出现抽搐", 40, 3)
+    assert not is_simple_case("犬体温40.5℃，精神差", 40, 3)
+    assert not is_simple_case("犬咳嗽，流鼻涕，腹泻，食欲下降，眼屎多", 40, 3)
+    assert not is_simple_case("犬" * 41, 40, 3)
+
+
+def test_needs_escalation():
+    """测试空结果或最高概率低于阈值时升级"""
+    assert needs_escalation([], 0.5)
+    assert needs_escalation([{"p": 0.3}, {"p": "40%"}], 0.5)
+    assert not needs_escalation([{"p": 0.3}, {"p": "0.7"}], 0.5)
+
+
+def make_router():
+    router = TierRouter.__new__(TierRouter)
+    router.engine = "test"
+    router.large = "large-pool"
+    router.small = "small-pool"
+    router.small_max_chars = 40
+    router.small_max_clauses = 3
+    router.escalate_p = 0.5
+    return router
+
+
+def test_router_escalates_low_confidence():
+    """测试简单病例先用小模型，置信度不足时改用大模型"""
+    router = make_router()
+    calls = []
+
+    def diagnose(pool):
+        calls.append(pool)
+        return [{"p": 0.2 if pool == "small-pool" else 0.8}]
+
+    assert router.route("猫呕吐一次，精神好") == SMALL_TIER
+    assert router.run("猫呕吐一次，精神好", diagnose) == [{"p": 0.8}]
+    assert calls == ["small-pool", "large-pool"]
+
+
+def test_router_uses_large_without_small_tier():
+    """测试未配置小模型或复杂病例时直接使用大模型"""
+    router = make_router()
+    assert router.route("犬呼吸困难，张口呼吸") == LARGE_TIER
+    router.small = None
+    calls = []
+    router.run("猫呕吐一次", lambda pool: calls.append(pool) or [{"p": 0.9}])
+    assert calls == ["large-pool"]
@@ -0,0 +1,39 @@
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.store.ttl_store import TTLStore
+
+
+def test_set_and_get():
+    """测试基本读写"""
+    store = TTLStore(maxsize=4, ttl=60)
+    store.set("a", {"items": [1]})
+    assert store.get("a") == {"items": [1]}
+    assert store.get("missing", "default") == "default"
+    assert "a" in store
+
+
+def test_entries_expire():
+    """测试条目过期后不可读取"""
+    store = TTLStore(maxsize=4, ttl=60)
+    store.set("a", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_evicts_least_recently_used():
+    """测试超过容量时淘汰最久未访问的条目"""
+    store = TTLStore(maxsize=2, ttl=60)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
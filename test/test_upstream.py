@@ -0,0 +1,105 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import agentscope
+
+from core.ai_diagnosis import upstream
+from core.ai_diagnosis.upstream import (Upstream, UpstreamPool,
+                                        init_agentscope, load_upstream_configs)
+
+
+def make_pool(count=2, **kwargs):
+    upstreams = [
+        Upstream("test", f"u{index}", f"http://127.0.0.1:{9000 + index}/v1", "key", "model", {})
+        for index in range(count)
+    ]
+    return UpstreamPool("test", upstreams, probe_interval=0, **kwargs)
+
+
+def test_least_inflight_selection():
+    """测试优先选择进行中请求最少的上游"""
+    pool = make_pool()
+    with pool.lease() as first:
+        with pool.lease() as second:
+            assert first is not second
+    stats = pool.stats()["upstreams"]
+    assert [item["requests"] for item in stats] == [1, 1]
+    assert all(item["in_flight"] == 0 for item in stats)
+
+
+def test_latency_strategy_prefers_fast_upstream():
+    """测试按 EWMA 延迟选择时优先选择更快的上游"""
+    pool = make_pool(strategy="latency")
+    pool.upstreams[0].ewma_latency = 2.0
+    pool.upstreams[1].ewma_latency = 0.5
+    for _ in range(3):
+        with pool.lease() as model:
+            assert model is pool.upstreams[1].model
+
+
+def test_failing_upstream_is_ejected_and_restored():
+    """测试连续失败的上游被摘除，探测成功后重新加入"""
+    pool = make_pool(eject_failures=2)
+    bad = pool.upstreams[0]
+    # 让另一个上游保持繁忙，使请求落在第一个上游
+    pool.upstreams[1].in_flight = 1
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            with pool.lease() as model:
+                assert model is bad.model
+                raise RuntimeError("upstream down")
+    pool.upstreams[1].in_flight = 0
+    assert not bad.healthy
+    assert bad.stats()["errors"] == 2
+
+    with pool.lease() as model:
+        assert model is pool.upstreams[1].model
+
+    bad.probe = lambda timeout: True
+    pool.upstreams[1].probe = lambda timeout: True
+    pool.probe_all()
+    assert bad.healthy and bad.consecutive_failures == 0
+
+
+def test_load_upstream_configs(monkeypatch):
+    """测试引擎专属配置优先，缺省字段沿用单个上游配置"""
+    monkeypatch.setenv("base_url", "http://default/v1")
+    monkeypatch.setenv("api_key", "default-key")
+    monkeypatch.setenv("model_name", "default-model")
+    monkeypatch.setenv("upstreams", json.dumps([{"base_url": "http://a/v1"}]))
+    monkeypatch.setenv("herb_upstreams", json.dumps([
+        {"name": "gpu-1", "base_url": "http://b/v1", "model_name": "herb-model"},
+        {"base_url": "http://c/v1"},
+    ]))
+
+    configs = load_upstream_configs("diagnosis")
+    assert configs == [{"base_url": "http://a/v1", "api_key": "default-key",
+                        "model_name": "default-model", "name": "a"}]
+
+    configs = load_upstream_configs("herb")
+    assert [config["name"] for config in configs] == ["gpu-1", "c"]
+    assert configs[0]["model_name"] == "herb-model"
+
+    monkeypatch.delenv("upstreams")
+    assert load_upstream_configs("diagnosis")[0]["base_url"] == "http://default/v1"
+
+
+def test_registered_model_config_is_serializable(monkeypatch):
+    """测试注册到 agentscope 的模型配置不含共享的 HTTP 客户端，state_dict 可以深拷贝"""
+    # 跳过 agentscope.init，避免在工作目录下创建运行目录
+    monkeypatch.setattr(upstream, "_agentscope_initialized", True)
+    init_agentscope({
+        "config_name": "upstream_test",
+        "model_type": "openai_chat",
+        "model_name": "model",
+        "api_key": "key",
+        "client_args": {"base_url": "http://127.0.0.1:9000/v1"},
+    })
+    agentscope.state_dict()
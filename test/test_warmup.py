@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到系统路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import core.ai_diagnosis.warmup as warmup
+from utils.cache.persistent_cache import PersistentCache, make_cache_key
+
+LOG_LINES = [
+    "2025-07-31 17:55:19.857 | INFO | 1 | MainThread | backend.routers.diagnosis:create_diagnosis:32 | 开始处理诊断请求: 犬咳嗽三天",
+    "2025-07-31 17:56:19.857 | INFO | 1 | MainThread | backend.routers.diagnosis:create_diagnosis:32 | 开始处理诊断请求: 犬咳嗽三天",
+    "2025-07-31 17:57:19.857 | INFO | 1 | MainThread | backend.routers.diagnosis:create_diagnosis:32 | 开始处理诊断请求: 猫呕吐",
+    "2025-07-31 17:58:19.857 | INFO | 1 | MainThread | backend.routers.diagnosis:create_diagnosis:95 | 开始处理中医诊断请求: 犬腹泻",
+    "2025-07-31 17:59:19.857 | INFO | 1 | MainThread | backend.routers.diagnosis:_create_shortlist:156 | 开始处理两阶段诊断请求(diagnosis): 猫打喷嚏",
+]
+
+
+class FakeEngine:
+    def __init__(self):
+        self.calls = []
+
+    def _cache_key(self, desc, max_results):
+        return make_cache_key("diagnosis", "model", "prompt", desc, max_results=max_results)
+
+    def _semantic_namespace(self, max_results):
+        return f"diagnosis:model:table:prompt:{max_results}"
+
+    def diagnosis(self, desc, max_results=None):
+        self.calls.append(desc)
+        return [{"disease": desc, "p": 0.9}]
+
+
+def test_harvest_log_descriptions(tmp_path):
+    """测试按引擎统计请求日志中的描述，忽略两阶段诊断"""
+    (tmp_path / "server.log").write_text("\n".join(LOG_LINES), encoding="utf-8")
+    counts = warmup.harvest_log_descriptions([str(tmp_path / "server*.log")])
+    assert counts["diagnosis"] == {"犬咳嗽三天": 2, "猫呕吐": 1}
+    assert counts["herb_diagnosis"] == {"犬腹泻": 1}
+
+
+def test_warm_up_respects_call_budget(tmp_path, monkeypatch):
+    """测试已缓存的描述不调用模型，模型调用次数不超过预算"""
+    (tmp_path / "server.log").write_text("\n".join(LOG_LINES), encoding="utf-8")
+    store = PersistentCache(str(tmp_path / "cache.db"))
+    engine = FakeEngine()
+    max_results = warmup.resolve_max_results(None)
+    store.set(engine._cache_key("已缓存", max_results), "diagnosis", "已缓存", [{"disease": "x"}])
+    monkeypatch.setattr(warmup, "get_persistent_cache", lambda: store)
+
+    stats = warmup.warm_up({"diagnosis": lambda: engine}, top_n=10, max_calls=1,
+                           log_paths=[str(tmp_path / "server.log")])
+    assert engine.calls == ["犬咳嗽三天"]
+    assert stats["loaded"] == 1
+    assert stats["generated"] == 1
+    assert stats["skipped"] == 1
+    # 预热读取不计入命中次数
+    assert store.top_descriptions("diagnosis")[0]["hits"] == 0
+    store.close()
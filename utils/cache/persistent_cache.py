@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+from utils.cache.semantic_cache import normalize_description
+
+DEFAULT_PATH = "data/diagnosis_cache.db"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# 每写入多少条执行一次过期清理与容量检查
+COMPACT_EVERY = 256
+# 清理到容量上限的该比例以下，避免每次写入都触发淘汰
+COMPACT_TARGET_RATIO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnosis_cache (
+    key TEXT PRIMARY KEY,
+    engine TEXT NOT NULL,
+    description TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_cache_expires ON diagnosis_cache (expires);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_cache_last_access ON diagnosis_cache (last_access);
+"""
+
+
+def make_cache_key(engine: str, model: str, prompt: str, description: str, **params: Any) -> str:
+    """
+    由引擎、模型、提示词哈希与规范化后的描述生成缓存键
+
+    提示词或模型变化后旧结果自然失效；params 用于区分 max_results 等影响输出的参数。
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    extra = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    raw = "\x1f".join([engine, model, prompt_hash, normalize_description(description), extra])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PersistentCache:
+    """
+    基于 SQLite（WAL 模式）的诊断结果缓存，多个 worker 进程共享同一个文件，重启后仍然有效
+
+    每个线程使用独立的连接，写冲突由 busy_timeout 等待。过期条目在写入时周期性清理，
+    总大小超过上限时按最近访问时间淘汰，释放的页面通过增量 vacuum 归还给文件系统。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        busy_timeout: float = 5,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._open()) as conn:
+            # auto_vacuum 只能在建表前设置，对已有文件不生效
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.executescript(_SCHEMA)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid != os.getpid():
+            # fork 继承的连接不能在子进程中使用，也不能关闭（会破坏父进程的 WAL 状态），只保留引用
+            _inherited_connections.append(conn)
+            conn = None
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self) -> None:
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def get(self, key: str, touch: bool = True) -> Optional[Any]:
+        """
+        读取未过期的缓存结果
+
+        Args:
+            key: 缓存键
+            touch: 是否计为一次命中并更新访问时间，预热等内部读取应传 False
+        """
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM diagnosis_cache WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        if not touch:
+            return json.loads(row[0]) if row is not None else None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            conn.execute(
+                "UPDATE diagnosis_cache SET hits = hits + 1, last_access = ? WHERE key = ?", (now, key)
+            )
+        except sqlite3.OperationalError as e:
+            # 其他进程长时间持有写锁时放弃更新统计，不影响返回结果
+            logger.warning(f"更新缓存访问时间失败: {e}")
+        return json.loads(row[0])
+
+    def set(self, key: str, engine: str, description: str, value: Any, ttl: Optional[float] = None) -> None:
+        """写入诊断结果，相同键覆盖原条目并保留命中次数"""
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                INSERT INTO diagnosis_cache (key, engine, description, value, size, created, expires, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value, size = excluded.size, created = excluded.created,
+                    expires = excluded.expires, last_access = excluded.last_access
+                """,
+                (key, engine, description, payload, len(payload.encode("utf-8")), now, expires, now),
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"写入持久化缓存失败: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % COMPACT_EVERY == 0
+        if due:
+            self.compact()
+
+    def compact(self) -> Dict[str, int]:
+        """删除过期条目，总大小超过上限时按最近访问时间淘汰，并归还空闲页面"""
+        conn = self._connect()
+        try:
+            expired = conn.execute("DELETE FROM diagnosis_cache WHERE expires <= ?", (time.time(),)).rowcount
+            evicted = 0
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM diagnosis_cache").fetchone()[0]
+            if total > self.max_bytes:
+                target = int(self.max_bytes * COMPACT_TARGET_RATIO)
+                # 按访问时间从旧到新累计大小，删除超出目标的部分
+                evicted = conn.execute(
+                    """
+                    DELETE FROM diagnosis_cache WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS kept
+                            FROM diagnosis_cache
+                        ) WHERE kept > ?
+                    )
+                    """,
+                    (target,),
+                ).rowcount
+            conn.execute("PRAGMA incremental_vacuum")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"持久化缓存清理失败: {e}")
+            return {"expired": 0, "evicted": 0}
+        if expired or evicted:
+            logger.info(f"持久化缓存清理：过期 {expired} 条，淘汰 {evicted} 条")
+        return {"expired": expired, "evicted": evicted}
+
+    def top_descriptions(self, engine: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """按命中次数从高到低返回未过期条目的描述"""
+        sql = "SELECT engine, description, hits FROM diagnosis_cache WHERE expires > ?"
+        args: List[Any] = [time.time()]
+        if engine:
+            sql += " AND engine = ?"
+            args.append(engine)
+        sql += " ORDER BY hits DESC, last_access DESC LIMIT ?"
+        args.append(limit)
+        rows = self._connect().execute(sql, args).fetchall()
+        return [{"engine": row[0], "description": row[1], "hits": row[2]} for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM diagnosis_cache"
+        ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_inherited_connections: List[sqlite3.Connection] = []
+_cache: Optional[PersistentCache] = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_persistent_cache() -> Optional[PersistentCache]:
+    """
+    获取进程级持久化缓存，未通过环境变量 persistent_cache=true 启用时返回 None
+
+    文件路径、过期时间与容量上限通过 persistent_cache_path、persistent_cache_ttl、
+    persistent_cache_max_mb 配置。
+    """
+    global _cache, _cache_loaded
+    if _cache_loaded:
+        return _cache
+    with _cache_lock:
+        if not _cache_loaded:
+            load_dotenv(".env")
+            if os.getenv("persistent_cache", "false").strip().lower() in ("1", "true", "yes"):
+                try:
+                    _cache = PersistentCache(
+                        path=os.getenv("persistent_cache_path", DEFAULT_PATH),
+                        ttl=float(os.getenv("persistent_cache_ttl", DEFAULT_TTL)),
+                        max_bytes=int(float(os.getenv("persistent_cache_max_mb", DEFAULT_MAX_BYTES / 1024 / 1024))
+                                      * 1024 * 1024),
+                    )
+                except sqlite3.Error as e:
+                    logger.error(f"持久化缓存初始化失败，已禁用: {e}")
+            _cache_loaded = True
+    return _cache
+
+
+def persistent_cache_metrics() -> Dict[str, Any]:
+    """持久化缓存的条目数、占用空间与命中情况"""
+    return _cache.stats() if _cache is not None else {}
@@ -0,0 +1,341 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# 去掉空白和标点后再切分 n-gram，使语序、标点不同的描述得到相近的向量
+_STRIP_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+DEFAULT_DIM = 1024
+DEFAULT_NGRAMS = (1, 2, 3)
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 100_000
+# 所有命名空间的向量矩阵合计占用的内存上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 只差一个字就改变诊断的关键信息，命中前要求与缓存条目完全一致
+SPECIES = {
+    "犬": "犬", "狗": "犬", "猫": "猫", "兔": "兔", "仓鼠": "仓鼠", "豚鼠": "豚鼠", "龙猫": "龙猫",
+    "鹦鹉": "鸟", "鸟": "鸟", "雪貂": "雪貂", "貂": "雪貂", "龟": "龟", "蜥蜴": "蜥蜴", "蛇": "蛇",
+    "猪": "猪", "牛": "牛", "羊": "羊", "马": "马", "鸡": "鸡", "鸭": "鸭",
+}
+SEXES = {
+    "公": "公", "雄": "公", "母": "母", "雌": "母", "绝育": "绝育", "去势": "绝育", "已阉": "绝育",
+    "怀孕": "妊娠", "妊娠": "妊娠", "哺乳": "哺乳",
+}
+_SPECIES_RE = re.compile("|".join(sorted(SPECIES, key=len, reverse=True)))
+# “公斤”“公里”中的“公”不是性别
+_SEX_RE = re.compile(f"(?:{'|'.join(sorted(SEXES, key=len, reverse=True))})(?![斤里分])")
+# 否定词连同其后两个字一起比较，“无便血”与“便血”、“不吃”与“吃”不会被当作同一病例
+_NEGATION_RE = re.compile(r"(?:没有|否认|未见|并无|无|没|未|不|非|否)[^\s\W\d_]{0,2}", re.UNICODE)
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_UNITS = {"日": "天", "星期": "周", "礼拜": "周", "个月": "月", "个小时": "小时", "钟头": "小时", "公斤": "kg",
+          "千克": "kg", "°c": "℃", "度": "℃"}
+_QUANTITY_RE = re.compile(
+    r"(\d+(?:\.\d+)?|[零一二两三四五六七八九十半]+)\s*"
+    r"(个月|个小时|小时|钟头|星期|礼拜|分钟|天|日|周|月|年|岁|次|kg|公斤|千克|斤|g|克|°c|℃|度|ml|毫升)?"
+)
+
+
+def normalize_description(text: str) -> str:
+    """全角转半角、统一小写并去掉空白与标点"""
+    return _STRIP_RE.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def _parse_number(token: str) -> str:
+    """阿拉伯数字原样返回，一百以内的中文数字与“半”转成阿拉伯数字"""
+    if token[0].isdigit():
+        return token
+    if token == "半":
+        return "0.5"
+    if "十" in token:
+        tens, _, ones = token.partition("十")
+        return str(_CN_DIGITS.get(tens, 1) * 10 + _CN_DIGITS.get(ones, 0))
+    return "".join(str(_CN_DIGITS.get(char, char)) for char in token)
+
+
+def clinical_signature(text: str) -> Tuple[Tuple[str, ...], ...]:
+    """
+    提取描述中的物种、性别、否定词与数量/时长
+
+    这些信息在字符 n-gram 向量中只占一两个特征，“猫”与“狗”、“两周”与“两天”的相似度
+    仍可能超过阈值，因此近似缓存命中前要求签名完全一致。
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    species = {SPECIES[match] for match in _SPECIES_RE.findall(text)}
+    sexes = {SEXES[match] for match in _SEX_RE.findall(text)}
+    negations = set(_NEGATION_RE.findall(text))
+    quantities = set()
+    for number, unit in _QUANTITY_RE.findall(text):
+        quantities.add(f"{_parse_number(number)}{_UNITS.get(unit, unit)}")
+    return tuple(tuple(sorted(group)) for group in (species, sexes, negations, quantities))
+
+
+class HashedNgramVectorizer:
+    """
+    字符 n-gram 特征哈希到固定维度，不依赖词表和外部向量服务
+
+    词频使用 1 + log(tf) 的次线性缩放，IDF 由 SemanticCache 按已缓存的描述统计。
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM, ngrams: Tuple[int, ...] = DEFAULT_NGRAMS):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def transform(self, text: str) -> np.ndarray:
+        normalized = normalize_description(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for n in self.ngrams:
+            for index in range(len(normalized) - n + 1):
+                gram = normalized[index:index + n]
+                vector[zlib.crc32(gram.encode("utf-8")) % self.dim] += 1
+        nonzero = vector > 0
+        vector[nonzero] = 1 + np.log(vector[nonzero])
+        return vector
+
+
+def _signature_hash(text: str) -> int:
+    raw = "\x1f".join("\x1e".join(group) for group in clinical_signature(text))
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class MemoryBudget:
+    """
+    多个命名空间共享的内存预算，按行预留向量矩阵的空间
+
+    各命名空间扩容前先从预算中预留新增行，预算用完后只能覆盖自身最早写入的条目，
+    因此命名空间再多，矩阵合计占用也不超过 max_bytes。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, rows: int, row_bytes: int) -> int:
+        """预留最多 rows 行，返回实际预留的行数，预算不足时可能少于 rows 或为 0"""
+        with self._lock:
+            granted = max(min(rows, (self.max_bytes - self.used) // row_bytes), 0)
+            self.used += granted * row_bytes
+            return granted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"max_bytes": self.max_bytes, "used_bytes": self.used}
+
+
+class SemanticCache:
+    """
+    基于字符 n-gram TF-IDF 向量的近似缓存，余弦相似度 top-1 检索
+
+    向量按行存放在预分配的 NumPy 矩阵中，条目满时覆盖最早写入的条目。IDF 在条目数
+    每增长一倍时重新计算，两次重算之间保持不变，因此每行的加权范数可以预先算好，
+    检索只需一次矩阵向量乘法。只在 clinical_signature 与查询完全一致的条目中检索，
+    物种、性别、否定与时长不同的描述即使相似度很高也不会命中。
+    传入 budget 时扩容受共享预算限制，预算用完后容量固定为已分配的行数。
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: Optional[float] = None,
+        dim: int = DEFAULT_DIM,
+        budget: Optional[MemoryBudget] = None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.budget = budget
+        self._lock = threading.Lock()
+
+        # 每行 TF 向量、范数、写入时间与签名占用的字节数
+        self._row_bytes = dim * 4 + 4 + 8 + 8
+        capacity = self._reserve(min(1024, max_entries))
+        self._tf = np.zeros((capacity, dim), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._values: List[Any] = [None] * capacity
+        self._keys: List[Optional[str]] = [None] * capacity
+        # 签名的哈希，检索时用于一次性过滤签名不同的条目
+        self._signatures = np.zeros(capacity, dtype=np.int64)
+        self._rows: Dict[str, int] = {}
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._idf = np.ones(dim, dtype=np.float32)
+        self._size = 0
+        self._next = 0
+        self._fitted_size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, rows: int) -> int:
+        return rows if self.budget is None else self.budget.reserve(rows, self._row_bytes)
+
+    def _grow(self) -> None:
+        extra = self._reserve(min(self.max_entries, max(len(self._tf) * 2, 1024)) - len(self._tf))
+        if extra == 0:
+            # 预算已用完，容量固定为已分配的行数，之后覆盖最早写入的条目
+            self.max_entries = len(self._tf)
+            self._next %= max(self.max_entries, 1)
+            return
+        self._tf = np.vstack([self._tf, np.zeros((extra, self._tf.shape[1]), dtype=np.float32)])
+        self._norms = np.concatenate([self._norms, np.zeros(extra, dtype=np.float32)])
+        self._created = np.concatenate([self._created, np.zeros(extra, dtype=np.float64)])
+        self._signatures = np.concatenate([self._signatures, np.zeros(extra, dtype=np.int64)])
+        self._values.extend([None] * extra)
+        self._keys.extend([None] * extra)
+
+    def _refit(self) -> None:
+        """按当前条目重新计算 IDF 与各行的加权范数"""
+        self._idf = (np.log((1 + self._size) / (1 + self._df)) + 1).astype(np.float32)
+        tf = self._tf[:self._size]
+        self._norms[:self._size] = np.sqrt(np.square(tf * self._idf).sum(axis=1))
+        self._fitted_size = self._size
+
+    def add(self, description: str, value: Any) -> None:
+        """写入一条描述及其诊断结果，规范化后相同的描述覆盖原条目"""
+        key = normalize_description(description)
+        if not key:
+            return
+        tf = self.vectorizer.transform(description)
+        signature = _signature_hash(description)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                self._df -= self._tf[row] > 0
+            else:
+                if self._size == len(self._tf) and self._size < self.max_entries:
+                    self._grow()
+                if self.max_entries == 0:
+                    return
+                row = self._next
+                if self._size == self.max_entries:
+                    # 覆盖最早写入的条目
+                    self._df -= self._tf[row] > 0
+                    del self._rows[self._keys[row]]
+                else:
+                    self._size += 1
+                self._next = (self._next + 1) % self.max_entries
+                self._rows[key] = row
+
+            self._tf[row] = tf
+            self._df += tf > 0
+            self._created[row] = time.time()
+            self._signatures[row] = signature
+            self._values[row] = value
+            self._keys[row] = key
+            self._norms[row] = np.linalg.norm(tf * self._idf)
+            if self._size >= max(2 * self._fitted_size, 16):
+                self._refit()
+
+    def search(self, description: str) -> Optional[Tuple[Any, float, str]]:
+        """
+        在签名一致的条目中检索最相似的一条缓存
+
+        Returns:
+            Optional[tuple]: (缓存的值, 余弦相似度, 命中条目的规范化描述)，没有签名一致的条目时返回 None
+        """
+        query = self.vectorizer.transform(description)
+        signature = _signature_hash(description)
+        with self._lock:
+            if self._size == 0:
+                return None
+            weighted = query * self._idf
+            query_norm = np.linalg.norm(weighted)
+            if query_norm == 0:
+                return None
+            sims = self._tf[:self._size] @ (weighted * self._idf)
+            sims /= np.maximum(self._norms[:self._size], 1e-12) * query_norm
+            if self.ttl:
+                sims[self._created[:self._size] < time.time() - self.ttl] = -1
+            sims[self._signatures[:self._size] != signature] = -2
+            row = int(np.argmax(sims))
+            if sims[row] == -2:
+                return None
+            return self._values[row], float(sims[row]), self._keys[row]
+
+    def lookup(self, description: str) -> Optional[Tuple[Any, float]]:
+        """相似度达到阈值时返回 (缓存的值, 相似度)，否则返回 None"""
+        found = self.search(description)
+        hit = found is not None and found[1] >= self.threshold
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return (found[0], found[1]) if hit else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "bytes": len(self._tf) * self._row_bytes,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+_budget: Optional[MemoryBudget] = None
+
+
+_enabled: Optional[bool] = None
+
+
+def semantic_cache_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        load_dotenv(".env")
+        _enabled = os.getenv("semantic_cache", "false").strip().lower() in ("1", "true", "yes")
+    return _enabled
+
+
+def get_semantic_cache(namespace: str) -> Optional[SemanticCache]:
+    """
+    获取指定命名空间的进程级近似缓存，未通过环境变量 semantic_cache=true 启用时返回 None
+
+    阈值、容量、过期时间与向量维度通过 semantic_cache_threshold、semantic_cache_max_entries、
+    semantic_cache_ttl、semantic_cache_dim 配置。所有命名空间共享 semantic_cache_max_mb
+    的内存预算（默认 256），max_entries 只限制单个命名空间。
+    """
+    cache = _caches.get(namespace)
+    if cache is not None:
+        return cache
+    if not semantic_cache_enabled():
+        return None
+    global _budget
+    with _caches_lock:
+        if _budget is None:
+            _budget = MemoryBudget(
+                int(float(os.getenv("semantic_cache_max_mb", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024)
+            )
+        if namespace not in _caches:
+            ttl = os.getenv("semantic_cache_ttl")
+            _caches[namespace] = SemanticCache(
+                threshold=float(os.getenv("semantic_cache_threshold", DEFAULT_THRESHOLD)),
+                max_entries=int(os.getenv("semantic_cache_max_entries", DEFAULT_MAX_ENTRIES)),
+                ttl=float(ttl) if ttl else None,
+                dim=int(os.getenv("semantic_cache_dim", DEFAULT_DIM)),
+                budget=_budget,
+            )
+        return _caches[namespace]
+
+
+def semantic_cache_metrics() -> Dict[str, Any]:
+    """各命名空间近似缓存的条目数与命中情况"""
+    return {namespace: cache.stats() for namespace, cache in list(_caches.items())}
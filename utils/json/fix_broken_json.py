@@ -1,5 +1,6 @@
 import json
 import re
+from typing import Tuple
 
 
 def fix_broken_json(text: str) -> str:
@@ -32,4 +33,75 @@ def validate_and_fix(json_string: str):
 # parsed_json = validate_and_fix(broken_json)
 # if parsed_json:
 #     print("✅ 修复并成功解析 JSON")
-#     print(json.dumps(parsed_json, ensure_ascii=False, indent=2))
\ No newline at end of file
+#     print(json.dumps(parsed_json, ensure_ascii=False, indent=2))
+
+
+def split_complete_json_objects(text: str) -> Tuple[str, int, bool]:
+    """
+    扫描 JSON 数组文本，找到最后一个完整的顶层对象
+
+    Args:
+        text (str): 可能被截断的 JSON 数组文本
+
+    Returns:
+        tuple: (截至最后一个完整对象的数组前缀, 完整对象个数, 数组是否未闭合)
+    """
+    start = text.find("[")
+    if start == -1:
+        return "", 0, False
+
+    depth = 0
+    in_string = False
+    escaped = False
+    last_end = -1
+    count = 0
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 1 and char == "}":
+                last_end = i
+                count += 1
+            elif depth == 0:
+                return text[start:i + 1], count, False
+
+    prefix = text[start:last_end + 1] if last_end != -1 else "["
+    return prefix, count, True
+
+
+def merge_json_continuation(prefix: str, continuation: str) -> str:
+    """
+    将续写的 JSON 对象拼接到截断前的数组前缀之后
+
+    结构化输出把数组包在 {"diagnoses": [...]} 中，续写往往以 ]} 结尾，或重复输出外层对象的开头；
+    拼接后只保留数组本身，数组已闭合时丢弃其后的外层对象结尾与代码块标记。
+    """
+    tail = continuation.strip()
+    # 去掉续写内容中可能重复输出的代码块标记、外层对象开头和数组起始符
+    tail = re.sub(r"^```(?:json)?", "", tail).strip()
+    tail = re.sub(r'^\{\s*"[^"]*"\s*:\s*(?=\[)', "", tail)
+    tail = tail.lstrip("[").lstrip(",").strip()
+    tail = re.sub(r"```$", "", tail).strip()
+
+    if prefix.rstrip() == "[":
+        merged = "[" + tail
+    elif tail.startswith("]") or not tail:
+        merged = prefix + (tail or "]")
+    else:
+        merged = prefix + "," + tail
+
+    array, _, truncated = split_complete_json_objects(merged)
+    return merged if truncated else array
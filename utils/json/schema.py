@@ -0,0 +1,124 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from agentscope.service import ServiceExecStatus
+
+from config.logger import logger
+from utils.react_tool.toolkit import extract_json_block, repair_broken_json
+
+# 结构化输出的根字段：OpenAI 兼容接口要求 JSON schema 根节点为对象
+ROOT_KEY = "diagnoses"
+
+# 支持的结构化输出模式
+STRUCTURED_OUTPUT_MODES = ("json_schema", "json_object")
+
+
+def build_diagnosis_schema(
+    columns: Sequence[str],
+    number_fields: Sequence[str] = ("p",),
+) -> Dict[str, Any]:
+    """
+    根据引擎定义的列生成诊断结果的 JSON schema
+
+    Args:
+        columns: 诊断结果的列名
+        number_fields: 需要输出为数字的列
+
+    Returns:
+        Dict[str, Any]: 形如 {"diagnoses": [{...}, ...]} 的 JSON schema
+    """
+    properties = {}
+    for column in columns:
+        if column in number_fields:
+            properties[column] = {"type": "number", "minimum": 0, "maximum": 1}
+        else:
+            properties[column] = {"type": "string"}
+
+    return {
+        "type": "object",
+        "properties": {
+            ROOT_KEY: {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": list(columns),
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": [ROOT_KEY],
+        "additionalProperties": False,
+    }
+
+
+def build_response_format(mode: Optional[str], name: str, columns: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """
+    生成 OpenAI 兼容接口的 response_format 参数
+
+    Args:
+        mode: "json_schema" 或 "json_object"，其他值表示不启用
+        name: schema 名称
+        columns: 诊断结果的列名
+
+    Returns:
+        Optional[Dict[str, Any]]: response_format 参数，未启用时返回 None
+    """
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "schema": build_diagnosis_schema(columns),
+                "strict": True,
+            },
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def resolve_structured_output(mode: Optional[str]) -> Optional[str]:
+    """校验结构化输出模式，不支持的取值视为关闭"""
+    if not mode:
+        return None
+    mode = mode.strip().lower()
+    if mode not in STRUCTURED_OUTPUT_MODES:
+        logger.warning(f"不支持的结构化输出模式: {mode}，已关闭")
+        return None
+    return mode
+
+
+def _rows_from(data: Any) -> Optional[List[Dict[str, Any]]]:
+    if isinstance(data, dict):
+        data = data.get(ROOT_KEY)
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return data
+    return None
+
+
+def parse_structured_output(text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    直接用 json.loads 解析结构化输出
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: 诊断列表；服务端未遵循 schema 时返回 None
+    """
+    if not text:
+        return None
+    try:
+        return _rows_from(json.loads(text))
+    except json.JSONDecodeError:
+        return None
+
+
+def repair_structured_output(text: str) -> Optional[List[Dict[str, Any]]]:
+    """服务端未遵循 schema 时的兜底：提取代码块后走正则修复流程"""
+    if not text or not text.strip():
+        return None
+    extract_res = extract_json_block(text)
+    raw_json_str = extract_res.content if extract_res.status == ServiceExecStatus.SUCCESS else text
+    repair_res = repair_broken_json(raw_json_str)
+    if repair_res.status == ServiceExecStatus.SUCCESS:
+        return _rows_from(repair_res.content)
+    return None
@@ -0,0 +1,140 @@
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# 紧凑格式支持的分隔符：制表符，或 ASCII 单元分隔符（字段内容几乎不可能出现）
+TAB = "\t"
+UNIT_SEPARATOR = "\x1f"
+DELIMITERS = {"tab": TAB, "unit": UNIT_SEPARATOR}
+
+
+def resolve_delimiter(name: Optional[str]) -> str:
+    """将配置中的分隔符名称转换为实际字符，默认制表符"""
+    return DELIMITERS.get((name or "tab").strip().lower(), TAB)
+
+
+def _header_index(header: List[str], columns: Sequence[str]) -> Optional[List[Tuple[str, int]]]:
+    """根据表头确定每个输出列在行内的位置，表头不是列名时返回 None"""
+    names = [name.strip() for name in header]
+    if not set(columns) & set(names):
+        return None
+    positions = {name: index for index, name in enumerate(names)}
+    return [(column, positions.get(column, -1)) for column in columns]
+
+
+def parse_compact_rows(
+    text: str,
+    columns: Sequence[str],
+    delimiter: str = TAB,
+    converters: Optional[Mapping[str, Callable[[str], Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    解析紧凑格式输出：一行表头，之后每行一个诊断，字段用分隔符隔开
+
+    直接生成与 format_json_diagnosis / format_json_herb_diagnosis 相同结构的字典，
+    不经过中间的行字典和二次格式化。
+
+    Args:
+        text: 模型输出
+        columns: 输出字典的列名及顺序
+        delimiter: 字段分隔符
+        converters: 需要转换类型的列，如 {"p": parse_probability}
+
+    Returns:
+        List[Dict[str, Any]]: 诊断结果列表
+    """
+    converters = converters or {}
+    column_count = len(columns)
+    layout = None
+    results = []
+
+    for line in text.splitlines():
+        if delimiter not in line:
+            continue
+        cells = line.split(delimiter)
+
+        if layout is None:
+            layout = _header_index(cells, columns)
+            if layout is not None:
+                continue
+            # 没有表头时按约定的列顺序解析
+            layout = [(column, index) for index, column in enumerate(columns)]
+
+        if len(cells) > column_count and layout[-1][1] == column_count - 1:
+            # 多出的分隔符视为最后一个字段的内容
+            cells[column_count - 1] = delimiter.join(cells[column_count - 1:])
+
+        row = {}
+        cell_count = len(cells)
+        for column, index in layout:
+            value = cells[index].strip() if 0 <= index < cell_count else ""
+            converter = converters.get(column)
+            row[column] = converter(value) if converter else value
+        results.append(row)
+
+    return results
+
+
+def render_compact_header(columns: Sequence[str], delimiter: str = TAB) -> str:
+    """生成提示词中使用的紧凑格式表头"""
+    return delimiter.join(columns)
+
+
+def split_complete_lines(text: str, delimiter: str, column_count: int) -> Tuple[str, int, bool]:
+    """
+    找到紧凑格式输出中最后一个完整的数据行
+
+    Returns:
+        tuple: (截至最后一个完整行的文本, 完整数据行数, 最后一行是否不完整)
+    """
+    lines = text.rstrip().split("\n")
+    rows = 0
+    last_complete = -1
+    incomplete = False
+    header_seen = False
+
+    for index, line in enumerate(lines):
+        if delimiter not in line:
+            continue
+        if not header_seen:
+            header_seen = True
+            last_complete = index
+            continue
+        if line.count(delimiter) >= column_count - 1:
+            rows += 1
+            last_complete = index
+            incomplete = False
+        else:
+            incomplete = True
+
+    if last_complete == -1:
+        return text, 0, False
+    return "\n".join(lines[:last_complete + 1]), rows, incomplete
+
+
+def merge_line_continuation(complete: str, continuation: str, delimiter: str) -> str:
+    """将续写的数据行拼接到已完整输出的部分之后，跳过重复的表头和行"""
+    complete_lines = complete.rstrip().split("\n")
+    header = next((line for line in complete_lines if delimiter in line), None)
+    seen = set(complete_lines)
+
+    merged = list(complete_lines)
+    for line in continuation.split("\n"):
+        if delimiter not in line or line == header or line in seen:
+            continue
+        seen.add(line)
+        merged.append(line)
+    return "\n".join(merged)
+
+
+# 诊断引擎支持的输出格式
+OUTPUT_FORMATS = ("table", "compact")
+
+
+def resolve_output_format(output_format: Optional[str]) -> str:
+    """校验输出格式，未设置或不支持的取值使用 Markdown 表格"""
+    output_format = (output_format or "table").strip().lower()
+    return output_format if output_format in OUTPUT_FORMATS else "table"
+
+
+def describe_delimiter(delimiter: str) -> str:
+    """提示词中对分隔符的描述"""
+    return "制表符(\\t)" if delimiter == TAB else "ASCII单元分隔符(\\x1f)"
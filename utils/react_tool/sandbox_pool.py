@@ -0,0 +1,271 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from agentscope.service import ServiceExecStatus, ServiceResponse
+from dotenv import load_dotenv
+
+from config.logger import logger
+from utils.react_tool.sandbox_worker import worker_main
+
+
+def _get_context():
+    """优先使用 forkserver，避免在多线程的服务进程中直接 fork"""
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class SandboxWorker:
+    """单个常驻沙箱工作进程"""
+
+    def __init__(self, ctx, memory_mb: int, cpu_seconds: int, start_timeout: float = 30):
+        self.workdir = tempfile.mkdtemp(prefix="vet_sandbox_")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(child_conn, memory_mb, cpu_seconds, self.workdir),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+        if not self.conn.poll(start_timeout):
+            self.kill()
+            raise RuntimeError("沙箱工作进程启动超时")
+        self.conn.recv()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def run(self, code: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """执行代码，超时或进程异常退出时返回 None"""
+        self.tasks += 1
+        try:
+            self.conn.send(code)
+            if not self.conn.poll(timeout):
+                return None
+            return self.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            return None
+
+    def close(self) -> None:
+        """正常退出工作进程"""
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self) -> None:
+        """强制结束工作进程并清理工作目录"""
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    预启动的沙箱进程池
+
+    工作进程常驻并预先导入常用模块，工具调用时直接复用，省去每次启动解释器的开销。
+    每个工作进程执行 max_tasks 次后回收重建，代码改写了进程级状态（见 sandbox_worker）
+    的进程立即回收；超时、超出 CPU/内存限制的进程会被直接结束，并在后台补充新的工作进程。
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_tasks: int = 50,
+        cpu_seconds: int = 30,
+        memory_mb: int = 512,
+        timeout: float = 300,
+    ):
+        self.size = max(1, size)
+        self.max_tasks = max(1, max_tasks)
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self._ctx = _get_context()
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"executed": 0, "timeouts": 0, "crashed": 0, "recycled": 0, "tainted": 0}
+
+        if self._ctx.get_start_method() == "forkserver":
+            self._ctx.set_forkserver_preload(["utils.react_tool.sandbox_worker"])
+
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        logger.info(f"沙箱进程池已启动，工作进程数: {self.size}")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _spawn(self) -> SandboxWorker:
+        return SandboxWorker(self._ctx, self.memory_mb, self.cpu_seconds)
+
+    def _replace(self, worker: SandboxWorker) -> None:
+        """在后台结束旧进程并补充新进程，避免阻塞当前工具调用"""
+
+        def _job():
+            worker.kill()
+            if self._closed:
+                return
+            try:
+                self._idle.put(self._spawn())
+            except Exception as e:
+                logger.error(f"沙箱工作进程重建失败: {e}")
+
+        threading.Thread(target=_job, name="sandbox-respawn", daemon=True).start()
+
+    def _release(self, worker: SandboxWorker, tainted: bool = False) -> None:
+        if self._closed:
+            worker.close()
+        elif tainted:
+            self._count("tainted")
+            self._replace(worker)
+        elif worker.tasks >= self.max_tasks:
+            self._count("recycled")
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+    def execute(self, code: str, timeout: Optional[float] = None) -> ServiceResponse:
+        """
+        在空闲的工作进程中执行代码
+
+        Args:
+            code (str): 需要执行的 Python 代码
+            timeout (float): 墙钟超时时间（秒），默认使用进程池配置
+
+        Returns:
+            ServiceResponse: 与 agentscope 的 execute_python_code 保持相同的输出格式
+        """
+        if self._closed:
+            raise RuntimeError("沙箱进程池已关闭")
+
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        # 等待空闲进程与执行代码共用同一个截止时间，整个调用最多阻塞 timeout 秒
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            worker = None
+        remaining = deadline - time.monotonic()
+        if worker is not None and remaining <= 0:
+            self._release(worker)
+            worker = None
+        if worker is None:
+            return ServiceResponse(
+                status=ServiceExecStatus.ERROR,
+                content=(
+                    "<returncode>-1</returncode>\n"
+                    "<stdout></stdout>\n"
+                    "<stderr>Error: no sandbox worker available</stderr>"
+                ),
+            )
+        result = worker.run(code, remaining)
+        elapsed = time.perf_counter() - started
+        self._count("executed")
+
+        if result is None:
+            if worker.is_alive():
+                self._count("timeouts")
+                message = (
+                    f"Error: Python code execution timeout after {timeout} seconds. "
+                    "Consider increasing the timeout value or adjusting your code"
+                )
+            else:
+                self._count("crashed")
+                message = (
+                    "Error: sandbox worker exited unexpectedly, the code may exceed "
+                    f"the CPU ({self.cpu_seconds}s) or memory ({self.memory_mb}MB) limit"
+                )
+            logger.warning(f"沙箱执行失败（pid={worker.pid}）: {message}")
+            self._replace(worker)
+            return ServiceResponse(
+                status=ServiceExecStatus.ERROR,
+                content=(
+                    "<returncode>-1</returncode>\n"
+                    "<stdout></stdout>\n"
+                    f"<stderr>{message}</stderr>"
+                ),
+            )
+
+        self._release(worker, result.get("tainted", False))
+        logger.debug(f"沙箱执行完成，耗时 {elapsed * 1000:.1f} ms")
+        return ServiceResponse(
+            status=ServiceExecStatus.SUCCESS,
+            content=(
+                f"<returncode>{result['returncode']}</returncode>\n"
+                f"<stdout>{result['stdout']}</stdout>\n"
+                f"<stderr>{result['stderr']}</stderr>"
+            ),
+        )
+
+    def shutdown(self) -> None:
+        """关闭所有空闲工作进程"""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.close()
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """获取进程级共享的沙箱进程池，首次调用时根据环境变量创建"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                load_dotenv(".env")
+                _pool = SandboxPool(
+                    size=int(os.getenv("sandbox_pool_size", "2")),
+                    max_tasks=int(os.getenv("sandbox_max_tasks", "50")),
+                    cpu_seconds=int(os.getenv("sandbox_cpu_seconds", "30")),
+                    memory_mb=int(os.getenv("sandbox_memory_mb", "512")),
+                    timeout=float(os.getenv("sandbox_timeout", "300")),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def execute_python_code(code: str, timeout: float = 300, **kwargs: Any) -> ServiceResponse:
+    """Execute the given python code in a warm sandbox worker and capture the return code, standard output and error. Note you must `print` the output to get the result.
+
+    Args:
+        code (`str`):
+            The Python code to be executed.
+        timeout (`float`, defaults to `300`):
+            The maximum time (in seconds) allowed for the code to run.
+
+    Returns:
+        `ServiceResponse`:
+            The status field indicates whether the code execution was
+            successful. The content field contains the return code,
+            standard output, and standard error of the executed code.
+    """  # noqa
+    return get_sandbox_pool().execute(code, timeout=timeout)
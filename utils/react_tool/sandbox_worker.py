@@ -0,0 +1,166 @@
+"""
+沙箱工作进程
+
+由 sandbox_pool 预先拉起，常驻等待执行代码任务。本模块只依赖标准库，
+保证工作进程启动足够轻量。
+
+同一工作进程中先后执行的代码之间的隔离：
+- 每次执行使用新的全局命名空间和一份 builtins 的拷贝，改写 __builtins__ 只影响本次执行；
+- 执行后检查 builtins、sys、os 与预导入模块的属性、已导入模块的标识、环境变量和工作目录，
+  发生变化时在结果中标记 tainted，进程池随即回收该工作进程，不再复用。
+
+仍然存在的限制：检查只比较对象标识，不会发现对已有对象内部状态的修改（如修改某个类的属性、
+json 模块内部编码器的状态），也不检查本次执行中新导入模块的状态、启动的线程和打开的文件。
+这些状态可能被同一工作进程后续执行的代码看到，直到该进程执行满 max_tasks 次后被回收。
+需要严格隔离时应将 max_tasks 设为 1。
+"""
+import builtins
+import contextlib
+import io
+import os
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows 不支持 resource 模块
+    resource = None
+
+
+# 预先导入的常用模块，避免每次执行代码时重复导入
+PRELOAD_MODULES = ["json", "math", "re", "statistics", "datetime", "collections"]
+# 执行后检查属性是否被改写的模块
+WATCHED_MODULES = ["builtins", "sys", "os", "io", *PRELOAD_MODULES]
+
+
+def _apply_memory_limit(memory_mb: int) -> None:
+    """限制工作进程可用的虚拟内存"""
+    if resource is None or not memory_mb:
+        return
+    limit = memory_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        # 部分平台（如 macOS）不支持 RLIMIT_AS
+        pass
+
+
+def _apply_cpu_limit(cpu_seconds: int) -> None:
+    """
+    为本次任务设置 CPU 时间上限
+
+    RLIMIT_CPU 是进程累计值，因此每次任务都在已用 CPU 时间的基础上追加额度，
+    超限后进程会收到 SIGXCPU 被终止，由进程池负责补充新的工作进程。
+    """
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _shared_state() -> dict:
+    """后续执行会看到的进程级状态的快照，只记录对象标识，开销很小"""
+    modules = dict(sys.modules)
+    return {
+        "modules": {name: id(module) for name, module in modules.items()},
+        "attrs": {
+            name: {key: id(value) for key, value in vars(modules[name]).items()}
+            for name in WATCHED_MODULES if name in modules
+        },
+        "environ": dict(os.environ),
+        "cwd": os.getcwd(),
+    }
+
+
+def _state_changed(before: dict) -> bool:
+    """执行前已有的状态是否被修改或删除；新导入的模块与子模块属性不算修改"""
+    after = _shared_state()
+    if after["environ"] != before["environ"] or after["cwd"] != before["cwd"]:
+        return True
+    for name, module_id in before["modules"].items():
+        if after["modules"].get(name) != module_id:
+            return True
+    for name, attrs in before["attrs"].items():
+        current = after["attrs"].get(name, {})
+        if any(current.get(key) != value_id for key, value_id in attrs.items()):
+            return True
+        added = current.keys() - attrs.keys()
+        if any(not isinstance(vars(sys.modules[name]).get(key), type(sys)) for key in added):
+            return True
+    return False
+
+
+def _run_code(code: str) -> dict:
+    """
+    在全新的全局命名空间与 builtins 拷贝中执行代码，并捕获标准输出和标准错误
+
+    Returns:
+        dict: returncode、stdout、stderr，以及进程级状态是否被修改的 tainted
+    """
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    returncode = 0
+    before = _shared_state()
+    namespace = {"__name__": "__main__", "__builtins__": dict(builtins.__dict__)}
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(code, "<sandbox>", "exec"), namespace)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=stderr)
+                returncode = 1
+        except BaseException:
+            traceback.print_exc(file=stderr)
+            returncode = 1
+
+    return {
+        "returncode": returncode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "tainted": _state_changed(before),
+    }
+
+
+def worker_main(conn, memory_mb: int, cpu_seconds: int, workdir: str) -> None:
+    """
+    工作进程主循环
+
+    Args:
+        conn: 与进程池通信的管道端点
+        memory_mb: 内存上限（MB），0 表示不限制
+        cpu_seconds: 单次任务 CPU 时间上限（秒），0 表示不限制
+        workdir: 工作目录
+    """
+    for name in PRELOAD_MODULES:
+        __import__(name)
+
+    _apply_memory_limit(memory_mb)
+    if workdir:
+        os.chdir(workdir)
+
+    # 通知进程池已就绪
+    conn.send({"ready": True, "pid": os.getpid()})
+
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+
+        _apply_cpu_limit(cpu_seconds)
+        conn.send(_run_code(code))
+
+    conn.close()
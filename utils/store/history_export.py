@@ -0,0 +1,213 @@
+"""
+诊断历史批量导出：按块流式读取，写入 Parquet 或分片 JSONL，内存占用与总条数无关
+
+命令行用法：
+    python -m utils.store.history_export --format parquet --output exports/history.parquet \
+        --engine diagnosis --start 2025-07-01 --end 2025-08-01
+"""
+import argparse
+import gzip
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from utils.store.history_store import HISTORY_COLUMNS, HistoryStore, get_history_store
+
+EXPORT_FORMATS = ("parquet", "jsonl")
+DEFAULT_ROW_GROUP_SIZE = 50_000
+DEFAULT_SHARD_ROWS = 100_000
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow：pip install pyarrow") from e
+    return pa, pq
+
+
+def _parquet_schema(pa):
+    # result、timings 的字段随引擎变化，保留为 JSON 字符串
+    return pa.schema([
+        ("id", pa.int64()),
+        ("created_at", pa.timestamp("ms", tz="UTC")),
+        ("engine", pa.string()),
+        ("model", pa.string()),
+        ("source", pa.string()),
+        ("description", pa.string()),
+        ("raw_output", pa.string()),
+        ("result", pa.string()),
+        ("timings", pa.string()),
+    ])
+
+
+def _chunk_to_table(pa, schema, rows: List[tuple]):
+    df = pd.DataFrame.from_records(rows, columns=HISTORY_COLUMNS)
+    df.insert(1, "created_at", pd.to_datetime(df.pop("created"), unit="s", utc=True).dt.floor("ms"))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class _ChunkSink:
+    """
+    供 ParquetWriter 写入的内存缓冲，每写完一个 row group 取出已写入的字节
+
+    tell() 返回累计写入的字节数，Parquet 页脚中的偏移量因此与完整文件一致。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet_bytes(
+    store: HistoryStore,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    **filters: Any,
+) -> Iterator[bytes]:
+    """逐个 row group 生成 Parquet 文件内容，用于流式响应"""
+    pa, pq = _require_pyarrow()
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        for rows in store.iter_chunks(chunk_size=row_group_size, **filters):
+            writer.write_table(_chunk_to_table(pa, schema, rows), row_group_size=row_group_size)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_parquet(
+    store: HistoryStore,
+    output: str,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    **filters: Any,
+) -> Dict[str, Any]:
+    """
+    导出为单个 Parquet 文件，每次读取一个 row group 的记录
+
+    Args:
+        store: 诊断历史存储
+        output: 输出文件路径
+        row_group_size: 每个 row group 的行数，同时是每次读取的记录数
+        filters: engine、start、end 过滤条件
+
+    Returns:
+        Dict[str, Any]: 输出文件与导出行数
+    """
+    pa, pq = _require_pyarrow()
+    schema = _parquet_schema(pa)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for rows in store.iter_chunks(chunk_size=row_group_size, **filters):
+            writer.write_table(_chunk_to_table(pa, schema, rows), row_group_size=row_group_size)
+            count += len(rows)
+    return {"files": [output], "rows": count}
+
+
+def iter_jsonl_lines(store: HistoryStore, chunk_size: int = 1000, **filters: Any) -> Iterator[str]:
+    """逐条生成 JSONL 行，结构与历史查询接口一致"""
+    for rows in store.iter_chunks(chunk_size=chunk_size, **filters):
+        yield "".join(json.dumps(HistoryStore.to_dict(row), ensure_ascii=False) + "\n" for row in rows)
+
+
+def export_jsonl(
+    store: HistoryStore,
+    output_dir: str,
+    shard_rows: int = DEFAULT_SHARD_ROWS,
+    compress: bool = False,
+    **filters: Any,
+) -> Dict[str, Any]:
+    """
+    导出为分片 JSONL 文件 history-00000.jsonl[.gz]，每个分片最多 shard_rows 行
+
+    Returns:
+        Dict[str, Any]: 输出文件列表与导出行数
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    suffix = ".jsonl.gz" if compress else ".jsonl"
+    files: List[str] = []
+    count = 0
+    handle = None
+    try:
+        for rows in store.iter_chunks(chunk_size=min(shard_rows, 10_000), **filters):
+            for row in rows:
+                if count % shard_rows == 0:
+                    if handle is not None:
+                        handle.close()
+                    path = str(Path(output_dir) / f"history-{len(files):05d}{suffix}")
+                    handle = gzip.open(path, "wt", encoding="utf-8") if compress else open(path, "w", encoding="utf-8")
+                    files.append(path)
+                handle.write(json.dumps(HistoryStore.to_dict(row), ensure_ascii=False) + "\n")
+                count += 1
+    finally:
+        if handle is not None:
+            handle.close()
+    return {"files": files, "rows": count}
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="导出诊断历史")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    parser.add_argument("--output", required=True, help="Parquet 为输出文件路径，JSONL 为输出目录")
+    parser.add_argument("--db", help="历史数据库路径，默认使用 history_store_path 配置")
+    parser.add_argument("--engine", help="只导出指定引擎，如 diagnosis、herb_diagnosis")
+    parser.add_argument("--start", help="起始时间（含），ISO 8601 格式")
+    parser.add_argument("--end", help="结束时间（不含），ISO 8601 格式")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    parser.add_argument("--gzip", action="store_true", help="JSONL 分片使用 gzip 压缩")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db) if args.db else get_history_store()
+    if store is None:
+        print("诊断历史未启用，请设置 history_store=true 或通过 --db 指定数据库", file=sys.stderr)
+        return 1
+
+    filters = {"engine": args.engine, "start": _parse_time(args.start), "end": _parse_time(args.end)}
+    if args.format == "parquet":
+        result = export_parquet(store, args.output, row_group_size=args.row_group_size, **filters)
+    else:
+        result = export_jsonl(store, args.output, shard_rows=args.shard_rows, compress=args.gzip, **filters)
+    store.close()
+    print(f"导出 {result['rows']} 条记录：{', '.join(result['files'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
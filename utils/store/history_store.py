@@ -0,0 +1,329 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from config.logger import logger
+
+DEFAULT_PATH = "data/diagnosis_history.db"
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagnosis_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    engine TEXT NOT NULL,
+    model TEXT,
+    source TEXT,
+    description TEXT NOT NULL,
+    raw_output TEXT,
+    result TEXT NOT NULL,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_history_created ON diagnosis_history (created);
+CREATE INDEX IF NOT EXISTS idx_diagnosis_history_engine_created ON diagnosis_history (engine, created);
+"""
+
+HISTORY_COLUMNS = (
+    "id", "created", "engine", "model", "source", "description", "raw_output", "result", "timings",
+)
+
+
+class HistoryStore:
+    """
+    只追加的诊断历史存储（SQLite）
+
+    record() 只把记录放入有界队列，由后台线程按批次在一个事务中写入，不阻塞请求；
+    队列满时丢弃新记录并计数，诊断服务不因历史写入变慢。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._open()) as conn:
+            conn.executescript(_SCHEMA)
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _open(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """查询使用的线程级连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def record(
+        self,
+        engine: str,
+        description: str,
+        result: Any,
+        model: Optional[str] = None,
+        source: Optional[str] = None,
+        raw_output: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> bool:
+        """
+        提交一条诊断记录，立即返回
+
+        Returns:
+            bool: 队列已满被丢弃时返回 False
+        """
+        row = (
+            time.time(), engine, model, source, description, raw_output,
+            json.dumps(result, ensure_ascii=False),
+            json.dumps(timings, ensure_ascii=False) if timings is not None else None,
+        )
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"诊断历史队列已满，已丢弃 {self.dropped} 条记录")
+            return False
+
+    def _write_loop(self) -> None:
+        conn = self._open()
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            # 收集一批记录，None 为停止信号，收到后写完当前批次再退出
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                stopping = True
+            if batch:
+                self._write_batch(conn, batch)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+        conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO diagnosis_history "
+                "(created, engine, model, source, description, raw_output, result, timings) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.dropped += len(batch)
+            logger.error(f"诊断历史写入失败，丢弃 {len(batch)} 条记录: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def flush(self, timeout: float = 10) -> None:
+        """等待队列中已提交的记录写入完成"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 10) -> None:
+        """写完队列中剩余的记录后停止写入线程"""
+        self._queue.put(None)
+        self._writer.join(timeout=timeout)
+
+    def query(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        engine: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按时间倒序分页查询
+
+        Args:
+            page: 页码，从1开始
+            page_size: 每页条数
+            engine: 只查询指定引擎
+            start: 起始时间戳（含）
+            end: 结束时间戳（不含）
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: 当前页记录与符合条件的总数
+        """
+        where, args = self._filters(engine, start, end)
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM diagnosis_history{where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM diagnosis_history{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            [*args, page_size, (page - 1) * page_size],
+        ).fetchall()
+        return [self.to_dict(row) for row in rows], total
+
+    def iter_chunks(
+        self,
+        chunk_size: int = 10_000,
+        engine: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[List[tuple]]:
+        """
+        按 id 升序分块读取原始记录，用于导出
+
+        按上一块最后的 id 继续查询（keyset 分页），内存占用与总条数无关，深分页也不会变慢。
+        每行字段顺序同 HISTORY_COLUMNS，result 与 timings 为 JSON 字符串。
+        """
+        where, args = self._filters(engine, start, end)
+        where = where + (" AND" if where else " WHERE") + " id > ?"
+        # 流式响应会在线程池的不同线程中推进生成器
+        conn = self._open(check_same_thread=False)
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    f"SELECT {', '.join(HISTORY_COLUMNS)} FROM diagnosis_history{where} ORDER BY id LIMIT ?",
+                    [*args, last_id, chunk_size],
+                ).fetchall()
+                if not rows:
+                    return
+                yield rows
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM diagnosis_history WHERE id = ?", (record_id,)
+        ).fetchone()
+        return self.to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _filters(engine: Optional[str], start: Optional[float], end: Optional[float]) -> Tuple[str, List[Any]]:
+        clauses, args = [], []
+        if engine:
+            clauses.append("engine = ?")
+            args.append(engine)
+        if start is not None:
+            clauses.append("created >= ?")
+            args.append(start)
+        if end is not None:
+            clauses.append("created < ?")
+            args.append(end)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    @staticmethod
+    def to_dict(row: tuple) -> Dict[str, Any]:
+        """原始记录转为接口返回的结构：解析 JSON 字段，时间转为 ISO 8601 字符串"""
+        item = dict(zip(HISTORY_COLUMNS, row))
+        item["created_at"] = datetime.fromtimestamp(item.pop("created")).isoformat(timespec="seconds")
+        item["result"] = json.loads(item["result"])
+        item["timings"] = json.loads(item["timings"]) if item["timings"] else None
+        return item
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+_store: Optional[HistoryStore] = None
+_store_loaded = False
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """
+    获取进程级诊断历史存储，未通过环境变量 history_store=true 启用时返回 None
+
+    文件路径、队列长度、批次大小与刷新间隔通过 history_store_path、history_queue_size、
+    history_batch_size、history_flush_interval 配置。
+    """
+    global _store, _store_loaded
+    if _store_loaded:
+        return _store
+    with _store_lock:
+        if not _store_loaded:
+            load_dotenv(".env")
+            if os.getenv("history_store", "false").strip().lower() in ("1", "true", "yes"):
+                try:
+                    _store = HistoryStore(
+                        path=os.getenv("history_store_path", DEFAULT_PATH),
+                        queue_size=int(os.getenv("history_queue_size", DEFAULT_QUEUE_SIZE)),
+                        batch_size=int(os.getenv("history_batch_size", DEFAULT_BATCH_SIZE)),
+                        flush_interval=float(os.getenv("history_flush_interval", DEFAULT_FLUSH_INTERVAL)),
+                    )
+                except sqlite3.Error as e:
+                    logger.error(f"诊断历史存储初始化失败，已禁用: {e}")
+            _store_loaded = True
+    return _store
+
+
+def record_engine_result(engine: Any, description: str, result: List[Dict[str, Any]]) -> None:
+    """按引擎本次诊断的 trace 提交诊断历史，未启用历史存储时不做任何事"""
+    store = get_history_store()
+    if store is None:
+        return
+    trace = getattr(engine, "trace", None) or {}
+    store.record(
+        trace.get("engine", type(engine).__name__),
+        description,
+        result,
+        model=trace.get("model"),
+        source=trace.get("source"),
+        raw_output=trace.get("raw_output"),
+        timings=trace.get("timings"),
+    )
+
+
+def shutdown_history_store() -> None:
+    if _store is not None:
+        _store.close()
+
+
+def history_metrics() -> Dict[str, Any]:
+    """诊断历史写入队列长度、已写入与丢弃条数"""
+    return _store.stats() if _store is not None else {}
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLStore:
+    """
+    线程安全的有界过期存储
+
+    条目超过 ttl 秒后失效，条目数超过 maxsize 时淘汰最久未访问的条目。
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """写入条目，可单独指定过期时间"""
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._purge_expired(now)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取条目，过期或不存在时返回 default"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """移除并返回条目"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            return len(self._data)